@@ -0,0 +1,112 @@
+"""
+Page Pipeline Benchmark for Image to PDF Converter
+Time, Pillow allocations and peak memory per prepared page
+"""
+
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+
+from PIL import Image
+
+from Module.PDFExport import PDFExporter, ExportOptions, expand_frames
+from Module.DecodeIsolation import PAGE_BUFFER_BLOCKS, keep_page_blocks
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:  # Windows: no peak RSS column
+    RESOURCE_AVAILABLE = False
+    resource = None
+
+# Pillow's allocation counters are private and may go away
+STATS_AVAILABLE = hasattr(Image.core, "get_stats") and \
+    hasattr(Image.core, "reset_stats")
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process; ru_maxrss is KB on Linux and
+    bytes on macOS"""
+    if not RESOURCE_AVAILABLE:
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / \
+        (2 ** 20 if sys.platform == "darwin" else 2 ** 10)
+
+
+def measure_page(source, overrides: dict) -> dict:
+    """Prepare one page in a fresh process so peak RSS belongs to it alone"""
+    exporter = PDFExporter(ExportOptions(**overrides))
+    keep_page_blocks(PAGE_BUFFER_BLOCKS)  # As during an export
+    if STATS_AVAILABLE:
+        Image.core.reset_stats()
+    baseline = peak_rss_mb()
+    tracemalloc.start()
+    started = time.perf_counter()
+    page = exporter.prepare_page(source)
+    elapsed = time.perf_counter() - started
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = Image.core.get_stats() if STATS_AVAILABLE else {}
+    return {
+        "label": source.label,
+        "encoder": page.encoder,
+        "ms": elapsed * 1000,
+        "images": stats.get("new_count", 0),
+        "reused": stats.get("reused_blocks", 0),
+        "python_mb": python_peak / 2 ** 20,
+        "rss_mb": peak_rss_mb() - baseline,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument("images", nargs="*",
+                        help="input images (default: the Testdata folder)")
+    parser.add_argument("--watermark", default="", help="watermark text")
+    parser.add_argument("--watermark-layout", default="Corner",
+                        choices=["Corner", "Tiled", "Diagonal"])
+    parser.add_argument("--clean-scans", action="store_true")
+    parser.add_argument("--auto-crop", action="store_true")
+    parser.add_argument("--fit-mode", default="Fit to Page")
+    parser.add_argument("--encoder", default="Auto")
+    parser.add_argument("--plan", action="store_true",
+                        help="print each page's stage plan instead of timing it")
+    args = parser.parse_args()
+
+    images = args.images or sorted(
+        path for path in glob.glob(os.path.join("Testdata", "*"))
+        if os.path.splitext(path)[1].lower() in
+        (".png", ".jpg", ".jpeg", ".jfif", ".tif", ".tiff", ".gif", ".bmp"))
+    overrides = {
+        "watermark_text": args.watermark,
+        "watermark_layout": args.watermark_layout,
+        "clean_scans": args.clean_scans,
+        "auto_crop": args.auto_crop,
+        "fit_mode": args.fit_mode,
+        "encoder": args.encoder,
+        "isolate_decoding": False,  # Measure the pipeline, not the transfer
+    }
+
+    if args.plan:
+        exporter = PDFExporter(ExportOptions(**overrides))
+        for source in expand_frames(images):
+            print(exporter.plan_for(source))
+        return
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{'page':32} {'encoder':9} {'ms':>8} {'images':>7} {'reused':>7} "
+          f"{'py MB':>7} {'RSS MB':>7}")
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        for source in expand_frames(images):
+            row = pool.apply(measure_page, (source, overrides))
+            print(f"{row['label'][:32]:32} {row['encoder']:9} {row['ms']:8.1f} "
+                  f"{row['images']:7d} {row['reused']:7d} "
+                  f"{row['python_mb']:7.1f} {row['rss_mb']:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
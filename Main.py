@@ -1,3 +1,4 @@
+import multiprocessing
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import os
@@ -33,4 +34,5 @@ def main():
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Decoder worker processes in frozen builds
     main()
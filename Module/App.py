@@ -1,7 +1,8 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-from PIL import Image, ImageTk, ImageDraw, ImageFont
+from PIL import Image, ImageTk
 import os
+from Module.PDFExport import PDFExporter, ExportOptions
 
 try:
     from tkinterdnd2 import TkinterDnD, DND_FILES
@@ -305,33 +306,6 @@ class App:
             if widget:
                 widget.destroy()
 
-    def add_watermark(self, image, text="Samarth Raut"):
-        watermark_img = image.copy()
-        draw = ImageDraw.Draw(watermark_img)
-
-        try:
-            font = ImageFont.truetype("arial.ttf", 24)
-        except:
-            try:
-                font = ImageFont.truetype("DejaVuSans.ttf", 24)
-            except:
-                font = ImageFont.load_default()
-
-        try:
-            bbox = font.getbbox(text)
-            textwidth = bbox[2] - bbox[0]
-            textheight = bbox[3] - bbox[1]
-        except AttributeError:
-            textwidth, textheight = draw.textsize(text, font=font)
-
-        x = watermark_img.width - textwidth - 20
-        y = watermark_img.height - textheight - 20
-
-        draw.text((x+2, y+2), text, font=font, fill=(0, 0, 0, 100))
-        draw.text((x, y), text, font=font, fill=(255, 255, 255, 200))
-
-        return watermark_img
-
     def save_as_pdf(self):
         selected_files = [path for path,
                           var in self.selected_image_vars if var.get()]
@@ -349,22 +323,19 @@ class App:
             return
 
         try:
-            image_list = []
-            for path in selected_files:
-                img = self.resized_images_for_pdf.get(path)
-                if img:
-                    if self.apply_watermark.get():
-                        text = self.watermark_text_var.get().strip() or "Samarth Raut"
-                        img = self.add_watermark(img, text=text)
-                    image_list.append(img)
-
-            if image_list:
-                image_list[0].save(pdf_path, save_all=True,
-                                   append_images=image_list[1:])
-                messagebox.showinfo(
-                    "Success", f"PDF saved successfully!\n{pdf_path}")
-            else:
-                messagebox.showerror("Error", "No images to save.")
+            text = ""
+            if self.apply_watermark.get():
+                text = self.watermark_text_var.get().strip() or "Samarth Raut"
+            # Same pipeline as the other apps, keeping this window's pages
+            # at the 250 px preview size
+            options = ExportOptions(page_size="Preview", margin=0,
+                                    watermark_text=text)
+            exporter = PDFExporter(options)
+            result = exporter.export(selected_files, pdf_path)
+            message = f"PDF saved successfully!\n{pdf_path}"
+            if result.failed:
+                message += f"\n\n{len(result.failed)} image(s) could not be read."
+            messagebox.showinfo("Success", message)
 
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save PDF: {str(e)}")
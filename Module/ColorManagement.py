@@ -0,0 +1,83 @@
+"""
+Color Management for Image to PDF Converter
+ICC-aware conversion with cached transforms, or profile passthrough
+"""
+
+import hashlib
+import io
+import threading
+from typing import Optional
+
+from Module.PDFWriter import ICCProfile, PDFName
+
+try:
+    from PIL import Image, ImageCms
+    IMAGECMS_AVAILABLE = True
+except ImportError:
+    IMAGECMS_AVAILABLE = False
+    Image = ImageCms = None
+
+
+# Data color space signature in the ICC header -> (PIL mode, components)
+PROFILE_SPACES = {b"GRAY": ("L", 1), b"RGB ": ("RGB", 3), b"CMYK": ("CMYK", 4)}
+
+DEVICE_SPACES = {1: "DeviceGray", 3: "DeviceRGB", 4: "DeviceCMYK"}
+
+_transforms = {}
+_transforms_lock = threading.Lock()
+
+
+def source_profile(img) -> Optional[ICCProfile]:
+    """The image's embedded ICC profile, if it matches the pixel data"""
+    data = img.info.get("icc_profile")
+    if not data or len(data) < 20:
+        return None
+    space = PROFILE_SPACES.get(data[16:20])
+    if space is None or space[0] != img.mode:
+        return None
+    return ICCProfile(data, space[1], hashlib.sha1(data).hexdigest())
+
+
+def srgb_transform(profile: ICCProfile, mode: str):
+    """Transform from the profile to sRGB, built once per profile and mode"""
+    key = (profile.digest, mode)
+    with _transforms_lock:
+        if key in _transforms:
+            return _transforms[key]
+    try:
+        source = ImageCms.ImageCmsProfile(io.BytesIO(profile.data))
+        if mode == "RGB" and \
+                ImageCms.getProfileDescription(source).startswith("sRGB"):
+            transform = None  # Already sRGB: a plain copy is exact
+        else:
+            transform = ImageCms.buildTransform(
+                source, ImageCms.createProfile("sRGB"), mode, "RGB",
+                renderingIntent=ImageCms.Intent.PERCEPTUAL,
+                # The 1-pixel cache is not safe to share between threads
+                flags=ImageCms.Flags.NOCACHE)
+    except (ImageCms.PyCMSError, OSError):
+        transform = None  # Broken profile: remember it and fall back
+    with _transforms_lock:
+        return _transforms.setdefault(key, transform)
+
+
+def to_srgb(img, profile: Optional[ICCProfile]):
+    """Convert to sRGB through the profile; plain convert() without one"""
+    transform = None
+    if profile is not None and IMAGECMS_AVAILABLE:
+        transform = srgb_transform(profile, img.mode)
+    if transform is None:
+        return img.convert("RGB")
+    return ImageCms.applyTransform(img, transform)
+
+
+def attach_profile(layers, profile: ICCProfile):
+    """Tag encoded layers whose device space matches the profile with it"""
+    device = PDFName(DEVICE_SPACES[profile.components])
+    for layer in layers:
+        space = layer.color_space
+        if space == device:
+            layer.color_space = profile
+        elif isinstance(space, list) and space[:2] == [PDFName("Indexed"), device]:
+            layer.color_space = [space[0], profile] + space[2:]
+    return layers
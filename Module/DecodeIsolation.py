@@ -0,0 +1,320 @@
+"""
+Decode Isolation for Image to PDF Converter
+Run image decoding in worker processes with memory and time limits
+"""
+
+import importlib
+import multiprocessing
+import threading
+from multiprocessing import shared_memory
+from typing import List, Optional
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:  # Windows: only the timeout applies
+    RESOURCE_AVAILABLE = False
+    resource = None
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    Image = None
+
+
+DECODE_MEMORY_LIMIT = 2048 * 1024 * 1024  # Address space a worker may add
+DECODE_TIMEOUT = 60.0                     # Seconds allowed per decode
+STARTUP_TIMEOUT = 60.0                    # Seconds for a worker to import
+
+# Imported by each worker before its memory limit is applied
+WORKER_PRELOAD = ("Module.PDFExport",)
+
+BUFFER_STEP = 4 * 1024 * 1024   # Transfer buffers grow in these steps
+COPY_BAND_BYTES = 4 * 1024 * 1024  # Pixels copied into the buffer per band
+PAGE_BUFFER_BLOCKS = 32  # Freed Pillow blocks kept for reuse by the next page
+
+
+def block_cache():
+    """Pillow's (private) block cache controls, or None if this Pillow
+    does not have them"""
+    core = getattr(Image, "core", None)
+    if hasattr(core, "get_blocks_max") and hasattr(core, "set_blocks_max"):
+        return core
+    return None
+
+
+def keep_page_blocks(blocks: int) -> Optional[int]:
+    """Let Pillow keep at least `blocks` freed image blocks for reuse.
+
+    Returns the previous setting for restore_blocks(), or None when the
+    cache cannot be tuned.
+    """
+    core = block_cache()
+    if core is None:
+        return None
+    previous = core.get_blocks_max()
+    core.set_blocks_max(max(previous, blocks))
+    return previous
+
+
+def restore_blocks(previous: Optional[int]):
+    core = block_cache()
+    if core is not None and previous is not None:
+        core.set_blocks_max(previous)
+
+
+class DecodeError(Exception):
+    """An image could not be decoded: it failed, crashed, ran out of
+    memory or took too long"""
+
+
+def address_space() -> int:
+    """Current virtual memory size in bytes, where /proc reports it"""
+    try:
+        with open("/proc/self/statm") as stream:
+            pages = int(stream.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return 0
+    return pages * resource.getpagesize()
+
+
+def limit_memory(limit: int):
+    """Cap the worker's address space at its current size plus limit"""
+    if not (limit and RESOURCE_AVAILABLE):
+        return
+    cap = address_space() + limit
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (cap, cap))
+    except (ValueError, OSError):
+        pass  # Hard limit already lower, or not supported on this platform
+
+
+def raw_row_bytes(img) -> int:
+    return len(img.crop((0, 0, img.width, 1)).tobytes())
+
+
+def copy_into(img, buffer):
+    """Write the image's raw pixels into a buffer a band at a time.
+
+    Avoids tobytes() on the whole page, which would hold a second full
+    copy (and briefly a third while its pieces are joined).
+    """
+    row_bytes = raw_row_bytes(img)
+    rows = max(1, COPY_BAND_BYTES // max(1, row_bytes))
+    for top in range(0, img.height, rows):
+        bottom = min(img.height, top + rows)
+        buffer[top * row_bytes:bottom * row_bytes] = \
+            img.crop((0, top, img.width, bottom)).tobytes()
+
+
+def worker_main(conn, memory_limit: int, preload):
+    """Worker loop: run (function, args) jobs until told to stop.
+
+    Images are returned through a shared memory buffer the parent owns,
+    reuses from page to page and unlinks, so nothing leaks when a worker
+    is killed.
+    """
+    for module in preload:
+        importlib.import_module(module)
+    keep_page_blocks(PAGE_BUFFER_BLOCKS)
+    limit_memory(memory_limit)
+    conn.send(("ready",))
+
+    block = None
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            job = None
+        if job is None:
+            if block is not None:
+                block.close()
+            return
+        function, args = job
+        try:
+            result = function(*args)
+            if PIL_AVAILABLE and isinstance(result, Image.Image):
+                length = raw_row_bytes(result) * result.height
+                conn.send(("image", result.mode, result.size, length))
+                name = conn.recv()
+                if block is None or block.name != name:
+                    if block is not None:
+                        block.close()
+                    block = shared_memory.SharedMemory(name=name)
+                copy_into(result, block.buf)
+                del result
+                conn.send(("done",))
+            else:
+                conn.send(("value", result))
+        except BaseException as exc:  # MemoryError included
+            message = str(exc)
+            conn.send(("error", f"{type(exc).__name__}: {message}"
+                       if message else type(exc).__name__))
+
+
+class DecodeWorker:
+    """Parent-side handle on one worker process"""
+
+    def __init__(self, context, memory_limit: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=worker_main, args=(child_conn, memory_limit, WORKER_PRELOAD),
+            daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.block: Optional[shared_memory.SharedMemory] = None
+        self.affinity: Optional[str] = None  # Key of the last job it ran
+
+    def call(self, function, args, timeout: float):
+        if not self.ready:
+            # Startup is not charged to the first image's timeout
+            self.receive(STARTUP_TIMEOUT)
+            self.ready = True
+        self.conn.send((function, args))
+        reply = self.receive(timeout)
+        kind = reply[0]
+        if kind == "error":
+            raise DecodeError(reply[1])
+        if kind == "value":
+            return reply[1]
+        return self.receive_image(*reply[1:], timeout)
+
+    def receive(self, timeout: float):
+        if not self.conn.poll(timeout):
+            raise DecodeError(f"Timed out after {timeout:g} seconds")
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError):
+            self.process.join(1)
+            raise DecodeError(
+                f"Decoder process exited (code {self.process.exitcode})")
+
+    def receive_image(self, mode: str, size, length: int, timeout: float):
+        """Have the worker copy its image into shared memory, then read it"""
+        if self.block is None or self.block.size < length:
+            self.release_buffer()
+            self.block = shared_memory.SharedMemory(
+                create=True, size=max(1, -(-length // BUFFER_STEP) * BUFFER_STEP))
+        self.conn.send(self.block.name)
+        reply = self.receive(timeout)
+        if reply[0] == "error":
+            raise DecodeError(reply[1])
+        with self.block.buf[:length] as view:
+            return Image.frombytes(mode, size, view)
+
+    def release_buffer(self):
+        if self.block is not None:
+            self.block.close()
+            self.block.unlink()
+            self.block = None
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(1)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+        self.release_buffer()
+
+
+class DecodePool:
+    """Decode jobs in sandboxed worker processes.
+
+    Each worker handles one job at a time. A worker whose job failed,
+    timed out or crashed is discarded and replaced on the next request,
+    so one bad input costs one page rather than the whole export. Jobs
+    with an affinity key go to the idle worker that last ran the same
+    key, if there is one, so it can reuse what it kept open.
+    """
+
+    def __init__(self, workers: int, memory_limit: int = DECODE_MEMORY_LIMIT,
+                 timeout: float = DECODE_TIMEOUT):
+        self.size = max(1, workers)
+        self.memory_limit = memory_limit
+        self.timeout = timeout
+        # Forking a process that runs Tk and worker threads is unsafe
+        self.context = multiprocessing.get_context("spawn")
+        self.idle: List[DecodeWorker] = []  # Least recently used first
+        self.started = 0
+        self.lock = threading.Lock()
+        self.available = threading.Condition(self.lock)
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def run(self, function, *args, affinity: Optional[str] = None):
+        """Call a picklable top-level function in a worker process"""
+        worker = self.acquire(affinity)
+        try:
+            result = worker.call(function, args, self.timeout)
+        except BaseException:
+            worker.kill()
+            self.discard()  # A waiter starts a fresh worker
+            raise
+        worker.affinity = affinity
+        self.release(worker)
+        return result
+
+    def acquire(self, affinity: Optional[str] = None) -> DecodeWorker:
+        with self.available:
+            while True:
+                if self.closed:
+                    raise DecodeError("Decoder pool is closed")
+                if self.idle:
+                    return self.pick(affinity)
+                if self.started < self.size:
+                    self.started += 1
+                    break
+                self.available.wait()
+        return self.start_worker()
+
+    def pick(self, affinity: Optional[str]) -> DecodeWorker:
+        """An idle worker: one that last ran this affinity, else the one
+        idle longest"""
+        if affinity is not None:
+            for index, worker in enumerate(self.idle):
+                if worker.affinity == affinity:
+                    return self.idle.pop(index)
+        return self.idle.pop(0)
+
+    def start_worker(self) -> DecodeWorker:
+        try:
+            return DecodeWorker(self.context, self.memory_limit)
+        except BaseException:
+            self.discard()
+            raise
+
+    def release(self, worker: DecodeWorker):
+        with self.available:
+            if not self.closed:
+                self.idle.append(worker)
+                self.available.notify()
+                return
+        worker.stop()
+
+    def discard(self):
+        with self.available:
+            self.started -= 1
+            self.available.notify()
+
+    def close(self):
+        with self.available:
+            self.closed = True
+            workers, self.idle = self.idle, []
+            self.available.notify_all()
+        for worker in workers:
+            worker.stop()
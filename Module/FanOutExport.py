@@ -0,0 +1,293 @@
+"""
+Fan-out Export for Image to PDF Converter
+Write several variants of one image set while decoding each page once
+"""
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from Module.PDFExport import (PDFExporter, ExportOptions, ExportResult,
+                              PreparedPage, PageFailure, FrameReader,
+                              VolumePlanner, expand_frames, volume_paths,
+                              mark_duplicates, remove_outputs,
+                              renumber_volumes, no_pages_message,
+                              fit_dimensions, resize_image_for_page)
+from Module.PagePipeline import STAGE_ORDER, plan_page
+from Module.DecodeIsolation import DecodeError
+
+
+# Options that decide how a page is decoded; every profile must agree on them
+SHARED_OPTIONS = ("color_mode", "color_management", "transparency",
+                  "background_color", "auto_crop", "skip_blank_pages",
+                  "frame_range", "isolate_decoding", "decode_timeout",
+                  "decode_memory_mb", "max_workers")
+
+QUEUED_PAGES = 2  # Pages waiting per output; decoding pauses for slow writers
+
+
+class OutputProfile:
+    """One output of a fan-out export: its file and its settings"""
+
+    def __init__(self, pdf_path: str, options: ExportOptions):
+        self.pdf_path = pdf_path
+        self.options = options
+
+
+class PendingPage:
+    """A resized variant whose remaining stages run on its output's thread"""
+
+    def __init__(self, exporter: PDFExporter, state, plan, steps):
+        self.exporter = exporter
+        self.state = state
+        self.plan = plan
+        self.steps = steps
+
+    def finish(self) -> PreparedPage:
+        for step in self.steps:
+            step.stage.run(self.state, **step.params)
+        return self.exporter.finish_page(self.state, self.plan)
+
+
+class ProfileEvents:
+    """Tags the reports of one output before they reach the shared queue"""
+
+    def __init__(self, events: queue.Queue, number: int):
+        self.events = events
+        self.number = number
+
+    def put(self, report):
+        self.events.put((self.number, report))
+
+
+def area(size) -> int:
+    return size[0] * size[1]
+
+
+def send(inbox: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            inbox.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def receive(inbox: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            return inbox.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return None
+
+
+class FanOutExporter:
+    """Export the same images to several PDFs, e.g. print and email copies.
+
+    Each page is decoded, oriented and cropped once, at the largest
+    resolution any profile needs. Every variant is resampled from the
+    next larger Fit to Page variant (Fill Page crops start from the
+    decoded page). Each output then runs its own remaining stages,
+    encodes and writes on its own thread.
+
+    Output is not byte-identical to separate exports. A separate export
+    decodes each page at its own size (JPEG draft, band reduction) and
+    resamples once, while a fan-out variant is resampled from a larger
+    image; pixels differ slightly and page sizes can differ by a pixel.
+    Only a profile whose pages are the largest decode itself matches,
+    and only for those pages.
+    """
+
+    def __init__(self, profiles: List[OutputProfile],
+                 thumbnail_cache: Optional[dict] = None):
+        if not profiles:
+            raise ValueError("No output profiles given")
+        first = profiles[0].options
+        differing = [key for key in SHARED_OPTIONS
+                     if any(getattr(profile.options, key) != getattr(first, key)
+                            for profile in profiles[1:])]
+        if differing:
+            raise ValueError("Output profiles must share these options: " +
+                             ", ".join(differing))
+        self.profiles = profiles
+        self.exporters = [PDFExporter(profile.options, thumbnail_cache)
+                          for profile in profiles]
+
+    def prepare_variants(self, source) -> list:
+        """One PreparedPage or PendingPage per profile, from a single decode"""
+        with FrameReader() as reader:
+            header = self.exporters[0].read_header(source, reader)
+            variants = [exporter.state_for(source, header)
+                        for exporter in self.exporters]
+            pending = [(number, state) for number, state in enumerate(variants)
+                       if not isinstance(state, PreparedPage)]
+            if not pending:
+                return variants
+
+            # Registration order: orient and convert stay ahead of the resize
+            plans = {number: plan_page(state, downscale=None)
+                     for number, state in pending}
+            resize = STAGE_ORDER.index("resize")
+            number, head = max(pending, key=lambda item: area(plans[item[0]].size))
+            # A passthrough thumbnail may have drafted the shared header
+            head.header = reader.read(source)
+            for step in plans[number].steps:
+                if STAGE_ORDER.index(step.stage.name) < resize:
+                    step.stage.run(head, **step.params)
+
+        base = head.img
+        pending.sort(key=lambda item: area(fit_dimensions(head.img.size,
+                                                          item[1].options)),
+                     reverse=True)
+        for number, state in pending:
+            state.img = resize_image_for_page(base, state.options,
+                                              layout_size=head.img.size)
+            state.upright = True
+            if state.img is base:
+                state.img = base.copy()  # Later stages may draw in place
+            elif state.options.fit_mode == "Fit to Page":
+                base = state.img  # Whole page kept: smaller variants start here
+            steps = [step for step in plans[number].steps
+                     if STAGE_ORDER.index(step.stage.name) > resize]
+            variants[number] = PendingPage(self.exporters[number], state,
+                                           plans[number], steps)
+        return variants
+
+    def export(self, image_paths: List[str],
+               progress: Optional[Callable[[int, int, str], None]] = None
+               ) -> List[ExportResult]:
+        """Export every profile; one ExportResult per profile, in order.
+
+        Raises only when no profile got a page. Each result lists its own
+        pages, failures and outputs; a profile left without pages has no
+        outputs. The progress callback counts pages across all outputs and
+        is invoked on the calling thread.
+        """
+        with self.exporters[0].decoding() as decoder:
+            for exporter in self.exporters[1:]:
+                exporter.decoder = decoder
+            try:
+                return self.export_pages(image_paths, progress)
+            finally:
+                for exporter in self.exporters[1:]:
+                    exporter.decoder = None
+
+    def export_pages(self, image_paths: List[str],
+                     progress: Optional[Callable[[int, int, str], None]]
+                     ) -> List[ExportResult]:
+        options = self.profiles[0].options
+        sources = expand_frames(image_paths, options.frame_range)
+        if not sources:
+            raise ValueError("No pages selected")
+        skipped = []
+        if options.skip_blank_pages:
+            sources, skipped = self.exporters[0].drop_blank_pages(sources)
+            if not sources:
+                raise ValueError("All selected images are blank pages")
+        mark_duplicates(sources)
+
+        results, volumes = [], []
+        for profile in self.profiles:
+            planned = VolumePlanner(profile.options).plan(sources)
+            result = ExportResult()
+            result.skipped = list(skipped)
+            result.outputs = volume_paths(profile.pdf_path, len(planned))
+            results.append(result)
+            volumes.append(planned)
+
+        total = len(sources) * len(self.profiles)
+        events: queue.Queue = queue.Queue()
+        inboxes = [queue.Queue(QUEUED_PAGES) for _ in self.profiles]
+        stop = threading.Event()
+        outputs = [output for result in results for output in result.outputs]
+        try:
+            with ThreadPoolExecutor(max_workers=len(self.profiles) + 1) as pool:
+                futures = [pool.submit(self.write_profile, number,
+                                       volumes[number], results[number].outputs,
+                                       inboxes[number],
+                                       ProfileEvents(events, number), stop)
+                           for number in range(len(self.profiles))]
+                futures.append(pool.submit(self.produce, sources, inboxes, stop))
+                try:
+                    done = 0
+                    while done < total and not any(
+                            f.done() and f.exception() for f in futures):
+                        try:
+                            number, report = events.get(timeout=0.1)
+                        except queue.Empty:
+                            continue
+                        if isinstance(report, PageFailure):
+                            results[number].failed.append(report)
+                        else:
+                            results[number].pages.append(report)
+                        done += 1
+                        if progress:
+                            progress(done, total, report.source.label)
+                finally:
+                    stop.set()  # Releases threads blocked on a failed peer
+                # Pages per volume of each profile; the producer comes last
+                written = [future.result() for future in futures][:-1]
+        except BaseException:
+            remove_outputs(outputs)  # Never leave a truncated PDF behind
+            raise
+
+        if not any(result.pages for result in results):
+            remove_outputs(outputs)
+            failed = {failure.index: failure
+                      for result in results for failure in result.failed}
+            raise ValueError(no_pages_message(
+                [failed[index] for index in sorted(failed)]))
+        for profile, result, counts in zip(self.profiles, results, written):
+            result.outputs = renumber_volumes(profile.pdf_path, result.outputs,
+                                              counts)
+            result.pages.sort(key=lambda report: report.index)
+            result.failed.sort(key=lambda failure: failure.index)
+            result.page_count = len(result.pages)
+        return results
+
+    def produce(self, sources, inboxes: List[queue.Queue], stop: threading.Event):
+        """Decode each page once and hand its variants to the writers"""
+        for index, source in enumerate(sources):
+            try:
+                variants = self.prepare_variants(source)
+            except DecodeError as exc:
+                variants = [PageFailure(index, source, str(exc))] * len(inboxes)
+            for inbox, variant in zip(inboxes, variants):
+                if not send(inbox, (index, variant), stop):
+                    return
+
+    def write_profile(self, number: int, volumes, outputs: List[str],
+                      inbox: queue.Queue, events: ProfileEvents,
+                      stop: threading.Event):
+        """Finish and write one profile's pages, volume by volume; returns
+        the pages written to each"""
+        exporter = self.exporters[number]
+
+        def pages(count):
+            repeats = {}  # Identical sources are encoded once per file
+            for _ in range(count):
+                item = receive(inbox, stop)
+                if item is None:
+                    return
+                index, page = item
+                if isinstance(page, PageFailure):
+                    events.put(page)
+                    continue
+                source = page.state.source if isinstance(page, PendingPage) \
+                    else page.source
+                key = source.content_key
+                if key in repeats:
+                    yield index, repeats[key].repeat(source)
+                    continue
+                if isinstance(page, PendingPage):
+                    page = page.finish()
+                if key:
+                    repeats[key] = page.repeat(source)
+                yield index, page
+
+        return [exporter.write_pages(pages(len(volume)), output, events,
+                                     len(volume))
+                for volume, output in zip(volumes, outputs)]
@@ -0,0 +1,275 @@
+"""
+Image Analysis for Image to PDF Converter
+Cheap, vectorized page statistics computed on reduced-size copies
+"""
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    np = None
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    Image = None
+
+
+ANALYSIS_SIZE = 256  # Longest side of the copy the statistics run on
+
+GRAYSCALE_MODES = {"1", "L", "LA", "I", "I;16", "F"}
+
+
+def analysis_copy(img, max_side: int = ANALYSIS_SIZE):
+    """Reduced-size copy for statistics; never touches the original"""
+    factor = max(1, max(img.size) // max_side)
+    small = img.reduce(factor) if factor > 1 else img
+    if small.mode not in ("RGB", "L"):
+        small = small.convert("RGB")
+    return small
+
+
+def colorfulness(img) -> float:
+    """Hasler-Suesstrunk colorfulness of an image (0 for pure gray)"""
+    if img.mode in GRAYSCALE_MODES:
+        return 0.0
+    small = analysis_copy(img)
+    if small.mode == "L":
+        return 0.0
+
+    pixels = np.asarray(small, dtype=np.float32)
+    red, green, blue = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    rg = red - green
+    yb = 0.5 * (red + green) - blue
+    spread = np.sqrt(rg.std() ** 2 + yb.std() ** 2)
+    mean = np.sqrt(rg.mean() ** 2 + yb.mean() ** 2)
+    return float(spread + 0.3 * mean)
+
+
+def is_grayscale(img, threshold: float) -> bool:
+    """True when the page carries no meaningful color information"""
+    if img.mode in GRAYSCALE_MODES:
+        return True
+    if not NUMPY_AVAILABLE:
+        return False
+    return colorfulness(img) < threshold
+
+
+BILEVEL_ANALYSIS_SIZE = 1024  # Text strokes must survive the reduction
+BILEVEL_DARK = 96
+BILEVEL_LIGHT = 160
+BILEVEL_TOLERANCE = 8    # Levels from black or the paper peak still two-level
+BILEVEL_PURITY = 0.995   # Share of pixels that must be two-level for Auto G4
+
+
+def tone_fractions(img, max_side: int = BILEVEL_ANALYSIS_SIZE):
+    """Fractions of dark, mid-tone and light pixels of a reduced gray copy"""
+    small = analysis_copy(img, max_side)
+    if small.mode != "L":
+        small = small.convert("L")
+    histogram = np.asarray(small.histogram(), dtype=np.float64)
+    total = histogram.sum()
+    dark = histogram[:BILEVEL_DARK].sum() / total
+    light = histogram[BILEVEL_LIGHT:].sum() / total
+    return dark, 1.0 - dark - light, light
+
+
+def two_level_fraction(img) -> float:
+    """Share of full-resolution pixels within BILEVEL_TOLERANCE of black or
+    of the paper peak; 1.0 for a page that is only ink and paper"""
+    gray = img if img.mode == "L" else img.convert("L")
+    histogram = gray.histogram()
+    paper = max(range(BILEVEL_LIGHT, 256), key=histogram.__getitem__)
+    two_level = sum(histogram[:BILEVEL_TOLERANCE + 1]) + \
+        sum(histogram[max(BILEVEL_TOLERANCE + 1, paper - BILEVEL_TOLERANCE):
+                      paper + BILEVEL_TOLERANCE + 1])
+    return two_level / max(1, sum(histogram))
+
+
+def box_mean_sums(pixels, half: int):
+    """Sum over a (2*half+1)^2 window around every pixel, edges replicated"""
+    block = 2 * half + 1
+    padded = np.pad(pixels, half, mode="edge").astype(np.int32)
+    cumulative = np.zeros((padded.shape[0] + 1, padded.shape[1]), np.int32)
+    np.cumsum(padded, axis=0, out=cumulative[1:])
+    vertical = cumulative[block:] - cumulative[:-block]
+    cumulative = np.zeros((vertical.shape[0], vertical.shape[1] + 1), np.int32)
+    np.cumsum(vertical, axis=1, out=cumulative[:, 1:])
+    return cumulative[:, block:] - cumulative[:, :-block]
+
+
+def adaptive_threshold(img, block: int = 0, offset: int = 10):
+    """Binarize a page against its local mean.
+
+    Pixels darker than the mean of their block minus offset become black,
+    as does anything darker than a fixed floor so solid areas stay filled.
+    """
+    gray = img if img.mode == "L" else img.convert("L")
+    if not NUMPY_AVAILABLE:
+        return gray.point(lambda value: 255 if value >= 128 else 0, "1")
+    pixels = np.asarray(gray)
+    return mask_image(dark_mask(pixels, block, offset) | (pixels < 64))
+
+
+def default_block(size) -> int:
+    """Adaptive threshold window for a page of the given size"""
+    return max(15, min(size) // 40)
+
+
+def dark_mask(pixels, block: int = 0, offset: int = 10):
+    """Boolean array of pixels darker than their local mean minus offset"""
+    if not block:
+        block = default_block(pixels.shape[::-1])
+    half = block // 2
+    area = (2 * half + 1) ** 2
+    sums = box_mean_sums(pixels, half)
+    return pixels.astype(np.int32) * area < sums - offset * area
+
+
+def mask_image(black):
+    """Mode '1' image that is black where the boolean array is set"""
+    return Image.fromarray(np.where(black, 0, 255).astype(np.uint8)).convert(
+        "1", dither=Image.Dither.NONE)
+
+
+def palette_coverage(img, colors: int = 256) -> float:
+    """Fraction of pixels covered by the most common colors.
+
+    Sampled with nearest-neighbour so no blended colors are invented.
+    """
+    factor = max(1, max(img.size) // ANALYSIS_SIZE)
+    small = img
+    if factor > 1:
+        small = img.resize((max(1, img.width // factor),
+                            max(1, img.height // factor)),
+                           Image.Resampling.NEAREST)
+    total = small.width * small.height
+    counts = sorted((count for count, _ in small.getcolors(total)),
+                    reverse=True)
+    return sum(counts[:colors]) / total
+
+
+MRC_OFFSET = 24  # Stricter than bilevel: photos must not leak into the mask
+MRC_BACKGROUND_FACTOR = 3
+MRC_FOREGROUND_FACTOR = 4
+
+
+def fill_masked(pixels, mask, half: int):
+    """Replace masked pixels with the mean of unmasked ones around them"""
+    keep = (~mask).astype(np.int32)
+    counts = box_mean_sums(keep, half)
+    filled = pixels.copy()
+    holes = mask & (counts > 0)
+    channels = pixels[..., None] if pixels.ndim == 2 else pixels
+    target = filled[..., None] if filled.ndim == 2 else filled
+    for channel in range(channels.shape[2]):
+        sums = box_mean_sums(channels[..., channel] * keep, half)
+        target[..., channel][holes] = sums[holes] // counts[holes]
+    return filled
+
+
+def block_means(pixels, weights, factor: int):
+    """Weighted mean color in each factor x factor block.
+
+    Blocks with no weight take the overall mean so viewers that smooth
+    the upsampled layer do not pull in background colors.
+    """
+    height, width = weights.shape
+    rows, cols = -(-height // factor), -(-width // factor)
+    pad = ((0, rows * factor - height), (0, cols * factor - width))
+    weights = np.pad(weights, pad).astype(np.int64)
+    weights = weights.reshape(rows, factor, cols, factor)
+    counts = weights.sum(axis=(1, 3))
+
+    channels = pixels[..., None] if pixels.ndim == 2 else pixels
+    layer = np.empty((rows, cols, channels.shape[2]), np.uint8)
+    for channel in range(channels.shape[2]):
+        values = np.pad(channels[..., channel], pad).astype(np.int64)
+        values = values.reshape(rows, factor, cols, factor)
+        sums = (values * weights).sum(axis=(1, 3))
+        default = sums.sum() // max(1, counts.sum())
+        layer[..., channel] = np.where(counts > 0,
+                                       sums // np.maximum(counts, 1), default)
+    return layer[..., 0] if pixels.ndim == 2 else layer
+
+
+def split_mrc_layers(img, block: int = 0, offset: int = MRC_OFFSET):
+    """Split a page into text mask, background and foreground layers.
+
+    The mask holds dark-on-light strokes at full resolution, the background
+    has the strokes painted over with their surroundings so it compresses
+    well at reduced resolution, and the foreground carries the stroke
+    colors at a coarser resolution still.
+    """
+    pixels = np.asarray(img)
+    gray = np.asarray(img.convert("L")) if img.mode != "L" else pixels
+    if not block:
+        block = default_block(img.size)
+    text = dark_mask(gray, block, offset)
+
+    # Grow the holes by a pixel so anti-aliased stroke edges are removed too
+    grown = box_mean_sums(text.astype(np.int32), 1) > 0
+    background = Image.fromarray(
+        fill_masked(pixels, grown, block // 2), img.mode)
+    background = background.reduce(MRC_BACKGROUND_FACTOR)
+    # Stroke cores outweigh their lighter anti-aliased edges
+    ink = np.where(text, 255 - gray.astype(np.int32), 0) ** 2
+    foreground = Image.fromarray(
+        block_means(pixels, ink, MRC_FOREGROUND_FACTOR), img.mode)
+    return mask_image(text), background, foreground
+
+
+class PageStats:
+    """Statistics of a reduced-scale copy of a page, used to pick an encoder"""
+
+    def __init__(self, img):
+        small = analysis_copy(img, BILEVEL_ANALYSIS_SIZE)
+        self.colorfulness = colorfulness(small)
+        self.palette_coverage = palette_coverage(small)
+        self.dark, self.midtones, self.light = tone_fractions(small)
+
+        gray = np.asarray(small.convert("L") if small.mode != "L" else small,
+                          dtype=np.int16)
+        gradient = np.maximum(np.abs(np.diff(gray, axis=1))[:-1],
+                              np.abs(np.diff(gray, axis=0))[:, :-1])
+        edges = np.count_nonzero(gradient > 16)
+        self.edge_density = edges / max(1, gradient.size)
+        # Share of edges that are hard steps, typical for UI and line art
+        self.sharp_edges = np.count_nonzero(gradient > 96) / max(1, edges)
+
+        if small.mode == "L":
+            self.saturation = 0.0
+        else:
+            hsv = np.asarray(small.convert("HSV"))
+            self.saturation = float(hsv[..., 1].mean()) / 255.0
+
+
+def classify_page(img, gray_threshold: float = 5.0,
+                  color_mode: str = "Auto") -> str:
+    """Pick 'g4', 'indexed', 'gray' or 'jpeg' for a prepared page"""
+    if not NUMPY_AVAILABLE:
+        return "gray" if img.mode in GRAYSCALE_MODES else "jpeg"
+    if img.mode == "1":
+        return "g4"
+
+    stats = PageStats(img)
+    if color_mode == "Color":
+        gray = False
+    elif color_mode == "Grayscale":
+        gray = True
+    else:
+        gray = stats.colorfulness < gray_threshold and stats.saturation < 0.1
+
+    # G4 keeps one bit per pixel: only chosen when that loses nothing
+    # visible, i.e. the full page is already ink on paper
+    if gray and stats.light > 0.5 and stats.edge_density > 0.01 and \
+            two_level_fraction(img) >= BILEVEL_PURITY:
+        return "g4"
+    flat = stats.palette_coverage >= 0.9 and not gray
+    line_art = stats.palette_coverage >= 0.7 and stats.sharp_edges >= 0.15
+    if flat or line_art:
+        return "indexed"
+    return "gray" if gray else "jpeg"
@@ -6,6 +6,8 @@ Enhanced with modern UI, animations, and better user experience
 from Module.UI.icon_manager import icon_manager
 from Module.UI.animation_manager import animation_manager
 from Module.UI.theme_manager import theme_manager
+from Module.PDFExport import PDFExporter, ExportOptions
+from Module.PageStamps import PAGE_NUMBER_TEXT
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import os
@@ -58,6 +60,7 @@ class ModernApp:
         """Initialize application variables"""
         self.selected_images: List[str] = []
         self.image_thumbnails = []
+        self.thumbnail_cache = {}
         self.selected_image_vars = []
         self.right_panel_widgets = {}
         self.resized_images_for_pdf = {}
@@ -73,6 +76,8 @@ class ModernApp:
             "thumbnail_size": (150, 150),
             "preview_size": (250, 250),
             "quality": 95,
+            "grayscale_threshold": 5.0,
+            "background_color": "#FFFFFF",  # behind flattened transparency
             "auto_save": False,
             "default_watermark": "Samarth Raut"
         }
@@ -443,6 +448,66 @@ class ModernApp:
         
         row += 1
         
+        # Watermark layout
+        tk.Label(settings_frame, text="Watermark Layout:",
+                **theme_manager.get_label_style("secondary"),
+                bg=colors["bg_secondary"]).grid(row=row, column=0, sticky="w", padx=10, pady=2)
+        
+        self.watermark_layout_var = tk.StringVar(value="Corner")
+        watermark_layout_combo = ttk.Combobox(settings_frame,
+                                             textvariable=self.watermark_layout_var,
+                                             values=["Corner", "Tiled", "Diagonal"],
+                                             state="readonly")
+        watermark_layout_combo.grid(row=row, column=1, sticky="ew", padx=10, pady=2)
+        
+        row += 1
+        
+        # Vector watermark: one shared PDF form instead of burned-in pixels
+        self.vector_watermark_var = tk.BooleanVar(value=False)
+        vector_watermark_check = tk.Checkbutton(settings_frame,
+                                               text="Vector Watermark (no pixel changes)",
+                                               variable=self.vector_watermark_var,
+                                               **theme_manager.get_label_style("primary"),
+                                               bg=colors["bg_secondary"],
+                                               font=("Segoe UI", 11))
+        vector_watermark_check.grid(row=row, column=0, columnspan=2, sticky="w", padx=10, pady=5)
+        
+        row += 1
+        
+        # Header / footer stamped as PDF text; {name}, {date}, {page}, {pages}
+        tk.Label(settings_frame, text="Header:",
+                **theme_manager.get_label_style("secondary"),
+                bg=colors["bg_secondary"]).grid(row=row, column=0, sticky="w", padx=10, pady=2)
+        
+        self.header_text_var = tk.StringVar(value="")
+        tk.Entry(settings_frame,
+                textvariable=self.header_text_var,
+                **theme_manager.get_entry_style()).grid(row=row, column=1, sticky="ew", padx=10, pady=2)
+        
+        row += 1
+        
+        tk.Label(settings_frame, text="Footer:",
+                **theme_manager.get_label_style("secondary"),
+                bg=colors["bg_secondary"]).grid(row=row, column=0, sticky="w", padx=10, pady=2)
+        
+        self.footer_text_var = tk.StringVar(value="")
+        tk.Entry(settings_frame,
+                textvariable=self.footer_text_var,
+                **theme_manager.get_entry_style()).grid(row=row, column=1, sticky="ew", padx=10, pady=2)
+        
+        row += 1
+        
+        self.page_numbers_var = tk.BooleanVar(value=False)
+        page_numbers_check = tk.Checkbutton(settings_frame,
+                                           text="Page Numbers (Page N of M)",
+                                           variable=self.page_numbers_var,
+                                           **theme_manager.get_label_style("primary"),
+                                           bg=colors["bg_secondary"],
+                                           font=("Segoe UI", 11))
+        page_numbers_check.grid(row=row, column=0, columnspan=2, sticky="w", padx=10, pady=5)
+        
+        row += 1
+        
         # Quality setting
         tk.Label(settings_frame, text="Quality:",
                 **theme_manager.get_label_style("secondary"),
@@ -460,6 +525,130 @@ class ModernApp:
         
         row += 1
         
+        # Color mode
+        tk.Label(settings_frame, text="Color Mode:",
+                **theme_manager.get_label_style("secondary"),
+                bg=colors["bg_secondary"]).grid(row=row, column=0, sticky="w", padx=10, pady=5)
+        
+        self.color_mode_var = tk.StringVar(value="Auto")
+        color_combo = ttk.Combobox(settings_frame,
+                                  textvariable=self.color_mode_var,
+                                  values=["Auto", "Color", "Grayscale"],
+                                  state="readonly")
+        color_combo.grid(row=row, column=1, sticky="ew", padx=10, pady=2)
+        
+        row += 1
+        
+        # ICC color profiles
+        tk.Label(settings_frame, text="Color Profiles:",
+                **theme_manager.get_label_style("secondary"),
+                bg=colors["bg_secondary"]).grid(row=row, column=0, sticky="w", padx=10, pady=5)
+        
+        self.color_management_var = tk.StringVar(value="Convert")
+        profile_combo = ttk.Combobox(settings_frame,
+                                    textvariable=self.color_management_var,
+                                    values=["Convert", "Embed ICC", "Off"],
+                                    state="readonly")
+        profile_combo.grid(row=row, column=1, sticky="ew", padx=10, pady=2)
+        
+        row += 1
+        
+        # Transparency
+        tk.Label(settings_frame, text="Transparency:",
+                **theme_manager.get_label_style("secondary"),
+                bg=colors["bg_secondary"]).grid(row=row, column=0, sticky="w", padx=10, pady=5)
+        
+        self.transparency_var = tk.StringVar(value="Flatten")
+        transparency_combo = ttk.Combobox(settings_frame,
+                                         textvariable=self.transparency_var,
+                                         values=["Flatten", "Preserve"],
+                                         state="readonly")
+        transparency_combo.grid(row=row, column=1, sticky="ew", padx=10, pady=2)
+        
+        row += 1
+        
+        # Encoder selection
+        tk.Label(settings_frame, text="Encoder:",
+                **theme_manager.get_label_style("secondary"),
+                bg=colors["bg_secondary"]).grid(row=row, column=0, sticky="w", padx=10, pady=5)
+        
+        self.encoder_var = tk.StringVar(value="Auto")
+        encoder_combo = ttk.Combobox(settings_frame,
+                                    textvariable=self.encoder_var,
+                                    values=["Auto", "JPEG", "Indexed", "G4", "MRC"],
+                                    state="readonly")
+        encoder_combo.grid(row=row, column=1, sticky="ew", padx=10, pady=2)
+        
+        row += 1
+        
+        self.report_var = tk.BooleanVar(value=False)
+        report_check = tk.Checkbutton(settings_frame,
+                                     text="Show Encoding Report",
+                                     variable=self.report_var,
+                                     **theme_manager.get_label_style("primary"),
+                                     bg=colors["bg_secondary"],
+                                     font=("Segoe UI", 11))
+        report_check.grid(row=row, column=0, columnspan=2, sticky="w", padx=10, pady=5)
+        
+        row += 1
+        
+        self.passthrough_var = tk.BooleanVar(value=False)
+        passthrough_check = tk.Checkbutton(settings_frame,
+                                          text="Pass Through Unchanged JPEGs",
+                                          variable=self.passthrough_var,
+                                          **theme_manager.get_label_style("primary"),
+                                          bg=colors["bg_secondary"],
+                                          font=("Segoe UI", 11))
+        passthrough_check.grid(row=row, column=0, columnspan=2, sticky="w", padx=10, pady=5)
+        
+        row += 1
+        
+        # Scan cleanup
+        self.clean_scans_var = tk.BooleanVar(value=False)
+        clean_check = tk.Checkbutton(settings_frame,
+                                    text="Whiten Scan Background",
+                                    variable=self.clean_scans_var,
+                                    **theme_manager.get_label_style("primary"),
+                                    bg=colors["bg_secondary"],
+                                    font=("Segoe UI", 11))
+        clean_check.grid(row=row, column=0, columnspan=2, sticky="w", padx=10, pady=5)
+        
+        row += 1
+        
+        self.auto_crop_var = tk.BooleanVar(value=False)
+        crop_check = tk.Checkbutton(settings_frame,
+                                   text="Auto-Crop Uniform Borders",
+                                   variable=self.auto_crop_var,
+                                   **theme_manager.get_label_style("primary"),
+                                   bg=colors["bg_secondary"],
+                                   font=("Segoe UI", 11))
+        crop_check.grid(row=row, column=0, columnspan=2, sticky="w", padx=10, pady=5)
+        
+        row += 1
+        
+        self.skip_blank_var = tk.BooleanVar(value=False)
+        blank_check = tk.Checkbutton(settings_frame,
+                                    text="Skip Blank Pages",
+                                    variable=self.skip_blank_var,
+                                    **theme_manager.get_label_style("primary"),
+                                    bg=colors["bg_secondary"],
+                                    font=("Segoe UI", 11))
+        blank_check.grid(row=row, column=0, columnspan=2, sticky="w", padx=10, pady=5)
+        
+        row += 1
+        
+        # Decode each image in a worker process with memory and time limits
+        self.isolate_var = tk.BooleanVar(value=True)
+        isolate_check = tk.Checkbutton(settings_frame,
+                                      text="Decode Images in Separate Processes",
+                                      variable=self.isolate_var,
+                                      **theme_manager.get_label_style("primary"),
+                                      bg=colors["bg_secondary"],
+                                      font=("Segoe UI", 11))
+        isolate_check.grid(row=row, column=0, columnspan=2, sticky="w", padx=10, pady=5)
+        
+        row += 1
+        
         # Page size
         tk.Label(settings_frame, text="Page Size:",
                 **theme_manager.get_label_style("secondary"),
@@ -471,6 +660,69 @@ class ModernApp:
                                       values=["A4", "Letter", "Legal", "A3", "Custom"],
                                       state="readonly")
         page_size_combo.grid(row=row, column=1, sticky="ew", padx=10, pady=2)
+        
+        row += 1
+        
+        # Frames of multi-page TIFF / animated GIF files
+        tk.Label(settings_frame, text="Frames:",
+                **theme_manager.get_label_style("secondary"),
+                bg=colors["bg_secondary"]).grid(row=row, column=0, sticky="w", padx=10, pady=5)
+        
+        self.frame_range_var = tk.StringVar(value="")
+        frame_entry = tk.Entry(settings_frame,
+                              textvariable=self.frame_range_var,
+                              **theme_manager.get_entry_style())
+        frame_entry.grid(row=row, column=1, sticky="ew", padx=10, pady=2)
+        
+        row += 1
+        
+        # Split output into volumes
+        tk.Label(settings_frame, text="Split Output:",
+                **theme_manager.get_label_style("secondary"),
+                bg=colors["bg_secondary"]).grid(row=row, column=0, sticky="w", padx=10, pady=5)
+        
+        self.split_mode_var = tk.StringVar(value="Single PDF")
+        split_combo = ttk.Combobox(settings_frame,
+                                  textvariable=self.split_mode_var,
+                                  values=["Single PDF", "Pages per Volume", "MB per Volume"],
+                                  state="readonly")
+        split_combo.grid(row=row, column=1, sticky="ew", padx=10, pady=2)
+        
+        row += 1
+        
+        tk.Label(settings_frame, text="Volume Limit:",
+                **theme_manager.get_label_style("secondary"),
+                bg=colors["bg_secondary"]).grid(row=row, column=0, sticky="w", padx=10, pady=5)
+        
+        self.split_limit_var = tk.IntVar(value=100)
+        split_spin = tk.Spinbox(settings_frame,
+                               from_=1, to=100000,
+                               textvariable=self.split_limit_var)
+        split_spin.grid(row=row, column=1, sticky="ew", padx=10, pady=2)
+        
+        row += 1
+        
+        # Fast web view
+        self.linearize_var = tk.BooleanVar(value=False)
+        linearize_check = tk.Checkbutton(settings_frame,
+                                        text="Fast Web View (linearized)",
+                                        variable=self.linearize_var,
+                                        **theme_manager.get_label_style("primary"),
+                                        bg=colors["bg_secondary"],
+                                        font=("Segoe UI", 11))
+        linearize_check.grid(row=row, column=0, columnspan=2, sticky="w", padx=10, pady=5)
+        
+        row += 1
+        
+        # Page thumbnails
+        self.thumbnails_var = tk.BooleanVar(value=False)
+        thumbnails_check = tk.Checkbutton(settings_frame,
+                                         text="Embed Page Thumbnails",
+                                         variable=self.thumbnails_var,
+                                         **theme_manager.get_label_style("primary"),
+                                         bg=colors["bg_secondary"],
+                                         font=("Segoe UI", 11))
+        thumbnails_check.grid(row=row, column=0, columnspan=2, sticky="w", padx=10, pady=5)
     
     def create_status_bar(self):
         """Create status bar at bottom"""
@@ -579,6 +831,7 @@ class ModernApp:
             # Load and resize image
             img = Image.open(image_path)
             img.thumbnail(self.settings["thumbnail_size"])
+            self.thumbnail_cache[image_path] = img
             img_tk = ImageTk.PhotoImage(img)
             self.image_thumbnails.append(img_tk)
             
@@ -775,6 +1028,7 @@ class ModernApp:
         if result:
             self.selected_images.clear()
             self.image_thumbnails.clear()
+            self.thumbnail_cache.clear()
             self.selected_image_vars.clear()
             self.resized_images_for_pdf.clear()
             
@@ -833,89 +1087,67 @@ class ModernApp:
         # Export in background thread
         threading.Thread(
             target=self.export_pdf_worker,
-            args=(selected_files, pdf_path),
+            args=(selected_files, pdf_path, self.get_export_options()),
             daemon=True
         ).start()
     
-    def export_pdf_worker(self, image_paths, pdf_path):
+    def get_export_options(self):
+        """Collect the PDF settings from the UI"""
+        split_mode = self.split_mode_var.get()
+        split_limit = max(1, self.split_limit_var.get())
+        watermark_text = ""
+        if self.apply_watermark.get():
+            watermark_text = self.watermark_text_var.get().strip()
+        footer_text = self.footer_text_var.get().strip()
+        if self.page_numbers_var.get():
+            footer_text = " - ".join(filter(None, [footer_text, PAGE_NUMBER_TEXT]))
+        
+        return ExportOptions(
+            page_size=self.page_size_var.get(),
+            fit_mode="Original Size",
+            quality=self.quality_var.get(),
+            color_mode=self.color_mode_var.get(),
+            color_management=self.color_management_var.get(),
+            transparency=self.transparency_var.get(),
+            background_color=self.settings["background_color"],
+            encoder=self.encoder_var.get(),
+            report=self.report_var.get(),
+            jpeg_passthrough=self.passthrough_var.get(),
+            clean_scans=self.clean_scans_var.get(),
+            auto_crop=self.auto_crop_var.get(),
+            skip_blank_pages=self.skip_blank_var.get(),
+            frame_range=self.frame_range_var.get(),
+            isolate_decoding=self.isolate_var.get(),
+            grayscale_threshold=self.settings["grayscale_threshold"],
+            watermark_text=watermark_text,
+            watermark_layout=self.watermark_layout_var.get(),
+            watermark_mode="Vector" if self.vector_watermark_var.get() else "Raster",
+            header_text=self.header_text_var.get().strip(),
+            footer_text=footer_text,
+            max_pages_per_volume=split_limit if split_mode == "Pages per Volume" else 0,
+            max_volume_bytes=split_limit * 1024 * 1024 if split_mode == "MB per Volume" else 0,
+            linearize=self.linearize_var.get(),
+            embed_thumbnails=self.thumbnails_var.get(),
+        )
+    
+    def export_pdf_worker(self, image_paths, pdf_path, options):
         """Worker thread for PDF export"""
         try:
             self.update_status("Processing images...")
             
-            images = []
-            total_images = len(image_paths)
-            
-            for i, path in enumerate(image_paths):
-                # Update progress
-                progress = (i / total_images) * 100
+            def on_progress(done, total, filename):
+                progress = (done / total) * 100
                 self.root.after(0, lambda p=progress: self.update_progress(p))
-                
-                # Load and process image
-                img = Image.open(path)
-                img = img.convert("RGB")
-                
-                # Apply watermark if enabled
-                if self.apply_watermark.get():
-                    img = self.add_watermark_to_image(img)
-                
-                images.append(img)
             
-            # Save PDF
-            self.update_status("Saving PDF...")
-            self.root.after(0, lambda: self.update_progress(90))
-            
-            if images:
-                images[0].save(pdf_path, save_all=True, append_images=images[1:])
+            exporter = PDFExporter(options, self.thumbnail_cache)
+            result = exporter.export(image_paths, pdf_path, on_progress)
             
             # Complete
-            self.root.after(0, lambda: self.export_complete(pdf_path))
+            self.root.after(0, lambda: self.export_complete(result.outputs[0], result))
             
         except Exception as e:
             self.root.after(0, lambda: self.export_error(str(e)))
     
-    def add_watermark_to_image(self, image):
-        """Add watermark to image"""
-        if not self.watermark_text_var.get().strip():
-            return image
-        
-        try:
-            watermark_img = image.copy()
-            draw = ImageDraw.Draw(watermark_img)
-            
-            # Try to load a font
-            try:
-                font = ImageFont.truetype("arial.ttf", 24)
-            except:
-                try:
-                    font = ImageFont.truetype("DejaVuSans.ttf", 24)
-                except:
-                    font = ImageFont.load_default()
-            
-            text = self.watermark_text_var.get().strip()
-            
-            # Get text size
-            try:
-                bbox = font.getbbox(text)
-                text_width = bbox[2] - bbox[0]
-                text_height = bbox[3] - bbox[1]
-            except AttributeError:
-                text_width, text_height = draw.textsize(text, font=font)
-            
-            # Position watermark
-            x = watermark_img.width - text_width - 20
-            y = watermark_img.height - text_height - 20
-            
-            # Draw shadow
-            draw.text((x + 2, y + 2), text, font=font, fill=(0, 0, 0, 128))
-            # Draw main text
-            draw.text((x, y), text, font=font, fill=(255, 255, 255, 200))
-            
-            return watermark_img
-            
-        except Exception as e:
-            print(f"Error adding watermark: {e}")
-            return image
-    
     def show_progress(self):
         """Show progress bar"""
         self.progress_bar.pack(side="right", padx=10, pady=5)
@@ -929,11 +1161,15 @@ class ModernApp:
         """Hide progress bar"""
         self.progress_bar.pack_forget()
     
-    def export_complete(self, pdf_path):
+    def export_complete(self, pdf_path, result=None):
         """Handle export completion"""
         self.hide_progress()
         self.update_status("PDF exported successfully")
         
+        if result is not None and (self.report_var.get() or result.skipped or
+                                   result.failed):
+            self.show_encoding_report(result)
+        
         if animation_manager:
             animation_manager.animate_notification(
                 self.root,
@@ -957,6 +1193,25 @@ class ModernApp:
                 except:
                     os.system(f'xdg-open "{pdf_path}"')  # Linux
     
+    def show_encoding_report(self, result):
+        """Show the encoder chosen for each page and the bytes it saved"""
+        colors = theme_manager.get_theme_colors()
+        
+        report_window = tk.Toplevel(self.root)
+        report_window.title("Encoding Report")
+        report_window.geometry("640x400")
+        report_window.configure(bg=colors["bg_primary"])
+        
+        text = tk.Text(report_window, font=("Consolas", 10), wrap="none",
+                      bg=colors["bg_secondary"], fg=colors["text_primary"])
+        scrollbar = tk.Scrollbar(report_window, command=text.yview)
+        text.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side="right", fill="y")
+        text.pack(side="left", fill="both", expand=True)
+        
+        text.insert("end", "\n".join(result.report_lines()))
+        text.configure(state="disabled")
+    
     def export_error(self, error_message):
         """Handle export error"""
         self.hide_progress()
@@ -0,0 +1,149 @@
+"""
+PDF Image Encoders for Image to PDF Converter
+Turn prepared PIL images into image XObject payloads
+"""
+
+import io
+import struct
+
+from Module.PDFWriter import EncodedImage, PDFName
+
+try:
+    from PIL import Image
+    from PIL.TiffImagePlugin import ROWSPERSTRIP, STRIPOFFSETS, STRIPBYTECOUNTS
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    Image = None
+
+
+JPEG_COLOR_SPACES = {"L": "DeviceGray", "RGB": "DeviceRGB", "CMYK": "DeviceCMYK"}
+MRC_BACKGROUND_QUALITY = 75  # Upper bound; text no longer lives here
+MRC_FOREGROUND_QUALITY = 75  # Upper bound; stroke edges come from the G4 mask
+
+
+def encode_jpeg(img, quality: int) -> EncodedImage:
+    """Encode an RGB, L or CMYK image as a DCTDecode XObject"""
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=quality)
+    # Pillow writes CMYK with an Adobe marker, i.e. inverted samples
+    decode = [1, 0] * 4 if img.mode == "CMYK" else None
+    return EncodedImage(buffer.getvalue(), img.width, img.height,
+                        PDFName(JPEG_COLOR_SPACES.get(img.mode, "DeviceRGB")),
+                        filter_name="DCTDecode", decode=decode)
+
+
+def encode_ccitt_g4(img) -> EncodedImage:
+    """Encode a bilevel image as CCITT Group 4 through libtiff"""
+    if img.mode != "1":
+        img = img.convert("1", dither=Image.Dither.NONE)
+    buffer = io.BytesIO()
+    # One strip for the whole page: the PDF filter expects a single G4 stream
+    img.save(buffer, "TIFF", compression="group4",
+             tiffinfo={ROWSPERSTRIP: img.height})
+    with Image.open(buffer) as tiff:
+        offset = tiff.tag_v2[STRIPOFFSETS][0]
+        length = tiff.tag_v2[STRIPBYTECOUNTS][0]
+    data = buffer.getvalue()[offset:offset + length]
+    return EncodedImage(data, img.width, img.height, PDFName("DeviceGray"),
+                        bits=1, filter_name="CCITTFaxDecode",
+                        decode_parms={"K": -1, "Columns": img.width,
+                                      "Rows": img.height, "BlackIs1": True})
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def iter_png_chunks(stream):
+    """Yield (type, data) for each chunk of a PNG file object"""
+    if stream.read(8) != PNG_SIGNATURE:
+        raise ValueError("Not a PNG stream")
+    while True:
+        header = stream.read(8)
+        if len(header) < 8:
+            return
+        length, chunk_type = struct.unpack(">I4s", header)
+        data = stream.read(length)
+        stream.read(4)  # CRC
+        yield chunk_type, data
+        if chunk_type == b"IEND":
+            return
+
+
+def to_palette(img, colors: int = 256):
+    """Palette image; exact when the page already has few enough colors"""
+    if img.mode == "P":
+        return img
+    if img.mode in ("1", "L"):
+        return img.convert("P")
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    exact = img.getcolors(colors)
+    if exact is not None:
+        return img.quantize(colors=len(exact), method=Image.Quantize.MEDIANCUT,
+                            dither=Image.Dither.NONE)
+    return img.quantize(colors=colors, method=Image.Quantize.FASTOCTREE,
+                        dither=Image.Dither.NONE)
+
+
+def png_payload(img, **save_args):
+    """(IDAT data, PLTE data) of the image saved as PNG.
+
+    Pillow's PNG writer does the row filtering and deflate; its IDAT
+    payload is exactly what FlateDecode with /Predictor 15 expects.
+    """
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG", **save_args)
+    buffer.seek(0)
+    palette, idat = b"", []
+    for chunk_type, data in iter_png_chunks(buffer):
+        if chunk_type == b"PLTE":
+            palette = data
+        elif chunk_type == b"IDAT":
+            idat.append(data)
+    return b"".join(idat), palette
+
+
+def encode_flate(img) -> EncodedImage:
+    """Encode an L or RGB image losslessly with Flate and the PNG predictor"""
+    if img.mode not in ("L", "RGB"):
+        img = img.convert("RGB")
+    colors = 1 if img.mode == "L" else 3
+    data, _ = png_payload(img)
+    return EncodedImage(data, img.width, img.height,
+                        PDFName(JPEG_COLOR_SPACES[img.mode]),
+                        filter_name="FlateDecode",
+                        decode_parms={"Predictor": 15, "Colors": colors,
+                                      "BitsPerComponent": 8,
+                                      "Columns": img.width})
+
+
+def encode_indexed(img, colors: int = 256) -> EncodedImage:
+    """Encode as /Indexed with Flate and the PNG predictor"""
+    img = to_palette(img, colors)
+    used = len(img.getpalette() or []) // 3 or 256
+    bits = 1 if used <= 2 else 2 if used <= 4 else 4 if used <= 16 else 8
+
+    data, palette = png_payload(img, bits=bits)
+    color_space = [PDFName("Indexed"), PDFName("DeviceRGB"),
+                   len(palette) // 3 - 1, b"<" + palette.hex().encode("ascii") + b">"]
+    return EncodedImage(data, img.width, img.height, color_space,
+                        bits=bits, filter_name="FlateDecode",
+                        decode_parms={"Predictor": 15, "Colors": 1,
+                                      "BitsPerComponent": bits,
+                                      "Columns": img.width})
+
+
+def encode_mrc(mask, background, foreground, quality: int):
+    """Encode MRC layers: a JPEG background and a masked JPEG foreground.
+
+    The G4 text mask becomes the foreground's explicit /Mask, so the
+    coarse foreground colors only show through where the strokes are.
+    """
+    stencil = encode_ccitt_g4(mask)
+    stencil.color_space = None
+    stencil.extra["ImageMask"] = True
+    base = encode_jpeg(background, min(quality, MRC_BACKGROUND_QUALITY))
+    ink = encode_jpeg(foreground, min(quality, MRC_FOREGROUND_QUALITY))
+    ink.extra["Mask"] = stencil
+    return [base, ink]
@@ -0,0 +1,1358 @@
+"""
+PDF Export Pipeline for Image to PDF Converter
+Shared page preparation, encoding and volume planning used by the app windows
+"""
+
+import contextlib
+import hashlib
+import os
+import queue
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from Module.PDFWriter import PDFWriter, PDFName, EncodedImage, winansi_literal
+from Module.PDFLinearizer import linearize_pdf
+from Module.PageCleanup import (whiten_background, crop_uniform_borders,
+                                is_blank_page)
+from Module.PDFEncoders import (JPEG_COLOR_SPACES, encode_jpeg, encode_ccitt_g4, encode_indexed,
+                                encode_mrc, encode_flate)
+from Module.ImageAnalysis import (NUMPY_AVAILABLE, GRAYSCALE_MODES,
+                                  is_grayscale, adaptive_threshold,
+                                  classify_page, split_mrc_layers)
+from Module.ColorManagement import source_profile, to_srgb, attach_profile
+from Module.Transparency import has_alpha, decode_with_alpha, flatten
+from Module.StreamingDecode import (open_image, needs_streaming, can_stream,
+                                    read_reduced, stream_flate)
+from Module.DecodeIsolation import (DecodePool, DecodeError, PAGE_BUFFER_BLOCKS,
+                                    keep_page_blocks, restore_blocks)
+from Module.ParallelResample import parallel_resize
+from Module.Watermark import watermark_spec, apply_watermark, VectorWatermark
+from Module.PageStamps import PageStamper
+from Module.PagePipeline import (PageState, PagePlan, Stage, register_stage,
+                                 plan_page)
+from Module.Utils import PDFUtils, FileUtils
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    Image = None
+
+
+THUMBNAIL_SIZE = (106, 106)  # Largest thumbnail the PDF spec recommends
+THUMBNAIL_QUALITY = 75
+DIGEST_CHUNK = 1024 * 1024  # Bytes read at a time when hashing a source file
+
+ENCODER_LABELS = {
+    "jpeg": "JPEG",
+    "gray": "DeviceGray JPEG",
+    "indexed": "Indexed Flate",
+    "g4": "CCITT G4",
+    "mrc": "MRC (G4 + JPEG)",
+    "passthrough": "JPEG (unchanged)",
+    "streamed": "Flate (streamed)",
+}
+
+EXIF_ORIENTATION = 0x0112
+
+# Pillow transpose that turns stored pixels into the displayed image
+ORIENTATION_TRANSPOSE = {
+    2: "FLIP_LEFT_RIGHT",
+    3: "ROTATE_180",
+    4: "FLIP_TOP_BOTTOM",
+    5: "TRANSPOSE",
+    6: "ROTATE_270",
+    7: "TRANSVERSE",
+    8: "ROTATE_90",
+}
+
+
+class ExportOptions:
+    """Settings for one export run; unknown keys are rejected"""
+
+    DEFAULTS = {
+        "page_size": "A4",
+        "fit_mode": "Fit to Page",   # "Fit to Page", "Fill Page", "Original Size"
+        "margin": 50,
+        "dpi": 72,
+        "quality": 95,
+        "watermark_text": "",        # empty string disables the watermark
+        "watermark_image": "",       # logo file, drawn above the text
+        "watermark_layout": "Corner",  # "Corner", "Tiled", "Diagonal"
+        "watermark_opacity": 1.0,    # scales the watermark's transparency
+        "watermark_mode": "Raster",  # "Raster" into the pixels, "Vector" PDF form
+        "header_text": "",           # stamped as PDF text; "" = none
+        "footer_text": "",           # {page}, {pages}, {date} and {name} are filled in
+        "max_pages_per_volume": 0,   # 0 = no page limit
+        "max_volume_bytes": 0,       # 0 = no size limit
+        "max_workers": 0,            # 0 = one per CPU
+        "linearize": False,          # fast web view
+        "embed_thumbnails": False,   # per-page /Thumb images
+        "color_mode": "Auto",        # "Auto", "Color", "Grayscale"
+        "color_management": "Convert",  # "Convert", "Embed ICC", "Off"
+        "transparency": "Flatten",   # "Flatten" onto background, "Preserve"
+        "background_color": "#FFFFFF",
+        "grayscale_threshold": 5.0,  # colorfulness below this is gray in Auto
+        "encoder": "Auto",           # "Auto" (per page), "JPEG", "Indexed", "G4", "MRC"
+        "palette_colors": 256,
+        "report": False,             # also measure a plain JPEG per page
+        "jpeg_passthrough": False,   # embed JPEGs that need no changes as-is
+        "clean_scans": False,        # whiten paper background and despeckle
+        "auto_crop": False,          # trim uniform borders before resizing
+        "skip_blank_pages": False,   # drop blank scans before any encoding
+        "frame_range": "",           # e.g. "1-3,5" for multi-frame files; "" = all
+        "isolate_decoding": True,    # decode in worker processes with limits
+        "decode_timeout": 60,        # seconds per image in a worker
+        "decode_memory_mb": 2048,    # extra address space a worker may use
+    }
+
+    def __init__(self, **overrides):
+        unknown = set(overrides) - set(self.DEFAULTS)
+        if unknown:
+            raise ValueError(
+                f"Unknown export option(s): {', '.join(sorted(unknown))}")
+        for key, value in self.DEFAULTS.items():
+            setattr(self, key, overrides.get(key, value))
+
+    @property
+    def splits_output(self) -> bool:
+        return bool(self.max_pages_per_volume or self.max_volume_bytes)
+
+    @property
+    def has_watermark(self) -> bool:
+        return bool(self.watermark_text or self.watermark_image)
+
+    @property
+    def raster_watermark(self) -> bool:
+        """Whether the watermark changes pixels (vector marks do not).
+
+        Vector text is drawn with standard Helvetica, so text it cannot
+        show (e.g. CJK or Cyrillic) falls back to the raster mark.
+        """
+        return self.has_watermark and (
+            self.watermark_mode != "Vector" or
+            winansi_literal(self.watermark_text) is None)
+
+    @property
+    def has_stamps(self) -> bool:
+        return bool(self.header_text or self.footer_text)
+
+    @property
+    def worker_count(self) -> int:
+        return self.max_workers or os.cpu_count() or 1
+
+
+MULTI_FRAME_FORMATS = {"TIFF", "GIF"}
+
+# Raised by Pillow for files it cannot identify or whose header is corrupt
+HEADER_ERRORS = (OSError, SyntaxError, ValueError, Image.DecompressionBombError) \
+    if PIL_AVAILABLE else (OSError,)
+
+
+class SourcePage:
+    """One input page: an image file and, for multi-frame files, a frame"""
+
+    def __init__(self, path: str, frame: int = 0, frame_count: int = 1):
+        self.path = path
+        self.frame = frame
+        self.frame_count = frame_count
+        self.content_key: Optional[str] = None  # shared by identical pages
+
+    @property
+    def label(self) -> str:
+        name = os.path.basename(self.path)
+        if self.frame_count > 1:
+            return f"{name} [{self.frame + 1}/{self.frame_count}]"
+        return name
+
+
+def file_digest(path: str) -> str:
+    """Fast content hash of a whole file"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(DIGEST_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def mark_duplicates(sources: List[SourcePage]) -> int:
+    """Give pages read from identical files a shared content_key.
+
+    Only files of equal size are compared: paths to the same inode match
+    without reading, other files are hashed once each. Returns how many
+    pages repeat an earlier one.
+    """
+    by_size: Dict[int, list] = defaultdict(list)
+    for source in sources:
+        try:
+            stat = os.stat(source.path)
+        except OSError:
+            continue  # Reported when the page itself fails to open
+        by_size[stat.st_size].append((source, (stat.st_dev, stat.st_ino)))
+
+    keys: Dict[str, List[SourcePage]] = defaultdict(list)
+    for group in by_size.values():
+        if len(group) < 2:
+            continue
+        files = {inode for _, inode in group}
+        digests = {}
+        for source, inode in group:
+            if inode not in digests:
+                try:
+                    digests[inode] = file_digest(source.path) \
+                        if len(files) > 1 else "%d:%d" % inode
+                except OSError:
+                    digests[inode] = "%d:%d" % inode
+            keys[f"{digests[inode]}#{source.frame}"].append(source)
+
+    repeats = 0
+    for key, pages in keys.items():
+        if len(pages) > 1:
+            for source in pages:
+                source.content_key = key
+            repeats += len(pages) - 1
+    return repeats
+
+
+def parse_frame_range(text: str, count: int) -> List[int]:
+    """Zero-based frame indexes for a 1-based range like "1-3,5" """
+    if not text.strip():
+        return list(range(count))
+    frames = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        try:
+            start = int(first) if first.strip() else 1
+            end = int(last) if last.strip() else (count if _ else start)
+        except ValueError:
+            raise ValueError(f"Invalid frame range: {text!r}")
+        frames.extend(index - 1 for index in range(max(1, start), end + 1)
+                      if index <= count)
+    return sorted(set(frames))
+
+
+def expand_frames(image_paths: List[str], frame_range: str = "") -> List[SourcePage]:
+    """One SourcePage per frame of multi-frame TIFF and GIF files.
+
+    Only headers are read; frames are decoded later, one at a time.
+    """
+    pages = []
+    for path in image_paths:
+        try:
+            with open_image(path) as img:
+                count = getattr(img, "n_frames", 1) \
+                    if img.format in MULTI_FRAME_FORMATS else 1
+        except HEADER_ERRORS:
+            count = 1  # Reported when the page itself fails to open
+        if count == 1:
+            pages.append(SourcePage(path))
+            continue
+        pages.extend(SourcePage(path, frame, count)
+                     for frame in parse_frame_range(frame_range, count))
+    return pages
+
+
+class FrameReader:
+    """Keep one file open and seek forward through its frames"""
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.image = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def read(self, source: SourcePage):
+        """The image positioned at the source's frame.
+
+        Only moving forward within the same file reuses the open image;
+        anything else reopens, so draft() on a previous read never leaks.
+        """
+        if self.image is None or source.path != self.path or \
+                source.frame <= self.image.tell():
+            self.close()
+            self.image = open_image(source.path)
+            self.path = source.path
+        if source.frame != self.image.tell():
+            self.image.seek(source.frame)
+        return self.image
+
+    def release(self):
+        """Hand over the open image; the caller closes it"""
+        image, self.image = self.image, None
+        return image
+
+    def close(self):
+        if self.image is not None:
+            self.image.close()
+            self.image = None
+
+
+_worker_frames = FrameReader()  # Used by decode_source in decoder workers
+
+
+class PreparedPage:
+    """An encoded page ready to be handed to the PDF writer"""
+
+    def __init__(self, source: SourcePage, layers: List[EncodedImage],
+                 width: float, height: float, encoder: str = "jpeg"):
+        self.source = source
+        self.layers = layers  # drawn bottom to top over the full page
+        self.width = width
+        self.height = height
+        self.encoder = encoder
+        self.orientation = 1  # EXIF orientation applied when placing
+        self.thumbnail: Optional[EncodedImage] = None
+        self.baseline_bytes = 0
+        self.plan: Optional[PagePlan] = None  # stages that produced the page
+
+    def repeat(self, source: SourcePage) -> "PreparedPage":
+        """The same page for an identical source; the writer reuses the
+        images already written for it, so no layers are carried"""
+        page = PreparedPage(source, [], self.width, self.height, self.encoder)
+        page.orientation = self.orientation
+        page.plan = self.plan
+        return page
+
+
+class PageFailure:
+    """A page left out because its image could not be decoded"""
+
+    def __init__(self, index: int, source: SourcePage, reason: str):
+        self.index = index
+        self.source = source
+        self.reason = reason
+
+
+class PageReport:
+    """Encoder choice and size of one exported page"""
+
+    def __init__(self, index: int, page: PreparedPage):
+        self.index = index
+        self.source = page.source
+        self.encoder = page.encoder
+        self.bytes = sum(layer.total_bytes for layer in page.layers)
+        self.baseline_bytes = page.baseline_bytes
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.baseline_bytes - self.bytes if self.baseline_bytes else 0
+
+
+class ExportResult:
+    """Summary of a finished export"""
+
+    def __init__(self):
+        self.outputs: List[str] = []
+        self.page_count = 0
+        self.pages: List[PageReport] = []
+        self.skipped: List[SourcePage] = []  # inputs dropped as blank pages
+        self.failed: List[PageFailure] = []  # pages whose decode failed
+
+    def report_lines(self) -> List[str]:
+        """One line per page: encoder, encoded size and saving over JPEG"""
+        lines = []
+        for report in self.pages:
+            line = (f"{report.index + 1:4d}. {report.source.label} - "
+                    f"{ENCODER_LABELS[report.encoder]}, "
+                    f"{FileUtils.format_file_size(report.bytes)}")
+            if report.baseline_bytes:
+                line += f" (saved {FileUtils.format_file_size(report.bytes_saved)})" \
+                    if report.bytes_saved >= 0 else \
+                    f" (+{FileUtils.format_file_size(-report.bytes_saved)})"
+            lines.append(line)
+        total = sum(report.bytes for report in self.pages)
+        baseline = sum(report.baseline_bytes for report in self.pages)
+        if baseline:
+            lines.append(f"Total: {FileUtils.format_file_size(total)} vs "
+                         f"{FileUtils.format_file_size(baseline)} as plain JPEG")
+        if self.skipped:
+            lines.append(f"Skipped {len(self.skipped)} blank page(s):")
+            lines.extend(f"      {source.label}" for source in self.skipped)
+        if self.failed:
+            lines.append(f"Failed to decode {len(self.failed)} page(s):")
+            lines.extend(f"      {failure.source.label} - {failure.reason}"
+                         for failure in self.failed)
+        return lines
+
+
+def decode_pixels(img, target: str, keep_mode: bool, draft, reduce_to,
+                  transparency: str, background: str, owned: bool = False):
+    """Decode an opened image for the page pipeline.
+
+    draft is a (mode, size) request for reduced-scale JPEG decoding and
+    reduce_to a size for band-decoding huge images. keep_mode leaves
+    ICC-tagged data in its own space until after downscaling. An owned
+    image already in the right mode is handed over without a copy;
+    otherwise the opened file stays untouched for the next frame.
+    """
+    if reduce_to:
+        img = read_reduced(img, reduce_to)
+    elif draft:
+        img.draft(*draft)
+    if has_alpha(img):
+        return decode_with_alpha(img, target, transparency, background)
+    if owned and (keep_mode or img.mode == target):
+        img.load()
+        return img
+    return img.copy() if keep_mode else img.convert(target)
+
+
+def decode_source(source: SourcePage, *args):
+    """decode_pixels for a page read here; what decoder workers run.
+
+    A worker keeps a multi-frame file open until its last frame, and the
+    pool hands the file's next frame back to the same worker, so the file
+    is read forward once instead of from the start for every page.
+    """
+    img = _worker_frames.read(source)
+    if source.frame + 1 < source.frame_count:
+        return decode_pixels(img, *args, owned=True)
+    _worker_frames.release()  # Nothing is kept between files
+    with img:
+        return decode_pixels(img, *args, owned=True)
+
+
+def stream_source(source: SourcePage, mode: str, background, part_path: str):
+    """stream_flate for a page opened here, written to part_path; what
+    decoder workers run for full-resolution streamed pages"""
+    with open_image(source.path) as img, open(part_path, "wb") as part:
+        if source.frame:
+            img.seek(source.frame)
+        for chunk in stream_flate(img, mode, background):
+            part.write(chunk)
+
+
+def read_part(part_path: str, chunk_size: int = 1024 * 1024):
+    """Chunks of a file written by stream_source, removed once read"""
+    try:
+        with open(part_path, "rb") as part:
+            while True:
+                chunk = part.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+    finally:
+        os.remove(part_path)
+
+
+def fit_dimensions(size: Tuple[int, int], options: ExportOptions) -> Tuple[int, int]:
+    """Scaled image size for the configured page size and fit mode"""
+    img_width, img_height = size
+    if options.fit_mode not in ("Fit to Page", "Fill Page"):
+        return size
+
+    page_width, page_height = PDFUtils.get_page_size(options.page_size)
+    scale = options.dpi / 72.0
+    available_width = (page_width - 2 * options.margin) * scale
+    available_height = (page_height - 2 * options.margin) * scale
+
+    width_scale = available_width / img_width
+    height_scale = available_height / img_height
+    if options.fit_mode == "Fit to Page":
+        scale_factor = min(width_scale, height_scale, 1.0)  # Don't upscale
+    else:
+        scale_factor = max(width_scale, height_scale)
+
+    return int(img_width * scale_factor), int(img_height * scale_factor)
+
+
+def page_layout(size: Tuple[int, int], options: ExportOptions):
+    """Scaled size and the part of it kept on the page: (size, box).
+
+    The box is (left, top, width, height) in scaled pixels; Fill Page
+    keeps the centre of an image that overflows the printable area.
+    """
+    new_width, new_height = fit_dimensions(size, options)
+    box = (0, 0, new_width, new_height)
+    if options.fit_mode == "Fill Page":
+        page_width, page_height = PDFUtils.get_page_size(options.page_size)
+        scale = options.dpi / 72.0
+        available_width = int((page_width - 2 * options.margin) * scale)
+        available_height = int((page_height - 2 * options.margin) * scale)
+        if new_width > available_width or new_height > available_height:
+            box = (max(0, (new_width - available_width) // 2),
+                   max(0, (new_height - available_height) // 2),
+                   min(available_width, new_width),
+                   min(available_height, new_height))
+    return (new_width, new_height), box
+
+
+def resize_image_for_page(img, options: ExportOptions, orientation: int = 1,
+                          layout_size: Optional[Tuple[int, int]] = None):
+    """Resize image to fit within page dimensions based on fit mode.
+
+    The Fill Page crop is part of the same resample (a source box), so
+    the oversized intermediate is never built. With an orientation, img
+    holds the stored pixels and is sized to fit once transposed. When img
+    is a downscaled copy, layout_size is the size the page is laid out
+    from, so the page comes out as it would from the original.
+    """
+    (new_width, new_height), (left, top, width, height) = page_layout(
+        oriented_size(layout_size or img.size, orientation), options)
+    if orientation >= 5:
+        new_width, new_height = new_height, new_width
+        left, top, width, height = top, left, height, width
+    if (new_width, new_height) == img.size:
+        if (width, height) == img.size:
+            return img
+        return img.crop((left, top, left + width, top + height))
+
+    scale_x = img.width / new_width
+    scale_y = img.height / new_height
+    box = (left * scale_x, top * scale_y,
+           (left + width) * scale_x, (top + height) * scale_y)
+    return parallel_resize(img, (width, height), Image.Resampling.LANCZOS,
+                           options.worker_count, box)
+
+
+def exif_orientation(img) -> int:
+    """EXIF orientation tag (1-8) read from the header; 1 when absent"""
+    if img.format == "PNG" and "exif" not in img.info:
+        return 1  # Pillow would decode the whole image looking for eXIf
+    try:
+        orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+    except Exception:
+        return 1
+    return orientation if orientation in ORIENTATION_TRANSPOSE else 1
+
+
+def oriented_size(size: Tuple[int, int], orientation: int) -> Tuple[int, int]:
+    """Displayed size of an image with the given EXIF orientation"""
+    return (size[1], size[0]) if orientation >= 5 else size
+
+
+def apply_orientation(img, orientation: int):
+    """Transpose stored pixels into their displayed orientation"""
+    if orientation == 1:
+        return img
+    return img.transpose(getattr(Image.Transpose,
+                                 ORIENTATION_TRANSPOSE[orientation]))
+
+
+def make_page_thumbnail(source, page_size: Tuple[int, int],
+                        background: str = "#FFFFFF") -> EncodedImage:
+    """Small JPEG /Thumb image cropped to the page's aspect ratio.
+
+    Crop and downscale are a single resize with a source box, so the
+    page itself is never copied. Transparent previews are flattened onto
+    the page background, as the page itself is.
+    """
+    if source.mode not in ("RGB", "L", "RGBA", "CMYK"):
+        source = source.convert("RGBA" if has_alpha(source) else "RGB")
+    page_width, page_height = page_size
+    ratio = page_width / page_height
+    box = (0, 0, source.width, source.height)
+    if abs(source.width / source.height - ratio) > 0.02:
+        if source.width / source.height > ratio:
+            width = max(1, round(source.height * ratio))
+            left = (source.width - width) // 2
+            box = (left, 0, left + width, source.height)
+        else:
+            height = max(1, round(source.width / ratio))
+            top = (source.height - height) // 2
+            box = (0, top, source.width, top + height)
+    box_width, box_height = box[2] - box[0], box[3] - box[1]
+    scale = min(THUMBNAIL_SIZE[0] / box_width, THUMBNAIL_SIZE[1] / box_height, 1.0)
+    size = (max(1, round(box_width * scale)), max(1, round(box_height * scale)))
+    thumb = source.resize(size, Image.Resampling.BILINEAR, box=box)
+    if thumb.mode == "RGBA":
+        thumb = flatten(thumb, background)
+    if thumb.mode not in ("RGB", "L"):
+        thumb = thumb.convert("RGB")
+    return encode_jpeg(thumb, THUMBNAIL_QUALITY)
+
+
+class VolumePlanner:
+    """Plan split points from estimated page sizes before anything is encoded"""
+
+    # Approximate JPEG bits per pixel for photographic content by quality
+    JPEG_BITS_PER_PIXEL = ((50, 0.9), (75, 1.4), (85, 1.9),
+                           (90, 2.4), (95, 3.4), (100, 7.0))
+    PAGE_OVERHEAD = 400  # Page, content stream and xref entry
+    GRAYSCALE_RATIO = 0.65  # Luma only, no subsampled chroma planes
+    BILEVEL_BITS_PER_PIXEL = 0.15  # CCITT G4 on typical text pages
+    MRC_BITS_PER_PIXEL = 0.5  # G4 mask plus reduced JPEG layers
+
+    def __init__(self, options: ExportOptions):
+        self.options = options
+
+    def bits_per_pixel(self) -> float:
+        quality = self.options.quality
+        previous_q, previous_bpp = self.JPEG_BITS_PER_PIXEL[0]
+        for q, bpp in self.JPEG_BITS_PER_PIXEL:
+            if quality <= q:
+                if q == previous_q:
+                    return bpp
+                t = (quality - previous_q) / (q - previous_q)
+                return previous_bpp + t * (bpp - previous_bpp)
+            previous_q, previous_bpp = q, bpp
+        return previous_bpp
+
+    def estimate_page_bytes(self, source: SourcePage) -> int:
+        """Estimate the encoded size of a page from the image header only"""
+        try:
+            with open_image(source.path) as img:
+                if source.frame:
+                    img.seek(source.frame)
+                width, height = fit_dimensions(img.size, self.options)
+        except HEADER_ERRORS:
+            return self.PAGE_OVERHEAD
+        pixels = width * height
+        bits = self.bits_per_pixel()
+        if self.options.encoder == "G4":
+            bits = self.BILEVEL_BITS_PER_PIXEL
+        elif self.options.encoder == "MRC":
+            bits = self.MRC_BITS_PER_PIXEL
+        elif self.options.color_mode == "Grayscale":
+            bits *= self.GRAYSCALE_RATIO
+        return int(pixels * bits / 8) + self.PAGE_OVERHEAD
+
+    def plan(self, pages: List[SourcePage]) -> List[List[SourcePage]]:
+        """Group pages into volumes honouring the page and byte caps"""
+        max_pages = self.options.max_pages_per_volume
+        max_bytes = self.options.max_volume_bytes
+        if not (max_pages or max_bytes):
+            return [list(pages)] if pages else []
+
+        volumes: List[List[SourcePage]] = []
+        current: List[SourcePage] = []
+        current_bytes = 0
+        for page in pages:
+            page_bytes = self.estimate_page_bytes(page) if max_bytes else 0
+            full = (max_pages and len(current) >= max_pages) or \
+                (max_bytes and current and current_bytes + page_bytes > max_bytes)
+            if full:
+                volumes.append(current)
+                current, current_bytes = [], 0
+            if page.content_key and any(page.content_key == other.content_key
+                                        for other in current):
+                page_bytes = self.PAGE_OVERHEAD  # Images already in the volume
+            current.append(page)
+            current_bytes += page_bytes
+        if current:
+            volumes.append(current)
+        return volumes
+
+
+def remove_outputs(outputs: List[str]):
+    """Delete the files of a failed export, including unfinished ones"""
+    for output in outputs:
+        for path in (output, output + ".part"):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def no_pages_message(failed: List[PageFailure]) -> str:
+    message = "None of the selected images could be decoded"
+    return message + ":\n" + failed[0].reason if failed else message
+
+
+def volume_paths(pdf_path: str, count: int) -> List[str]:
+    """Output names for a split export: name_001.pdf, name_002.pdf, ..."""
+    if count <= 1:
+        return [pdf_path]
+    base, ext = os.path.splitext(pdf_path)
+    ext = ext or ".pdf"
+    return [f"{base}_{index:03d}{ext}" for index in range(1, count + 1)]
+
+
+def renumber_volumes(pdf_path: str, outputs: List[str],
+                     written: List[int]) -> List[str]:
+    """Close the gaps left by volumes none of whose pages decoded.
+
+    Their files are already gone; the rest are renamed in order, so a
+    split never reports a missing or empty volume.
+    """
+    kept = [output for output, count in zip(outputs, written) if count]
+    if len(kept) == len(outputs):
+        return outputs
+    renamed = volume_paths(pdf_path, len(kept))
+    for old, new in zip(kept, renamed):
+        if old != new:
+            os.replace(old, new)
+    return renamed
+
+
+def predicted_decode_size(img, draft_size, reduce_to) -> Tuple[int, int]:
+    """Pixel size decode_pixels will produce, from the header alone"""
+    if reduce_to:
+        factor = max(1, min(img.width // max(1, reduce_to[0]),
+                            img.height // max(1, reduce_to[1])))
+        return img.width // factor, img.height // factor
+    if draft_size and img.format == "JPEG":
+        # JPEG draft picks the largest DCT scale still covering the size
+        scale = min(img.width // draft_size[0], img.height // draft_size[1])
+        scale = next((s for s in (8, 4, 2, 1) if scale >= s), 1)
+        return -(-img.width // scale), -(-img.height // scale)
+    return img.size
+
+
+class DecodeStage(Stage):
+    """Decode at the smallest useful scale; may absorb the mode conversion"""
+
+    name = "decode"
+    absorbs = ("convert",)
+
+    def plan(self, state, plan):
+        draft = state.exporter.draft_request(state.header, state.orientation,
+                                             None)
+        draft_size = draft[1] if draft else None
+        plan.size = predicted_decode_size(state.header, draft_size,
+                                          state.reduce_to)
+        return {"draft_size": draft_size, "reduce_to": state.reduce_to,
+                "mode": None}
+
+    def run(self, state, draft_size, reduce_to, mode):
+        header = state.header
+        draft = None
+        if draft_size:
+            draft = (mode if header.mode != "CMYK" else None, draft_size)
+        # Without a fused conversion the source mode is kept for later stages
+        args = (state.target, mode is None, draft, reduce_to,
+                state.options.transparency, state.options.background_color)
+        decoder = state.exporter.decoder
+        if decoder is not None:
+            state.img = decoder.run(decode_source, state.source, *args,
+                                   affinity=state.source.path)
+        else:
+            state.img = decode_pixels(header, *args)
+
+
+class ConvertStage(Stage):
+    """Convert to the page's target mode; cheaper after a downscale"""
+
+    name = "convert"
+    movable = True
+    RESAMPLABLE = ("L", "RGB", "CMYK")
+
+    def plan(self, state, plan):
+        header = state.header
+        if state.profile is not None or has_alpha(header) or \
+                header.mode == state.target:
+            return None  # Kept for the color stage, or nothing to do
+        # JPEGs convert inside the decoder; palette and bilevel data must
+        # not be resampled; auto-crop judges borders in the target mode
+        pinned = header.format == "JPEG" or header.mode not in self.RESAMPLABLE \
+            or state.options.auto_crop
+        return {"mode": state.target, "pinned": pinned}
+
+    def run(self, state, mode, pinned=False):
+        if state.img.mode != mode and state.img.mode != "RGBA":
+            state.img = state.img.convert(mode)
+
+
+class OrientStage(Stage):
+    """Apply the EXIF orientation to the pixels"""
+
+    name = "orient"
+    movable = True
+
+    def plan(self, state, plan):
+        if state.orientation == 1:
+            return None
+        return {"orientation": state.orientation}
+
+    def run(self, state, orientation):
+        state.img = apply_orientation(state.img, orientation)
+        state.upright = True
+
+
+class CropStage(Stage):
+    """Trim uniform borders before anything is resampled"""
+
+    name = "crop"
+
+    def plan(self, state, plan):
+        return {} if state.options.auto_crop else None
+
+    def run(self, state):
+        state.img = crop_uniform_borders(state.img)
+
+
+class ResizeStage(Stage):
+    """Fit (and for Fill Page, crop) the page in a single resample"""
+
+    name = "resize"
+
+    def plan(self, state, plan):
+        options = state.options
+        if options.fit_mode not in ("Fit to Page", "Fill Page"):
+            return None
+        if plan.size and not options.auto_crop:
+            displayed = oriented_size(plan.size, state.orientation)
+            (width, height), box = page_layout(displayed, options)
+            if (width, height) == displayed and box[2:] == displayed:
+                return None
+            plan.shrinks = box[2] * box[3] < displayed[0] * displayed[1]
+        else:
+            plan.shrinks = True  # Auto-crop size is unknown until it runs
+        return {}
+
+    def run(self, state):
+        orientation = 1 if state.upright else state.orientation
+        state.img = resize_image_for_page(state.img, state.options, orientation)
+
+
+class AlphaStage(Stage):
+    """Split preserved transparency off into a soft mask"""
+
+    name = "alpha"
+
+    def plan(self, state, plan):
+        if state.options.transparency != "Preserve" or not has_alpha(state.header):
+            return None
+        return {}
+
+    def run(self, state):
+        if state.img.mode == "RGBA":
+            state.alpha = state.img.getchannel("A")
+            state.img = state.img.convert(state.target)
+
+
+class ColorStage(Stage):
+    """Convert ICC-tagged pixels to sRGB, or keep them to embed the profile"""
+
+    name = "color"
+
+    def plan(self, state, plan):
+        return {} if state.profile is not None else None
+
+    def run(self, state):
+        img = state.img
+        state.embed = state.exporter.keeps_source_space(img, state.target)
+        if not state.embed:
+            img = to_srgb(img, state.profile)
+            if state.target == "L":
+                img = img.convert("L")
+        state.img = img
+
+
+class CleanStage(Stage):
+    """Whiten the paper background of scans"""
+
+    name = "clean"
+
+    def plan(self, state, plan):
+        return {} if state.options.clean_scans else None
+
+    def run(self, state):
+        state.img = whiten_background(state.img)
+
+
+class CompositeStage(Stage):
+    """Blend the cached watermark overlay onto the page"""
+
+    name = "composite"
+
+    def plan(self, state, plan):
+        if not state.options.raster_watermark:
+            return None  # Vector marks are added when the page is written
+        return {"spec": watermark_spec(state.options)}
+
+    def run(self, state, spec):
+        state.img = apply_watermark(state.img, spec)
+
+
+class EncodeStage(Stage):
+    """Pick the encoder and produce the page's image layers"""
+
+    name = "encode"
+
+    def plan(self, state, plan):
+        return {}
+
+    def run(self, state):
+        exporter, img = state.exporter, state.img
+        state.encoder = "jpeg" if img.mode == "CMYK" else \
+            exporter.choose_encoder(img)
+        state.layers = exporter.encode_page(img, state.encoder)
+        if state.embed:
+            attach_profile(state.layers, state.profile)
+        if state.alpha is not None:
+            # On the bottom layer; an MRC ink layer keeps its stencil /Mask
+            state.layers[0].extra["SMask"] = encode_flate(state.alpha)
+
+
+for _stage in (DecodeStage(), ConvertStage(), OrientStage(), CropStage(),
+               ResizeStage(), AlphaStage(), ColorStage(), CleanStage(),
+               CompositeStage(), EncodeStage()):
+    register_stage(_stage)
+
+
+class PDFExporter:
+    """Turn a list of image paths into one or more PDF files.
+
+    Multi-frame TIFF and GIF files contribute one page per frame.
+    """
+
+    def __init__(self, options: Optional[ExportOptions] = None,
+                 thumbnail_cache: Optional[dict] = None):
+        self.options = options or ExportOptions()
+        self.thumbnail_cache = thumbnail_cache or {}
+        self.decoder: Optional[DecodePool] = None  # set while exporting
+
+    def prepare_page(self, source: SourcePage,
+                     reader: Optional[FrameReader] = None) -> PreparedPage:
+        """Decode, resize, watermark and encode a single page"""
+        if reader is None:
+            with FrameReader() as reader:
+                return self.prepare_page(source, reader)
+
+        state = self.page_state(source, reader)
+        if isinstance(state, PreparedPage):
+            return state
+        plan = plan_page(state)
+        plan.run(state)
+
+        return self.finish_page(state, plan)
+
+    def finish_page(self, state: PageState, plan: PagePlan) -> PreparedPage:
+        """PreparedPage for an encoded state, with its report and thumbnail"""
+        img, source = state.img, state.source
+        scale = 72.0 / self.options.dpi
+        page = PreparedPage(source, state.layers, img.width * scale,
+                            img.height * scale, state.encoder)
+        page.plan = plan
+        if self.options.report:
+            baseline = img.convert("RGB") if img.mode != "RGB" else img
+            page.baseline_bytes = len(
+                encode_jpeg(baseline, self.options.quality).data)
+        if self.options.embed_thumbnails:
+            # The preview thumbnail is already in memory; otherwise the
+            # finished page is downscaled, which costs no extra decode
+            cached = self.cached_preview(source)
+            preview = apply_orientation(cached, state.orientation) \
+                if cached else img
+            page.thumbnail = make_page_thumbnail(preview, img.size,
+                                                 self.options.background_color)
+        return page
+
+    def page_state(self, source: SourcePage, reader: FrameReader):
+        """Read the page header and decide how it is handled.
+
+        Returns a finished PreparedPage for pages that need no pixel
+        stages (JPEG passthrough, full-size streaming), otherwise the
+        PageState the planner works from.
+        """
+        return self.state_for(source, self.read_header(source, reader))
+
+    def read_header(self, source: SourcePage, reader: FrameReader):
+        """Open the page's image; with isolated decoding a bad header fails
+        only this page"""
+        try:
+            return reader.read(source)
+        except HEADER_ERRORS as exc:
+            if self.decoder is None:
+                raise
+            raise DecodeError(f"{type(exc).__name__}: {exc}") from exc
+
+    def state_for(self, source: SourcePage, img):
+        """page_state for an already opened image"""
+        color_mode = self.options.color_mode
+        gray_source = img.mode in GRAYSCALE_MODES and color_mode != "Color"
+        target = "L" if color_mode == "Grayscale" or gray_source else "RGB"
+        profile = None
+        if self.options.color_management != "Off":
+            profile = source_profile(img)
+        orientation = exif_orientation(img)
+        if self.can_pass_through(img, orientation, target, profile):
+            return self.pass_through_page(source, img, orientation, profile)
+        state = PageState(self, source, img, target, profile, orientation)
+        if needs_streaming(img):
+            size = self.streamed_size(img, orientation)
+            if size is None:
+                return self.stream_page(source, img, orientation, target)
+            if size != img.size:
+                state.reduce_to = size
+        return state
+
+    def plan_for(self, source: SourcePage) -> PagePlan:
+        """The stage plan a page would get, for inspection and debugging"""
+        with FrameReader() as reader:
+            state = self.page_state(source, reader)
+        if isinstance(state, PreparedPage):
+            plan = PagePlan(source)
+            plan.notes.append(f"{ENCODER_LABELS[state.encoder]}: "
+                              "no pixel stages")
+            return plan
+        return plan_page(state)
+
+    def draft_request(self, img, orientation: int, mode: Optional[str]):
+        """(mode, size) letting a JPEG decode at reduced DCT scale, or None.
+
+        Skipped with auto-crop, which may need full resolution in the
+        region it keeps. A mode of None keeps the source color space.
+        """
+        if img.format != "JPEG" or self.options.auto_crop:
+            return None
+        displayed = oriented_size(img.size, orientation)
+        width, height = fit_dimensions(displayed, self.options)
+        if (width, height) == displayed:
+            return None
+        if orientation >= 5:
+            width, height = height, width
+        return mode if img.mode != "CMYK" else None, (width, height)
+
+    def streamed_size(self, img, orientation: int) -> Optional[Tuple[int, int]]:
+        """Stored size to band-decode a huge image down to.
+
+        Reduction happens before auto-crop, which then works at page
+        resolution. None means the page is written at full resolution
+        straight from the bands. Either way an image over Pillow's
+        decompression-bomb limit is only ever read reduced. The image's own
+        size means a regular decode.
+        """
+        displayed = oriented_size(img.size, orientation)
+        width, height = fit_dimensions(displayed, self.options)
+        options = self.options
+        if can_stream(img):
+            if (width, height) != displayed:
+                return (height, width) if orientation >= 5 else (width, height)
+        limit = Image.MAX_IMAGE_PIXELS
+        if limit and img.width * img.height > 2 * limit:
+            error = Image.DecompressionBombError(
+                f"Image size ({img.width * img.height} pixels) exceeds limit "
+                f"of {2 * limit} pixels and cannot be streamed at this size")
+            if self.decoder is None:
+                raise error
+            raise DecodeError(f"{type(error).__name__}: {error}") from error
+        if can_stream(img) and not (
+                options.raster_watermark or options.clean_scans or
+                options.auto_crop or options.encoder in ("G4", "MRC")):
+            return None
+        return img.size
+
+    def stream_page(self, source: SourcePage, img, orientation: int,
+                    target: str) -> PreparedPage:
+        """Full-resolution lossless page written band by band.
+
+        With isolated decoding a worker compresses the bands into a
+        temporary file, under the same limits as any other decode.
+        """
+        background = self.options.background_color
+        if self.decoder is None:
+            data = stream_flate(img, target, background)
+        else:
+            handle, part_path = tempfile.mkstemp(suffix=".part")
+            os.close(handle)
+            try:
+                self.decoder.run(stream_source, source, target, background,
+                                 part_path)
+            except BaseException:
+                os.remove(part_path)
+                raise
+            data = read_part(part_path)
+        image = EncodedImage(
+            data,
+            img.width, img.height, PDFName(JPEG_COLOR_SPACES[target]),
+            filter_name="FlateDecode")
+        width, height = oriented_size(img.size, orientation)
+        scale = 72.0 / self.options.dpi
+        page = PreparedPage(source, [image], width * scale, height * scale,
+                            "streamed")
+        page.orientation = orientation
+        preview = self.cached_preview(source)
+        if self.options.embed_thumbnails and preview is not None:
+            # Without a preview, a thumbnail would cost a second full pass
+            preview = apply_orientation(preview, orientation)
+            page.thumbnail = make_page_thumbnail(preview, (width, height),
+                                                 self.options.background_color)
+        return page
+
+    def can_pass_through(self, img, orientation: int, target: str,
+                         profile) -> bool:
+        """Whether a JPEG can be embedded byte for byte.
+
+        Needs a page that is neither resized nor cropped, no pixel stages,
+        and color data the PDF can show unchanged.
+        """
+        options = self.options
+        if not options.jpeg_passthrough or img.format != "JPEG":
+            return False
+        if options.encoder not in ("Auto", "JPEG") or options.fit_mode == "Fill Page":
+            return False
+        if options.raster_watermark or options.clean_scans or options.auto_crop:
+            return False
+        if img.mode not in ("L", "RGB", "CMYK") or \
+                (img.mode != target and img.mode != "CMYK"):
+            return False
+        if img.mode == "CMYK" and not (profile and
+                                       options.color_management == "Embed ICC"):
+            return False
+        if profile and options.color_management == "Convert":
+            return False
+        displayed = oriented_size(img.size, orientation)
+        return fit_dimensions(displayed, options) == displayed
+
+    def cached_preview(self, source: SourcePage):
+        """The app's preview image for the page; previews show frame 0 only"""
+        return self.thumbnail_cache.get(source.path) if source.frame == 0 \
+            else None
+
+    def pass_through_page(self, source: SourcePage, img, orientation: int,
+                          profile) -> PreparedPage:
+        """Embed the JPEG file as-is; orientation goes into the placement"""
+        with open(source.path, "rb") as stream:
+            data = stream.read()
+        decode = [1, 0] * 4 if img.mode == "CMYK" and "adobe" in img.info \
+            else None
+        image = EncodedImage(data, img.width, img.height,
+                             PDFName(JPEG_COLOR_SPACES[img.mode]),
+                             filter_name="DCTDecode", decode=decode)
+        if profile and self.options.color_management == "Embed ICC":
+            attach_profile([image], profile)
+
+        width, height = oriented_size(img.size, orientation)
+        scale = 72.0 / self.options.dpi
+        page = PreparedPage(source, [image], width * scale, height * scale,
+                            "passthrough")
+        page.orientation = orientation
+        if self.options.embed_thumbnails:
+            preview = self.cached_preview(source)
+            if preview is None:
+                img.draft("RGB" if img.mode != "CMYK" else None,
+                          THUMBNAIL_SIZE)
+                preview = img.convert("RGB")
+            preview = apply_orientation(preview, orientation)
+            page.thumbnail = make_page_thumbnail(preview, (width, height),
+                                                 self.options.background_color)
+        return page
+
+    def keeps_source_space(self, img, target: str) -> bool:
+        """Whether a tagged page is encoded as-is with its ICC profile.
+
+        RGB and gray data can go through every stage unchanged. CMYK is
+        only passed through to JPEG, with no stage that draws in RGB.
+        """
+        if self.options.color_management != "Embed ICC":
+            return False
+        if img.mode == target:
+            return True
+        return img.mode == "CMYK" and target == "RGB" and \
+            self.options.encoder in ("Auto", "JPEG") and \
+            not (self.options.raster_watermark or self.options.clean_scans)
+
+    def choose_encoder(self, img) -> str:
+        """Encoder key for a prepared page: fixed, or classified per page"""
+        encoder = self.options.encoder
+        if encoder == "Auto":
+            return classify_page(img, self.options.grayscale_threshold,
+                                 self.options.color_mode)
+        if encoder == "Indexed":
+            return "indexed"
+        if encoder == "G4":
+            return "g4"
+        if encoder == "MRC" and NUMPY_AVAILABLE:
+            return "mrc"
+        # The colorfulness check runs on the downscaled page, not the source
+        if img.mode == "L" or (self.options.color_mode == "Auto" and
+                               is_grayscale(img, self.options.grayscale_threshold)):
+            return "gray"
+        return "jpeg"
+
+    def encode_page(self, img, encoder: str) -> List[EncodedImage]:
+        """Encode a prepared page image into its layers"""
+        if encoder == "mrc":
+            return encode_mrc(*split_mrc_layers(img), self.options.quality)
+        if encoder == "g4":
+            if img.mode != "1":
+                img = adaptive_threshold(img)
+            return [encode_ccitt_g4(img)]
+        if encoder == "indexed":
+            return [encode_indexed(img, self.options.palette_colors)]
+        if encoder == "gray" and img.mode != "L":
+            img = img.convert("L")
+        return [encode_jpeg(img, self.options.quality)]
+
+    def write_volume(self, sources: List[SourcePage], first_index: int,
+                     pdf_path: str, events: queue.Queue):
+        """Write one output file; reports each finished page on the queue"""
+        with FrameReader() as reader:
+            def pages():
+                # Identical sources are prepared once per file
+                repeats: Dict[str, PreparedPage] = {}
+                failures: Dict[str, str] = {}
+                for index, source in enumerate(sources, start=first_index):
+                    key = source.content_key
+                    if key in repeats:
+                        yield index, repeats[key].repeat(source)
+                        continue
+                    if key in failures:
+                        events.put(PageFailure(index, source, failures[key]))
+                        continue
+                    try:
+                        page = self.prepare_page(source, reader)
+                    except DecodeError as exc:
+                        if key:
+                            failures[key] = str(exc)
+                        events.put(PageFailure(index, source, str(exc)))
+                        continue
+                    if key:
+                        repeats[key] = page.repeat(source)
+                    yield index, page
+            return self.write_pages(pages(), pdf_path, events, len(sources))
+
+    def write_pages(self, pages, pdf_path: str, events: queue.Queue,
+                    page_count: int = 0) -> int:
+        """Write (index, PreparedPage) pairs to one file as they arrive.
+
+        page_count is the number of pages expected, used to leave room
+        for a stamped page count; the stamp itself shows the exact count.
+        Returns the pages written; a file that got none is removed, as a
+        PDF without pages is not valid.
+        """
+        options = self.options
+        target = pdf_path + ".part" if options.linearize else pdf_path
+        spec = watermark_spec(options)
+        with PDFWriter(target) as writer:
+            watermark = VectorWatermark(spec).write(writer) \
+                if spec and spec.vector else None
+            stamper = PageStamper(options.header_text, options.footer_text,
+                                  page_count).write(writer) \
+                if options.has_stamps else None
+            written = 0
+            shared: Dict[str, Tuple[list, dict]] = {}
+            for index, page in pages:
+                key = page.source.content_key
+                if key in shared:
+                    image_refs, extra = shared[key]
+                else:
+                    image_refs = [writer.add_image(layer)
+                                  for layer in page.layers]
+                    extra = {}
+                    if page.thumbnail:
+                        extra["Thumb"] = writer.add_image(page.thumbnail)
+                    if key:
+                        shared[key] = (image_refs, extra)
+                written += 1
+                overlays = []
+                if watermark:
+                    overlays.append(watermark.overlay(page.width, page.height))
+                if stamper:
+                    overlays.append(stamper.overlay(written, page.width,
+                                                    page.height,
+                                                    page.source.label))
+                writer.add_image_page(image_refs, page.width, page.height,
+                                      extra, page.orientation, overlays)
+                events.put(PageReport(index, page))
+            if stamper:
+                stamper.finish(written)
+
+        if not written:
+            os.remove(target)
+        elif self.options.linearize:
+            try:
+                linearize_pdf(target, pdf_path)
+            finally:
+                os.remove(target)
+        return written
+
+    def drop_blank_pages(self, sources: List[SourcePage]) -> Tuple[
+            List[SourcePage], List[SourcePage]]:
+        """Split pages into kept and blank ones using draft-scale decodes"""
+        with ThreadPoolExecutor(max_workers=self.options.worker_count) as pool:
+            blank = list(pool.map(self.is_blank, sources))
+        kept = [source for source, empty in zip(sources, blank) if not empty]
+        skipped = [source for source, empty in zip(sources, blank) if empty]
+        return kept, skipped
+
+    def is_blank(self, source: SourcePage) -> bool:
+        """Blank-page check; a page that fails to decode is kept and
+        reported when it is encoded"""
+        if self.decoder is None:
+            return is_blank_page(source.path, source.frame)
+        try:
+            return self.decoder.run(is_blank_page, source.path, source.frame)
+        except DecodeError:
+            return False
+
+    def export(self, image_paths: List[str], pdf_path: str,
+               progress: Optional[Callable[[int, int, str], None]] = None) -> ExportResult:
+        """Export images; volumes are written concurrently when splitting.
+
+        The progress callback is always invoked on the calling thread.
+        """
+        if not PIL_AVAILABLE:
+            raise RuntimeError("Pillow (PIL) library is required for PDF export")
+
+        with self.decoding():
+            return self.export_pages(image_paths, pdf_path, progress)
+
+    @contextlib.contextmanager
+    def decoding(self):
+        """Decoder pool and Pillow block reuse for the length of an export"""
+        if self.options.isolate_decoding:
+            self.decoder = DecodePool(self.options.worker_count,
+                                      self.options.decode_memory_mb * 1024 * 1024,
+                                      self.options.decode_timeout)
+        # Let page-sized buffers freed by one page be reused by the next
+        blocks_max = keep_page_blocks(PAGE_BUFFER_BLOCKS)
+        try:
+            yield self.decoder
+        finally:
+            restore_blocks(blocks_max)
+            if self.decoder is not None:
+                self.decoder.close()
+                self.decoder = None
+
+    def export_pages(self, image_paths: List[str], pdf_path: str,
+                     progress: Optional[Callable[[int, int, str], None]]) -> ExportResult:
+        result = ExportResult()
+        sources = expand_frames(image_paths, self.options.frame_range)
+        if not sources:
+            raise ValueError("No pages selected")
+        if self.options.skip_blank_pages:
+            sources, result.skipped = self.drop_blank_pages(sources)
+            if not sources:
+                raise ValueError("All selected images are blank pages")
+        mark_duplicates(sources)
+
+        volumes = VolumePlanner(self.options).plan(sources)
+        outputs = volume_paths(pdf_path, len(volumes))
+        total = sum(len(volume) for volume in volumes)
+
+        events: queue.Queue = queue.Queue()
+        workers = max(1, min(len(volumes), self.options.worker_count))
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures, first_index = [], 0
+                for volume, output in zip(volumes, outputs):
+                    futures.append(pool.submit(self.write_volume, volume,
+                                               first_index, output, events))
+                    first_index += len(volume)
+                while len(result.pages) + len(result.failed) < total and not any(
+                        f.done() and f.exception() for f in futures):
+                    try:
+                        report = events.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    if isinstance(report, PageFailure):
+                        result.failed.append(report)
+                    else:
+                        result.pages.append(report)
+                    if progress:
+                        progress(len(result.pages) + len(result.failed), total,
+                                 report.source.label)
+                written = [future.result() for future in futures]
+        except BaseException:
+            remove_outputs(outputs)  # Never leave a truncated PDF behind
+            raise
+
+        if not result.pages:
+            remove_outputs(outputs)
+            raise ValueError(no_pages_message(result.failed))
+        result.pages.sort(key=lambda report: report.index)
+        result.failed.sort(key=lambda failure: failure.index)
+        result.outputs = renumber_volumes(pdf_path, outputs, written)
+        result.page_count = len(result.pages)
+        return result
@@ -0,0 +1,430 @@
+"""
+PDF Linearizer for Image to PDF Converter
+Rewrites a finished export as a linearized ("fast web view") file so viewers
+can show page 1 after downloading only a small prefix
+"""
+
+import hashlib
+import re
+from typing import Dict, List, Optional, Set
+
+from Module.PDFWriter import PDFRef, serialize
+
+REF_PATTERN = re.compile(rb"(\d+) 0 R")
+PARENT_PATTERN = re.compile(rb"/Parent \d+ 0 R")
+THUMB_PATTERN = re.compile(rb"/Thumb (\d+) 0 R")
+COPY_CHUNK = 1024 * 1024
+XREF_ENTRY_SIZE = 20
+LINEARIZATION_DICT_SIZE = 160
+FIRST_TRAILER_SIZE = 200
+
+
+class SourceObject:
+    """Location of one object in the source file; stream data is not loaded"""
+
+    def __init__(self, num: int, body: bytes, data_offset: Optional[int],
+                 data_length: int):
+        self.num = num
+        self.body = body
+        self.data_offset = data_offset
+        self.data_length = data_length
+        self.refs = [int(n) for n in REF_PATTERN.findall(
+            PARENT_PATTERN.sub(b"", body))]
+
+    @property
+    def is_stream(self) -> bool:
+        return self.data_offset is not None
+
+
+class BitWriter:
+    """Big-endian bit packer for the hint tables"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.current = 0
+        self.count = 0
+
+    def write(self, value: int, bits: int):
+        for shift in range(bits - 1, -1, -1):
+            self.current = (self.current << 1) | ((value >> shift) & 1)
+            self.count += 1
+            if self.count == 8:
+                self.data.append(self.current)
+                self.current = self.count = 0
+
+    def flush(self):
+        """Pad to the next byte boundary"""
+        if self.count:
+            self.write(0, 8 - self.count)
+
+    def getvalue(self) -> bytes:
+        self.flush()
+        return bytes(self.data)
+
+
+class PDFLinearizer:
+    """Linearize a PDF produced by PDFWriter (classic xref, direct /Length)"""
+
+    def __init__(self, src_path: str):
+        self.src_path = src_path
+        self.objects: Dict[int, SourceObject] = {}
+        self.root = 0
+        self.info = 0
+
+    # -- Reading -----------------------------------------------------------
+
+    def read_source(self):
+        with open(self.src_path, "rb") as src:
+            src.seek(0, 2)
+            size = src.tell()
+            src.seek(max(0, size - 1024))
+            tail = src.read()
+            xref_offset = int(re.search(rb"startxref\s+(\d+)", tail).group(1))
+
+            src.seek(xref_offset)
+            src.readline()  # "xref"
+            first, count = (int(v) for v in src.readline().split())
+            offsets = {}
+            for num in range(first, first + count):
+                entry = src.readline()
+                if entry[17:18] == b"n":
+                    offsets[num] = int(entry[:10])
+            trailer = src.read(1024)
+            self.root = int(re.search(rb"/Root (\d+) 0 R", trailer).group(1))
+            info = re.search(rb"/Info (\d+) 0 R", trailer)
+            self.info = int(info.group(1)) if info else 0
+
+            for num, offset in offsets.items():
+                self.objects[num] = self.read_object(src, num, offset)
+
+    def read_object(self, src, num: int, offset: int) -> SourceObject:
+        src.seek(offset)
+        src.readline()  # "N 0 obj"
+        body = bytearray()
+        while True:
+            line = src.readline()
+            if not line or line.startswith(b"endobj"):
+                return SourceObject(num, bytes(body).rstrip(b"\n"), None, 0)
+            if line == b"stream\n":
+                body = bytes(body).rstrip(b"\n")
+                length = int(re.search(rb"/Length (\d+)", body).group(1))
+                return SourceObject(num, body, src.tell(), length)
+            body.extend(line)
+
+    # -- Planning ------------------------------------------------------------
+
+    def closure(self, start: int, stop: Set[int]) -> List[int]:
+        """Objects reachable from start in depth-first order, not crossing stop"""
+        order, seen, pending = [], set(), [start]
+        while pending:
+            num = pending.pop()
+            if num in seen or num in stop or num not in self.objects:
+                continue
+            seen.add(num)
+            order.append(num)
+            pending.extend(reversed(self.objects[num].refs))
+        return order
+
+    def plan(self):
+        catalog = self.objects[self.root]
+        pages_root = int(re.search(rb"/Pages (\d+) 0 R", catalog.body).group(1))
+        kids = self.objects[pages_root].body
+        kids = kids[kids.index(b"/Kids"):]
+        kids = kids[:kids.index(b"]")]
+        self.pages = [int(n) for n in REF_PATTERN.findall(kids)]
+        page_set = set(self.pages)
+
+        # Part 4: catalog and document-level objects
+        self.doc_objects = self.closure(self.root, page_set)
+        doc_set = set(self.doc_objects)
+
+        # Thumbnail images are not needed to display a page; they belong
+        # with the "other objects" at the end of the file
+        thumbs = {int(n) for page in self.pages
+                  for n in THUMB_PATTERN.findall(self.objects[page].body)}
+        stop = page_set | doc_set | thumbs
+        per_page = [self.closure(page, stop - {page}) for page in self.pages]
+        users: Dict[int, int] = {}
+        for objects in per_page:
+            for num in objects:
+                users[num] = users.get(num, 0) + 1
+
+        first = per_page[0] if per_page else []
+        first_set = set(first)
+        self.first_page_objects = first
+        self.page_private = [[n for n in objects if users[n] == 1]
+                             for objects in per_page[1:]]
+        self.shared_objects = []
+        for objects in per_page[1:]:
+            for num in objects:
+                if users[num] > 1 and num not in first_set \
+                        and num not in self.shared_objects:
+                    self.shared_objects.append(num)
+        self.page_shared = [[n for n in objects if users[n] > 1]
+                            for objects in per_page[1:]]
+
+        placed = doc_set | first_set | set(self.shared_objects)
+        for objects in self.page_private:
+            placed.update(objects)
+        self.other_objects = [n for n in sorted(self.objects)
+                              if n not in placed]
+
+    # -- Writing -------------------------------------------------------------
+
+    def object_header(self, new_num: int, obj: SourceObject,
+                      numbers: Dict[int, int]) -> bytes:
+        body = REF_PATTERN.sub(
+            lambda m: b"%d 0 R" % numbers[int(m.group(1))], obj.body)
+        if obj.is_stream:
+            return b"%d 0 obj\n%s\nstream\n" % (new_num, body)
+        return b"%d 0 obj\n%s\nendobj\n" % (new_num, body)
+
+    @staticmethod
+    def object_size(header: bytes, obj: SourceObject) -> int:
+        if obj.is_stream:
+            return len(header) + obj.data_length + len(b"\nendstream\nendobj\n")
+        return len(header)
+
+    def write(self, dst_path: str):
+        self.read_source()
+        self.plan()
+
+        # Main section (parts 7-9) gets numbers 1..M-1 in file order, the
+        # first-page section (parts 3-6) gets M..N-1
+        main_order = []
+        for objects in self.page_private:
+            main_order.extend(objects)
+        main_order += self.shared_objects + self.other_objects
+
+        numbers: Dict[int, int] = {}
+        for index, num in enumerate(main_order, start=1):
+            numbers[num] = index
+        main_size = len(main_order) + 1
+        lin_num = main_size
+        hint_num = main_size + 1 + len(self.doc_objects)
+        next_num = lin_num + 1
+        for num in self.doc_objects:
+            numbers[num] = next_num
+            next_num += 1
+        next_num += 1  # hint stream
+        for num in self.first_page_objects:
+            numbers[num] = next_num
+            next_num += 1
+        total_size = next_num
+        first_count = total_size - main_size
+
+        headers = {num: self.object_header(numbers[num], self.objects[num],
+                                           numbers)
+                   for num in self.objects}
+
+        # Layout with a zero-length hint stream: these are exactly the
+        # "adjusted" offsets the hint tables use
+        header = b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n"
+        lin_offset = len(header)
+        first_xref_offset = lin_offset + LINEARIZATION_DICT_SIZE
+        position = (first_xref_offset + len(b"xref\n%d %d\n" % (main_size, first_count))
+                    + first_count * XREF_ENTRY_SIZE + FIRST_TRAILER_SIZE)
+        offsets: Dict[int, int] = {}
+        for num in self.doc_objects:
+            offsets[num] = position
+            position += self.object_size(headers[num], self.objects[num])
+        hint_offset = position
+        for num in self.first_page_objects + main_order:
+            offsets[num] = position
+            position += self.object_size(headers[num], self.objects[num])
+
+        hint_data, shared_offset = self.hint_tables(offsets, headers, main_order)
+        hint_object = b"%d 0 obj\n%s\nstream\n%s\nendstream\nendobj\n" % (
+            hint_num, serialize({"S": shared_offset, "Length": len(hint_data)}),
+            hint_data)
+        hint_length = len(hint_object)
+
+        for num in self.first_page_objects + main_order:
+            offsets[num] += hint_length
+        end_of_first_page = (offsets[self.first_page_objects[-1]] + self.object_size(
+            headers[self.first_page_objects[-1]],
+            self.objects[self.first_page_objects[-1]])
+            if self.first_page_objects else hint_offset + hint_length)
+        main_xref_offset = position + hint_length
+        main_xref_head = b"xref\n0 %d\n" % main_size
+        main_trailer = b"trailer\n%s\nstartxref\n%d\n%%%%EOF\n" % (
+            serialize({"Size": total_size}), first_xref_offset)
+        file_length = (main_xref_offset + len(main_xref_head)
+                       + main_size * XREF_ENTRY_SIZE + len(main_trailer))
+
+        lin_dict = b"%d 0 obj\n%s\nendobj\n" % (lin_num, serialize({
+            "Linearized": 1,
+            "L": file_length,
+            "H": [hint_offset, hint_length],
+            "O": numbers[self.pages[0]] if self.pages else 0,
+            "E": end_of_first_page,
+            "N": len(self.pages),
+            "T": main_xref_offset + len(main_xref_head) - 1,
+        }))
+
+        file_id = hashlib.md5(b"%s:%d" % (self.src_path.encode("utf-8"),
+                                          file_length)).hexdigest()
+        first_trailer = b"trailer\n%s\nstartxref\n0\n%%%%EOF\n" % serialize({
+            "Size": total_size,
+            "Root": PDFRef(numbers[self.root]),
+            "Info": PDFRef(numbers[self.info]) if self.info in numbers else None,
+            "Prev": main_xref_offset,
+            "ID": [b"<%s>" % file_id.encode("ascii")] * 2,
+        })
+
+        with open(self.src_path, "rb") as src, open(dst_path, "wb") as dst:
+            dst.write(header)
+            dst.write(self.padded(lin_dict, LINEARIZATION_DICT_SIZE))
+
+            dst.write(b"xref\n%d %d\n" % (main_size, first_count))
+            dst.write(b"%010d 00000 n \n" % lin_offset)
+            for num in self.doc_objects:
+                dst.write(b"%010d 00000 n \n" % offsets[num])
+            dst.write(b"%010d 00000 n \n" % hint_offset)
+            for num in self.first_page_objects:
+                dst.write(b"%010d 00000 n \n" % offsets[num])
+            dst.write(self.padded(first_trailer, FIRST_TRAILER_SIZE))
+
+            for num in self.doc_objects:
+                self.copy_object(src, dst, headers[num], self.objects[num])
+            dst.write(hint_object)
+            for num in self.first_page_objects + main_order:
+                self.copy_object(src, dst, headers[num], self.objects[num])
+
+            dst.write(main_xref_head)
+            dst.write(b"0000000000 65535 f \n")
+            for num in main_order:
+                dst.write(b"%010d 00000 n \n" % offsets[num])
+            dst.write(main_trailer)
+
+    @staticmethod
+    def padded(data: bytes, size: int) -> bytes:
+        if len(data) > size:
+            raise ValueError("Linearization header overflow")
+        return data[:-1] + b" " * (size - len(data)) + data[-1:]
+
+    def copy_object(self, src, dst, header: bytes, obj: SourceObject):
+        dst.write(header)
+        if not obj.is_stream:
+            return
+        src.seek(obj.data_offset)
+        remaining = obj.data_length
+        while remaining:
+            chunk = src.read(min(COPY_CHUNK, remaining))
+            if not chunk:
+                raise ValueError(f"Truncated stream in object {obj.num}")
+            dst.write(chunk)
+            remaining -= len(chunk)
+        dst.write(b"\nendstream\nendobj\n")
+
+    # -- Hint tables -----------------------------------------------------------
+
+    def hint_tables(self, offsets: Dict[int, int], headers: Dict[int, bytes],
+                    main_order: List[int]):
+        """Build the page offset and shared object hint tables"""
+        def end_of(num):
+            return offsets[num] + self.object_size(headers[num], self.objects[num])
+
+        def content_of(objects):
+            page = self.objects[objects[0]]
+            match = re.search(rb"/Contents (\d+) 0 R", page.body)
+            if not match or int(match.group(1)) not in offsets:
+                return 0, 0
+            num = int(match.group(1))
+            return (offsets[num] - offsets[objects[0]],
+                    end_of(num) - offsets[num])
+
+        pages = []
+        if self.first_page_objects:
+            pages.append(self.first_page_objects)
+        for page, private in zip(self.pages[1:], self.page_private):
+            pages.append(private if private else [page])
+
+        shared_entries = list(self.first_page_objects) + self.shared_objects
+        shared_index = {num: index for index, num in enumerate(shared_entries)}
+
+        n_objects = [len(objects) for objects in pages]
+        lengths = [end_of(objects[-1]) - offsets[objects[0]] for objects in pages]
+        contents = [content_of(objects) for objects in pages]
+        shared_refs = [[]] + [[shared_index[n] for n in refs]
+                              for refs in self.page_shared]
+
+        def bits(values):
+            return max(values).bit_length() if values else 0
+
+        min_objects = min(n_objects) if n_objects else 0
+        min_length = min(lengths) if lengths else 0
+        min_content_offset = min((c[0] for c in contents), default=0)
+        min_content_length = min((c[1] for c in contents), default=0)
+        object_bits = bits([n - min_objects for n in n_objects])
+        length_bits = bits([n - min_length for n in lengths])
+        offset_bits = bits([c[0] - min_content_offset for c in contents])
+        content_bits = bits([c[1] - min_content_length for c in contents])
+        nshared_bits = bits([len(refs) for refs in shared_refs])
+        identifier_bits = bits([len(shared_entries)])
+
+        table = BitWriter()
+        table.write(min_objects, 32)
+        table.write(offsets[self.pages[0]] if self.pages else 0, 32)
+        table.write(object_bits, 16)
+        table.write(min_length, 32)
+        table.write(length_bits, 16)
+        table.write(min_content_offset, 32)
+        table.write(offset_bits, 16)
+        table.write(min_content_length, 32)
+        table.write(content_bits, 16)
+        table.write(nshared_bits, 16)
+        table.write(identifier_bits, 16)
+        table.write(0, 16)  # no fractional positions
+        table.write(1, 16)
+
+        for value in n_objects:
+            table.write(value - min_objects, object_bits)
+        table.flush()
+        for value in lengths:
+            table.write(value - min_length, length_bits)
+        table.flush()
+        for refs in shared_refs:
+            table.write(len(refs), nshared_bits)
+        table.flush()
+        for refs in shared_refs:
+            for index in refs:
+                table.write(index, identifier_bits)
+        table.flush()
+        for offset, _ in contents:
+            table.write(offset - min_content_offset, offset_bits)
+        table.flush()
+        for _, length in contents:
+            table.write(length - min_content_length, content_bits)
+        page_table = table.getvalue()
+
+        group_lengths = [end_of(num) - offsets[num] for num in shared_entries]
+        min_group = min(group_lengths) if group_lengths else 0
+        group_bits = bits([n - min_group for n in group_lengths])
+
+        table = BitWriter()
+        if self.shared_objects:
+            table.write(main_order.index(self.shared_objects[0]) + 1, 32)
+            table.write(offsets[self.shared_objects[0]], 32)
+        else:
+            table.write(0, 32)
+            table.write(0, 32)
+        table.write(len(self.first_page_objects), 32)
+        table.write(len(shared_entries), 32)
+        table.write(0, 16)  # every group holds exactly one object
+        table.write(min_group, 32)
+        table.write(group_bits, 16)
+        for length in group_lengths:
+            table.write(length - min_group, group_bits)
+        table.flush()
+        for _ in group_lengths:
+            table.write(0, 1)  # no signatures
+        table.flush()
+        shared_table = table.getvalue()
+
+        return page_table + shared_table, len(page_table)
+
+
+def linearize_pdf(src_path: str, dst_path: str):
+    """Write a linearized copy of src_path to dst_path"""
+    PDFLinearizer(src_path).write(dst_path)
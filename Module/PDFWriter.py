@@ -0,0 +1,415 @@
+"""
+Lightweight PDF Writer for Image to PDF Converter
+Streams image pages straight to disk so large exports never sit in memory
+"""
+
+import hashlib
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+
+class PDFName(str):
+    """PDF name object, written as /Name"""
+
+
+class PDFRef:
+    """Indirect object reference, written as 'N 0 R'"""
+
+    def __init__(self, num: int):
+        self.num = num
+
+    def __eq__(self, other):
+        return isinstance(other, PDFRef) and other.num == self.num
+
+    def __hash__(self):
+        return hash(self.num)
+
+    def __repr__(self):
+        return f"PDFRef({self.num})"
+
+
+class PDFString(str):
+    """PDF literal string, written as (text)"""
+
+
+def winansi_literal(text: str) -> Optional[bytes]:
+    """Text as a literal string for the standard fonts' WinAnsiEncoding,
+    or None when it has characters that encoding cannot show"""
+    try:
+        data = text.encode("cp1252")
+    except UnicodeEncodeError:
+        return None
+    return b"(" + data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(
+        b")", b"\\)") + b")"
+
+
+def serialize(value) -> bytes:
+    """Serialize a Python value into PDF object syntax"""
+    if isinstance(value, PDFRef):
+        return b"%d 0 R" % value.num
+    if isinstance(value, PDFName):
+        return b"/" + value.encode("latin-1")
+    if isinstance(value, PDFString):
+        escaped = value.replace("\\", "\\\\").replace(
+            "(", "\\(").replace(")", "\\)")
+        return b"(" + escaped.encode("latin-1", "replace") + b")"
+    if isinstance(value, bool):
+        return b"true" if value else b"false"
+    if isinstance(value, int):
+        return b"%d" % value
+    if isinstance(value, float):
+        text = ("%.4f" % value).rstrip("0").rstrip(".")
+        return text.encode("ascii") if text not in ("", "-0") else b"0"
+    if isinstance(value, dict):
+        parts = [b"<<"]
+        for key, item in value.items():
+            if item is None:
+                continue
+            parts.append(b"/" + key.encode("latin-1") + b" " + serialize(item))
+        parts.append(b">>")
+        return b" ".join(parts)
+    if isinstance(value, (list, tuple)):
+        return b"[" + b" ".join(serialize(item) for item in value) + b"]"
+    if isinstance(value, bytes):
+        return value
+    if value is None:
+        return b"null"
+    raise TypeError(f"Cannot serialize {type(value).__name__} to PDF")
+
+
+# Text drawn by the converter uses the standard Helvetica font, which
+# viewers supply, so nothing is embedded; its widths (1/1000 em), ASCII 32-126
+HELVETICA_WIDTHS = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333,
+    278, 278, 556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278,
+    584, 584, 584, 556, 1015, 667, 667, 722, 722, 667, 611, 778, 722, 278,
+    500, 667, 556, 833, 722, 778, 667, 778, 722, 667, 611, 722, 667, 944,
+    667, 667, 611, 278, 278, 278, 469, 556, 333, 556, 556, 500, 556, 556,
+    278, 556, 556, 222, 222, 500, 222, 833, 556, 556, 556, 556, 333, 500,
+    278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584)
+HELVETICA_ASCENT = 718   # Cap height
+HELVETICA_DESCENT = 207
+
+
+def text_width(text: str, size: float) -> float:
+    """Width of Helvetica text in points"""
+    return size / 1000.0 * sum(
+        HELVETICA_WIDTHS[ord(char) - 32] if 32 <= ord(char) < 127 else 556
+        for char in text)
+
+
+# EXIF orientation -> unit-square placement, as fractions of the page
+# width and height: (a, b, c, d, e, f) of the 'cm' operator
+ORIENTATION_MATRICES = {
+    1: (1, 0, 0, 1, 0, 0),
+    2: (-1, 0, 0, 1, 1, 0),
+    3: (-1, 0, 0, -1, 1, 1),
+    4: (1, 0, 0, -1, 0, 1),
+    5: (0, -1, -1, 0, 1, 1),
+    6: (0, -1, 1, 0, 0, 1),
+    7: (0, 1, 1, 0, 0, 0),
+    8: (0, 1, -1, 0, 1, 0),
+}
+
+
+def placement_matrix(width: float, height: float, orientation: int = 1):
+    """'cm' operands that draw an image over the page, EXIF-oriented"""
+    a, b, c, d, e, f = ORIENTATION_MATRICES.get(orientation,
+                                                ORIENTATION_MATRICES[1])
+    return (a * width, b * height, c * width, d * height,
+            e * width, f * height)
+
+
+class ICCProfile:
+    """Embedded ICC profile, written once per file as an /ICCBased stream"""
+
+    ALTERNATES = {1: "DeviceGray", 3: "DeviceRGB", 4: "DeviceCMYK"}
+
+    def __init__(self, data: bytes, components: int, digest: str):
+        self.data = data
+        self.components = components
+        self.digest = digest
+
+
+class EncodedImage:
+    """Encoded image payload ready to be written as an image XObject"""
+
+    def __init__(self, data: bytes, width: int, height: int,
+                 color_space, bits: int = 8,
+                 filter_name: Optional[str] = None,
+                 decode_parms: Optional[dict] = None,
+                 decode: Optional[list] = None,
+                 extra: Optional[dict] = None):
+        self.data = data
+        self.width = width
+        self.height = height
+        self.color_space = color_space
+        self.bits = bits
+        self.filter_name = filter_name
+        self.decode_parms = decode_parms
+        self.decode = decode
+        self.extra = extra or {}
+        # Streamed payloads (an iterator of chunks) are measured on write
+        self.length = len(data) if isinstance(data, bytes) else 0
+
+    def image_dict(self) -> dict:
+        """Build the XObject dictionary (without /Length)"""
+        entries = {
+            "Type": PDFName("XObject"),
+            "Subtype": PDFName("Image"),
+            "Width": self.width,
+            "Height": self.height,
+            "ColorSpace": self.color_space,
+            "BitsPerComponent": self.bits,
+            "Filter": PDFName(self.filter_name) if self.filter_name else None,
+            "DecodeParms": self.decode_parms,
+            "Decode": self.decode,
+        }
+        entries.update(self.extra)
+        return entries
+
+    @property
+    def total_bytes(self) -> int:
+        """Stream size including nested mask images"""
+        return self.length + sum(
+            value.total_bytes for value in self.extra.values()
+            if isinstance(value, EncodedImage))
+
+
+class PDFWriter:
+    """Write a PDF object by object, keeping only the xref table in memory"""
+
+    def __init__(self, path: str, version: str = "1.7"):
+        self.path = path
+        self.file = open(path, "wb")
+        self.offsets: Dict[int, int] = {}
+        self.next_num = 1
+        self.page_refs: List[PDFRef] = []
+        self.icc_refs: Dict[str, PDFRef] = {}
+        self.font_refs: Dict[str, PDFRef] = {}
+        self.image_refs: Dict[bytes, PDFRef] = {}
+        self.catalog_ref = self.reserve()
+        self.pages_ref = self.reserve()
+        self.info = {"Producer": PDFString("Image to PDF Converter")}
+        self.file.write(b"%%PDF-%s\n%%\xe2\xe3\xcf\xd3\n" %
+                        version.encode("ascii"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.file.close()
+
+    @property
+    def bytes_written(self) -> int:
+        return self.file.tell()
+
+    def reserve(self) -> PDFRef:
+        """Reserve an object number to be written later"""
+        ref = PDFRef(self.next_num)
+        self.next_num += 1
+        return ref
+
+    def write_object(self, ref: PDFRef, value):
+        self.offsets[ref.num] = self.file.tell()
+        self.file.write(b"%d 0 obj\n" % ref.num)
+        self.file.write(serialize(value))
+        self.file.write(b"\nendobj\n")
+
+    def write_stream(self, ref: PDFRef, entries: dict, data) -> int:
+        """Write a stream object; data is bytes or an iterator of chunks"""
+        if not isinstance(data, (bytes, bytearray)):
+            return self.write_stream_chunks(ref, entries, data)
+        entries = dict(entries)
+        entries["Length"] = len(data)
+        self.offsets[ref.num] = self.file.tell()
+        self.file.write(b"%d 0 obj\n" % ref.num)
+        self.file.write(serialize(entries))
+        self.file.write(b"\nstream\n")
+        self.file.write(data)
+        self.file.write(b"\nendstream\nendobj\n")
+        return len(data)
+
+    def write_stream_chunks(self, ref: PDFRef, entries: dict, chunks) -> int:
+        """Write a stream of unknown size; /Length is patched in afterwards.
+
+        The length stays a direct, fixed-width integer so the file reads
+        exactly like one written by write_stream.
+        """
+        header = serialize({key: value for key, value in entries.items()
+                            if key != "Length"})
+        self.offsets[ref.num] = self.file.tell()
+        self.file.write(b"%d 0 obj\n" % ref.num)
+        self.file.write(header[:-2] + b"/Length ")
+        length_offset = self.file.tell()
+        self.file.write(b"0000000000 >>\nstream\n")
+        start = self.file.tell()
+        for chunk in chunks:
+            self.file.write(chunk)
+        length = self.file.tell() - start
+        self.file.write(b"\nendstream\nendobj\n")
+        end = self.file.tell()
+        self.file.seek(length_offset)
+        self.file.write(b"%010d" % length)
+        self.file.seek(end)
+        return length
+
+    def add_object(self, value) -> PDFRef:
+        ref = self.reserve()
+        self.write_object(ref, value)
+        return ref
+
+    def add_stream(self, entries: dict, data) -> PDFRef:
+        ref = self.reserve()
+        self.write_stream(ref, entries, data)
+        return ref
+
+    def add_image(self, image: EncodedImage) -> PDFRef:
+        """Write an image; nested images in extra (e.g. /Mask) go first.
+
+        An image whose dictionary and payload match one already in the
+        file is written once and shared. Streamed payloads are not known
+        in advance and are always written.
+        """
+        entries = image.image_dict()
+        entries["ColorSpace"] = self.resolve_color_space(image.color_space)
+        for key, value in image.extra.items():
+            if isinstance(value, EncodedImage):
+                entries[key] = self.add_image(value)
+        digest = None
+        if isinstance(image.data, (bytes, bytearray)):
+            hasher = hashlib.blake2b(serialize(entries), digest_size=16)
+            hasher.update(image.data)
+            digest = hasher.digest()
+            if digest in self.image_refs:
+                return self.image_refs[digest]
+        ref = self.reserve()
+        image.length = self.write_stream(ref, entries, image.data)
+        if digest is not None:
+            self.image_refs[digest] = ref
+        return ref
+
+    def add_icc_profile(self, profile: ICCProfile) -> PDFRef:
+        """Write an ICC profile stream, or reuse the one already written"""
+        ref = self.icc_refs.get(profile.digest)
+        if ref is None:
+            ref = self.add_stream({
+                "N": profile.components,
+                "Alternate": PDFName(ICCProfile.ALTERNATES[profile.components]),
+                "Filter": PDFName("FlateDecode"),
+            }, zlib.compress(profile.data))
+            self.icc_refs[profile.digest] = ref
+        return ref
+
+    def add_standard_font(self, name: str = "Helvetica") -> PDFRef:
+        """A standard 14 font, written once per file and shared by all users"""
+        ref = self.font_refs.get(name)
+        if ref is None:
+            ref = self.add_object({
+                "Type": PDFName("Font"),
+                "Subtype": PDFName("Type1"),
+                "BaseFont": PDFName(name),
+                "Encoding": PDFName("WinAnsiEncoding"),
+            })
+            self.font_refs[name] = ref
+        return ref
+
+    def resolve_color_space(self, color_space):
+        """Replace ICCProfile values with shared [/ICCBased ref] arrays"""
+        if isinstance(color_space, ICCProfile):
+            return [PDFName("ICCBased"), self.add_icc_profile(color_space)]
+        if isinstance(color_space, list):
+            return [self.resolve_color_space(item) for item in color_space]
+        return color_space
+
+    def add_page(self, width: float, height: float, content: bytes,
+                 resources: dict, extra: Optional[dict] = None) -> PDFRef:
+        """Add a page with the given content stream and resources"""
+        content_ref = self.add_stream({}, content)
+        page = {
+            "Type": PDFName("Page"),
+            "Parent": self.pages_ref,
+            "MediaBox": [0, 0, float(width), float(height)],
+            "Resources": resources,
+            "Contents": content_ref,
+        }
+        if extra:
+            page.update(extra)
+        ref = self.add_object(page)
+        self.page_refs.append(ref)
+        return ref
+
+    def add_form(self, bbox, content: bytes, resources: dict,
+                 ref: Optional[PDFRef] = None) -> PDFRef:
+        """Write a Form XObject: content drawn wherever a page uses it.
+
+        Pass a reserved ref to fill in a form pages already point to.
+        """
+        ref = ref or self.reserve()
+        self.write_stream(ref, {
+            "Type": PDFName("XObject"),
+            "Subtype": PDFName("Form"),
+            "BBox": [float(value) for value in bbox],
+            "Resources": resources,
+        }, content)
+        return ref
+
+    def add_image_page(self, image_refs, width: float, height: float,
+                       extra: Optional[dict] = None,
+                       orientation: int = 1,
+                       overlays: Optional[List[Tuple[bytes, dict]]] = None
+                       ) -> PDFRef:
+        """Add a page showing one image, or a stack of layers, full page.
+
+        A non-default EXIF orientation is applied by the placement matrix,
+        so stored pixel data never has to be rotated. Overlays are
+        (content, resources) pairs drawn on top in unrotated page space.
+        """
+        if isinstance(image_refs, PDFRef):
+            image_refs = [image_refs]
+        names = [f"Im{index}" for index in range(len(image_refs))]
+        matrix = placement_matrix(float(width), float(height), orientation)
+        content = b"q %s cm %s Q" % (
+            b" ".join(serialize(float(value)) for value in matrix),
+            b" ".join(b"/%s Do" % name.encode("ascii") for name in names))
+        resources = {"XObject": dict(zip(names, image_refs))}
+        for overlay, overlay_resources in overlays or ():
+            content += b"\n" + overlay
+            for category, entries in overlay_resources.items():
+                resources.setdefault(category, {}).update(entries)
+        return self.add_page(width, height, content, resources, extra)
+
+    def close(self):
+        """Write the page tree, catalog, xref table and trailer"""
+        self.write_object(self.pages_ref, {
+            "Type": PDFName("Pages"),
+            "Kids": self.page_refs,
+            "Count": len(self.page_refs),
+        })
+        self.write_object(self.catalog_ref, {
+            "Type": PDFName("Catalog"),
+            "Pages": self.pages_ref,
+        })
+        info_ref = self.add_object(self.info)
+
+        xref_offset = self.file.tell()
+        size = self.next_num
+        self.file.write(b"xref\n0 %d\n" % size)
+        self.file.write(b"0000000000 65535 f \n")
+        for num in range(1, size):
+            offset = self.offsets.get(num)
+            if offset is None:
+                self.file.write(b"0000000000 65535 f \n")
+            else:
+                self.file.write(b"%010d 00000 n \n" % offset)
+        self.file.write(b"trailer\n")
+        self.file.write(serialize({
+            "Size": size,
+            "Root": self.catalog_ref,
+            "Info": info_ref,
+        }))
+        self.file.write(b"\nstartxref\n%d\n%%%%EOF\n" % xref_offset)
+        self.file.close()
@@ -0,0 +1,172 @@
+"""
+Page Cleanup for Image to PDF Converter
+Optional pre-encode stages for scanned pages, vectorized with NumPy
+"""
+
+from Module.ImageAnalysis import (NUMPY_AVAILABLE, ANALYSIS_SIZE,
+                                  analysis_copy, box_mean_sums)
+from Module.StreamingDecode import (open_image, needs_streaming, can_stream,
+                                    read_reduced)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    Image = None
+
+
+PAPER_MIN_LEVEL = 128  # Pages whose brightest peak is darker are left alone
+PAPER_TOLERANCE = 8    # Minimum distance from paper still clipped to white
+
+
+def estimate_paper(img):
+    """Paper color and noise level, from the brightest histogram peak.
+
+    Returns (color, spread) where color has one value per channel, or
+    None when the page has no light background to speak of.
+    """
+    # Strided sample rather than a reduced copy: averaging hides the noise
+    step = max(1, max(img.size) // ANALYSIS_SIZE)
+    small = img.resize((max(1, img.width // step), max(1, img.height // step)),
+                       Image.Resampling.NEAREST)
+    gray = np.asarray(small if small.mode == "L" else small.convert("L"))
+    histogram = np.bincount(gray.ravel(), minlength=256)
+    level = PAPER_MIN_LEVEL + int(np.argmax(histogram[PAPER_MIN_LEVEL:]))
+    if histogram[level] == 0:
+        return None
+
+    paper = np.abs(gray.astype(np.int16) - level) <= PAPER_TOLERANCE
+    pixels = np.asarray(small).reshape(gray.size, -1)[paper.ravel()]
+    color = np.median(pixels, axis=0)
+    # Per-channel noise, relative to white once the paper is stretched
+    spread = float((pixels.std(axis=0) * 255.0 / np.maximum(color, 1.0)).max())
+    return color, spread
+
+
+def whiten_background(img, despeckle: bool = True):
+    """Stretch the paper color to white and clip near-paper pixels.
+
+    Levels are scaled per channel so the estimated paper becomes 255;
+    anything within the paper's noise band of white is then set to
+    exactly white. With despeckle, isolated dark pixels surrounded by
+    white are removed as well.
+    """
+    if not NUMPY_AVAILABLE or img.mode not in ("RGB", "L"):
+        return img
+    paper = estimate_paper(img)
+    if paper is None:
+        return img
+    color, spread = paper
+
+    # The per-channel stretch is a lookup table, applied without float copies
+    scale = (255.0 / np.maximum(color, 1.0)).astype(np.float32)
+    levels = np.arange(256, dtype=np.float32)[:, None] * scale
+    table = np.minimum(levels, 255).astype(np.uint8)
+    stretched = img.point(table.T.ravel().tolist())
+
+    cutoff = 255 - max(PAPER_TOLERANCE, int(3 * spread))
+    pixels = np.asarray(stretched)
+    near_white = pixels >= cutoff if pixels.ndim == 2 else \
+        (pixels >= cutoff).all(axis=2)
+    del pixels
+    if despeckle:
+        # At least 7 of the 8 neighbours are white: treat as paper noise
+        neighbours = box_mean_sums(near_white, 1) - near_white
+        near_white |= neighbours >= 7
+    white = 255 if img.mode == "L" else (255, 255, 255)
+    stretched.paste(white, mask=Image.fromarray(near_white))
+    return stretched
+
+
+CROP_ANALYSIS_SIZE = 512
+CROP_TOLERANCE = 24      # Max difference from the border color per channel
+CROP_MAX_OUTLIERS = 0.005  # Share of off-color pixels a uniform line may have
+
+
+def uniform_lines(pixels, border, axis: int):
+    """Boolean per row (axis=1) or column (axis=0): matches the border"""
+    distance = np.abs(pixels.astype(np.int16) - border)
+    if distance.ndim == 3:
+        distance = distance.max(axis=2)
+    outliers = (distance > CROP_TOLERANCE).mean(axis=axis)
+    return outliers <= CROP_MAX_OUTLIERS
+
+
+def content_span(uniform):
+    """First and one-past-last index that is not a uniform line"""
+    content = np.flatnonzero(~uniform)
+    if content.size == 0:
+        return None
+    return int(content[0]), int(content[-1]) + 1
+
+
+def find_crop_box(img):
+    """Bounding box of the page content inside uniform borders, or None.
+
+    Runs on a reduced copy; the border color is the median of the four
+    corner pixels. The box is widened by one reduced pixel when mapped
+    back so content on the edge of a reduced pixel is not cut off.
+    """
+    if not NUMPY_AVAILABLE:
+        return None
+    small = analysis_copy(img, CROP_ANALYSIS_SIZE)
+    pixels = np.asarray(small)
+    corners = np.stack([pixels[0, 0], pixels[0, -1],
+                        pixels[-1, 0], pixels[-1, -1]])
+    border = np.median(corners, axis=0).astype(np.int16)
+
+    rows = content_span(uniform_lines(pixels, border, axis=1))
+    cols = content_span(uniform_lines(pixels, border, axis=0))
+    if rows is None or cols is None:
+        return None  # Entirely uniform; leave it to blank-page handling
+
+    scale_x = img.width / small.width
+    scale_y = img.height / small.height
+    left = max(0, int((cols[0] - 1) * scale_x))
+    top = max(0, int((rows[0] - 1) * scale_y))
+    right = min(img.width, int(np.ceil((cols[1] + 1) * scale_x)))
+    bottom = min(img.height, int(np.ceil((rows[1] + 1) * scale_y)))
+    if (left, top, right, bottom) == (0, 0, img.width, img.height):
+        return None
+    return left, top, right, bottom
+
+
+def crop_uniform_borders(img):
+    """Crop uniform margins off a page before it is resampled"""
+    box = find_crop_box(img)
+    return img.crop(box) if box else img
+
+
+BLANK_DRAFT_SIZE = 512  # Small print must still register as ink
+BLANK_INK_DELTA = 40    # Darker or lighter than the paper by this is ink
+BLANK_MAX_INK = 0.0005  # Share of ink pixels a blank page may have
+BLANK_MAX_STDDEV = 12.0 # Show-through and scanner noise stay below this
+
+
+def draft_gray(path: str, frame: int = 0):
+    """Small grayscale decode; JPEGs are decoded at reduced scale"""
+    with open_image(path) as img:
+        if frame:
+            img.seek(frame)
+        if needs_streaming(img) and can_stream(img):
+            img = read_reduced(img, (BLANK_DRAFT_SIZE, BLANK_DRAFT_SIZE))
+        img.draft("L", (BLANK_DRAFT_SIZE, BLANK_DRAFT_SIZE))
+        gray = img.convert("L")
+    return analysis_copy(gray, BLANK_DRAFT_SIZE)
+
+
+def is_blank_page(path: str, frame: int = 0) -> bool:
+    """True when the image (or frame) has next to no ink and little variation"""
+    if not NUMPY_AVAILABLE:
+        return False
+    pixels = np.asarray(draft_gray(path, frame), dtype=np.int16)
+    paper = int(np.median(pixels))
+    ink = np.count_nonzero(np.abs(pixels - paper) > BLANK_INK_DELTA)
+    return ink / pixels.size <= BLANK_MAX_INK and \
+        float(pixels.std()) <= BLANK_MAX_STDDEV
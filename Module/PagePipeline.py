@@ -0,0 +1,160 @@
+"""
+Page Pipeline for Image to PDF Converter
+Declarative page stages, a stage registry and a planner that orders them
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+
+class PageState:
+    """What the stages of one page read and replace while it is prepared"""
+
+    def __init__(self, exporter, source, header, target: str, profile,
+                 orientation: int):
+        self.exporter = exporter
+        self.options = exporter.options
+        self.source = source
+        self.header = header            # opened image, not yet decoded
+        self.target = target            # "L" or "RGB"
+        self.profile = profile          # source ICC profile, or None
+        self.orientation = orientation  # EXIF orientation of the stored pixels
+        self.reduce_to: Optional[Tuple[int, int]] = None  # band-decode size
+        self.img = None                 # page pixels once decoded
+        self.upright = orientation == 1
+        self.alpha = None               # alpha kept for an /SMask
+        self.embed = False              # encode in the source space + ICC
+        self.encoder: Optional[str] = None
+        self.layers = None
+
+
+class Stage:
+    """One declarative page operation.
+
+    plan() sees the header, the options and the plan built so far, and
+    returns the keyword arguments for run(), or None when the stage
+    would do nothing for this page. Movable stages are pointwise or
+    geometric and may be moved after a downscale, where they touch
+    fewer pixels; a plan can pin one in place with "pinned": True.
+    """
+
+    name = ""
+    movable = False
+
+    def plan(self, state: PageState, plan: "PagePlan") -> Optional[dict]:
+        return {}
+
+    def run(self, state: PageState, **params):
+        raise NotImplementedError
+
+
+STAGES: Dict[str, Stage] = {}
+STAGE_ORDER: List[str] = []
+
+
+def register_stage(stage: Stage, after: Optional[str] = None) -> Stage:
+    """Add a stage to the default order: at the end, or after another stage.
+
+    Registering a name again replaces that stage.
+    """
+    if stage.name in STAGES:
+        STAGE_ORDER.remove(stage.name)
+    STAGES[stage.name] = stage
+    position = STAGE_ORDER.index(after) + 1 if after else len(STAGE_ORDER)
+    STAGE_ORDER.insert(position, stage.name)
+    return stage
+
+
+class PlannedStep:
+    def __init__(self, stage: Stage, params: dict):
+        self.stage = stage
+        self.params = params
+
+    def __str__(self):
+        shown = ", ".join(f"{key}={value}" for key, value in self.params.items()
+                          if key != "pinned")
+        return f"{self.stage.name}({shown})"
+
+
+class PagePlan:
+    """The ordered steps for one page, with what was skipped, moved or fused.
+
+    Stages record their predictions in `size` (stored pixel size after the
+    step) and `shrinks` (set by the step that downscales).
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.steps: List[PlannedStep] = []
+        self.skipped: List[str] = []
+        self.notes: List[str] = []
+        self.size: Optional[Tuple[int, int]] = None
+        self.shrinks = False
+
+    def step(self, name: str) -> Optional[PlannedStep]:
+        for step in self.steps:
+            if step.stage.name == name:
+                return step
+        return None
+
+    def run(self, state: PageState):
+        for step in self.steps:
+            step.stage.run(state, **step.params)
+
+    def describe(self) -> List[str]:
+        lines = [f"{self.source.label}: " +
+                 " -> ".join(str(step) for step in self.steps)]
+        if self.skipped:
+            lines.append("  skipped: " + ", ".join(self.skipped))
+        lines.extend(f"  {note}" for note in self.notes)
+        return lines
+
+    def __str__(self):
+        return "\n".join(self.describe())
+
+
+def plan_page(state: PageState, downscale: str = "resize",
+              fuse_into: str = "decode") -> PagePlan:
+    """Build the plan for a page from the registered stages.
+
+    - Stages whose plan() returns None are skipped.
+    - When the downscale step shrinks the page, movable stages planned
+      before it run right after it instead. With downscale=None the
+      registration order is kept.
+    - A movable stage left directly behind the decode step is fused into
+      it when the decode stage can absorb it (see `absorbs`).
+    """
+    plan = PagePlan(state.source)
+    for name in STAGE_ORDER:
+        stage = STAGES[name]
+        params = stage.plan(state, plan)
+        if params is None:
+            plan.skipped.append(name)
+        else:
+            plan.steps.append(PlannedStep(stage, params))
+
+    resize = plan.step(downscale)
+    if resize is not None and plan.shrinks:
+        index = plan.steps.index(resize)
+        moved = [step for step in plan.steps[:index]
+                 if step.stage.movable and not step.params.get("pinned")]
+        if moved:
+            for step in moved:
+                plan.steps.remove(step)
+            index = plan.steps.index(resize)
+            plan.steps[index + 1:index + 1] = moved
+            plan.notes.append("moved after downscale: " +
+                              ", ".join(step.stage.name for step in moved))
+
+    decode = plan.step(fuse_into)
+    if decode is not None:
+        index = plan.steps.index(decode)
+        if index + 1 < len(plan.steps):
+            following = plan.steps[index + 1]
+            absorbs = getattr(decode.stage, "absorbs", ())
+            if following.stage.name in absorbs:
+                decode.params.update(following.params)
+                decode.params.pop("pinned", None)
+                plan.steps.remove(following)
+                plan.notes.append(f"fused {following.stage.name} into "
+                                  f"{decode.stage.name}")
+    return plan
@@ -0,0 +1,127 @@
+"""
+Page Stamps for Image to PDF Converter
+Headers, footers and page numbers written as PDF text, not pixels
+"""
+
+import datetime
+import re
+from typing import List, Optional, Tuple
+
+from Module.PDFWriter import (PDFRef, serialize, HELVETICA_ASCENT,
+                              HELVETICA_DESCENT)
+from Module.TextFonts import TextFonts
+
+
+STAMP_FONT_SIZE = 9   # Points
+STAMP_MARGIN = 18     # Points between a stamp's text and the page edge
+LABEL_PADDING = 2     # Points of white label around text, readable on photos
+DIGIT_WIDTH = 556     # Helvetica digits all share this width (1/1000 em)
+PLACEHOLDER = re.compile(r"\{(page|pages|date|name)\}")
+PAGE_NUMBER_TEXT = "Page {page} of {pages}"
+
+
+def label(x: float, y: float, width: float) -> bytes:
+    """White box behind a line of text starting at (x, y)"""
+    descent = HELVETICA_DESCENT * STAMP_FONT_SIZE / 1000.0 + LABEL_PADDING
+    height = (HELVETICA_ASCENT + HELVETICA_DESCENT) * STAMP_FONT_SIZE / 1000.0
+    box = (x - LABEL_PADDING, y - descent, width + 2 * LABEL_PADDING,
+           height + 2 * LABEL_PADDING)
+    return b"q 1 g %s %s %s %s re f Q" % tuple(
+        serialize(float(value)) for value in box)
+
+
+def split_text(template: str, values: dict) -> List[Optional[str]]:
+    """The template as literal runs, with None where the page count goes"""
+    parts: List[Optional[str]] = []
+    for number, piece in enumerate(PLACEHOLDER.split(template)):
+        if number % 2 == 0:
+            text = piece
+        elif piece == "pages":
+            parts.append(None)
+            continue
+        else:
+            text = values[piece]
+        if parts and parts[-1] is not None:
+            parts[-1] += text
+        elif text:
+            parts.append(text)
+    return parts
+
+
+class PageStamper:
+    """Header and footer lines for every page of one PDF file.
+
+    All stamps share the file's fonts (see TextFonts; names in other
+    scripts get embedded glyphs) and each page only adds a few text
+    operators, so no page is decoded or re-encoded for them and
+    passthrough pages keep their original image data. {pages} is a Form
+    XObject written after the last page, so the count is exact even
+    when pages fail to decode; numbering restarts in each volume, which
+    keeps every file readable on its own.
+    """
+
+    def __init__(self, header: str, footer: str, page_count: int = 0):
+        self.header = header
+        self.footer = footer
+        self.digits = len(str(max(1, page_count)))
+        self.date = datetime.date.today().isoformat()
+        self.resources: dict = {}
+        self.total: Optional[PDFRef] = None
+        self.writer = None
+        self.fonts: Optional[TextFonts] = None
+
+    def write(self, writer) -> "PageStamper":
+        """Add the shared font and reserve the page count form"""
+        self.total = writer.reserve()
+        self.fonts = TextFonts(writer)
+        self.resources = {"Font": self.fonts.resources,
+                          "XObject": {"Total": self.total}}
+        self.writer = writer
+        return self
+
+    def line(self, template: str, number: int, name: str,
+             baseline: float, page_width: float) -> bytes:
+        """One stamp centred on the page at this baseline"""
+        values = {"page": str(number), "date": self.date, "name": name}
+        parts = split_text(template, values)
+        count_width = DIGIT_WIDTH * STAMP_FONT_SIZE / 1000.0 * self.digits
+        width = sum(count_width if part is None else
+                    self.fonts.width(part, STAMP_FONT_SIZE) for part in parts)
+        x = (page_width - width) / 2
+        content = [label(x, baseline, width)]
+        for part in parts:
+            if part is None:
+                content.append(b"q 1 0 0 1 %s %s cm /Total Do Q" % (
+                    serialize(float(x)), serialize(float(baseline))))
+                x += count_width
+            else:
+                content.append(self.fonts.show(part, STAMP_FONT_SIZE, x,
+                                               baseline))
+                x += self.fonts.width(part, STAMP_FONT_SIZE)
+        return b"\n".join(content)
+
+    def overlay(self, number: int, page_width: float, page_height: float,
+                name: str = "") -> Tuple[bytes, dict]:
+        """(content, resources) stamping page `number` of this file"""
+        content = []
+        if self.header:
+            ascent = HELVETICA_ASCENT * STAMP_FONT_SIZE / 1000.0
+            content.append(self.line(self.header, number, name,
+                                     page_height - STAMP_MARGIN - ascent,
+                                     page_width))
+        if self.footer:
+            content.append(self.line(self.footer, number, name, STAMP_MARGIN,
+                                     page_width))
+        return b"\n".join(content), self.resources
+
+    def finish(self, count: int):
+        """Write the page count form and the embedded glyphs now that the
+        file's pages are known"""
+        text = str(count)
+        bbox = (0, -HELVETICA_DESCENT * STAMP_FONT_SIZE / 1000.0,
+                self.fonts.width(text, STAMP_FONT_SIZE),
+                HELVETICA_ASCENT * STAMP_FONT_SIZE / 1000.0)
+        self.writer.add_form(bbox, self.fonts.show(text, STAMP_FONT_SIZE, 0, 0),
+                             {"Font": {"F0": self.fonts.resources["F0"]}},
+                             self.total)
+        self.fonts.finish()
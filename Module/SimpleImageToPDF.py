@@ -4,9 +4,11 @@ import os
 import sys
 from pathlib import Path
 from Module.Splashscreen import SplashScreen
+from Module.PDFExport import PDFExporter, ExportOptions
+from Module.PageStamps import PAGE_NUMBER_TEXT
 # Try to import PIL, but gracefully handle if not available
 try:
-    from PIL import Image, ImageTk, ImageDraw, ImageFont
+    from PIL import Image, ImageTk
     PIL_AVAILABLE = True
 except ImportError:
     PIL_AVAILABLE = False
@@ -18,6 +20,7 @@ class SimpleImageToPDF:
         self.setup_window()
         self.selected_images = []
         self.image_thumbnails = []  # Store thumbnail PhotoImage objects
+        self.thumbnail_cache = {}  # Store thumbnail PIL images by path
         self.image_checkboxes = []  # Store checkbox variables
         self.thumbnail_widgets = []  # Store thumbnail widget references
         self.create_ui()
@@ -337,6 +340,117 @@ class SimpleImageToPDF:
                                  bg=self.colors['bg_secondary'])
         quality_scale.pack(fill='x', padx=5, pady=2)
 
+        # Color mode
+        tk.Label(settings_frame, text="Color Mode:",
+                 font=('Segoe UI', 9),
+                 bg=self.colors['bg_secondary']).pack(anchor='w', padx=5, pady=(10, 0))
+
+        self.color_mode_var = tk.StringVar(value="Auto")
+        color_combo = ttk.Combobox(settings_frame,
+                                   textvariable=self.color_mode_var,
+                                   values=["Auto", "Color", "Grayscale"],
+                                   state="readonly")
+        color_combo.pack(fill='x', padx=5, pady=2)
+
+        # Colorfulness below which Auto treats a page as gray (and, for
+        # text scans, as a bilevel candidate)
+        tk.Label(settings_frame, text="Gray Threshold:",
+                 font=('Segoe UI', 9),
+                 bg=self.colors['bg_secondary']).pack(anchor='w', padx=5, pady=(10, 0))
+
+        self.gray_threshold_var = tk.DoubleVar(value=5.0)
+        gray_scale = tk.Scale(settings_frame,
+                              from_=0, to=20, resolution=0.5,
+                              variable=self.gray_threshold_var,
+                              orient='horizontal',
+                              bg=self.colors['bg_secondary'])
+        gray_scale.pack(fill='x', padx=5, pady=2)
+
+        # ICC color profiles
+        tk.Label(settings_frame, text="Color Profiles:",
+                 font=('Segoe UI', 9),
+                 bg=self.colors['bg_secondary']).pack(anchor='w', padx=5, pady=(10, 0))
+
+        self.color_management_var = tk.StringVar(value="Convert")
+        profile_combo = ttk.Combobox(settings_frame,
+                                     textvariable=self.color_management_var,
+                                     values=["Convert", "Embed ICC", "Off"],
+                                     state="readonly")
+        profile_combo.pack(fill='x', padx=5, pady=2)
+
+        # Transparency
+        tk.Label(settings_frame, text="Transparency:",
+                 font=('Segoe UI', 9),
+                 bg=self.colors['bg_secondary']).pack(anchor='w', padx=5, pady=(10, 0))
+
+        self.transparency_var = tk.StringVar(value="Flatten")
+        transparency_combo = ttk.Combobox(settings_frame,
+                                          textvariable=self.transparency_var,
+                                          values=["Flatten", "Preserve"],
+                                          state="readonly")
+        transparency_combo.pack(fill='x', padx=5, pady=2)
+
+        # Encoder selection
+        tk.Label(settings_frame, text="Encoder:",
+                 font=('Segoe UI', 9),
+                 bg=self.colors['bg_secondary']).pack(anchor='w', padx=5, pady=(10, 0))
+
+        self.encoder_var = tk.StringVar(value="Auto")
+        encoder_combo = ttk.Combobox(settings_frame,
+                                     textvariable=self.encoder_var,
+                                     values=["Auto", "JPEG", "Indexed", "G4", "MRC"],
+                                     state="readonly")
+        encoder_combo.pack(fill='x', padx=5, pady=2)
+
+        self.report_var = tk.BooleanVar()
+        report_check = tk.Checkbutton(settings_frame,
+                                      text="Show Encoding Report",
+                                      variable=self.report_var,
+                                      font=('Segoe UI', 9),
+                                      bg=self.colors['bg_secondary'])
+        report_check.pack(anchor='w', padx=5)
+
+        self.passthrough_var = tk.BooleanVar()
+        passthrough_check = tk.Checkbutton(settings_frame,
+                                           text="Pass Through Unchanged JPEGs",
+                                           variable=self.passthrough_var,
+                                           font=('Segoe UI', 9),
+                                           bg=self.colors['bg_secondary'])
+        passthrough_check.pack(anchor='w', padx=5)
+
+        # Scan cleanup
+        self.clean_scans_var = tk.BooleanVar()
+        clean_check = tk.Checkbutton(settings_frame,
+                                     text="Whiten Scan Background",
+                                     variable=self.clean_scans_var,
+                                     font=('Segoe UI', 9),
+                                     bg=self.colors['bg_secondary'])
+        clean_check.pack(anchor='w', padx=5, pady=(10, 0))
+
+        self.auto_crop_var = tk.BooleanVar()
+        crop_check = tk.Checkbutton(settings_frame,
+                                    text="Auto-Crop Uniform Borders",
+                                    variable=self.auto_crop_var,
+                                    font=('Segoe UI', 9),
+                                    bg=self.colors['bg_secondary'])
+        crop_check.pack(anchor='w', padx=5)
+
+        self.skip_blank_var = tk.BooleanVar()
+        blank_check = tk.Checkbutton(settings_frame,
+                                     text="Skip Blank Pages",
+                                     variable=self.skip_blank_var,
+                                     font=('Segoe UI', 9),
+                                     bg=self.colors['bg_secondary'])
+        blank_check.pack(anchor='w', padx=5)
+
+        self.isolate_var = tk.BooleanVar(value=True)
+        isolate_check = tk.Checkbutton(settings_frame,
+                                       text="Decode Images in Separate Processes",
+                                       variable=self.isolate_var,
+                                       font=('Segoe UI', 9),
+                                       bg=self.colors['bg_secondary'])
+        isolate_check.pack(anchor='w', padx=5)
+
         # Watermark
         self.watermark_var = tk.BooleanVar()
         watermark_check = tk.Checkbutton(settings_frame,
@@ -353,6 +467,93 @@ class SimpleImageToPDF:
                                         state='disabled')
         self.watermark_entry.pack(fill='x', padx=5, pady=2)
 
+        self.watermark_layout_var = tk.StringVar(value="Corner")
+        watermark_layout_combo = ttk.Combobox(settings_frame,
+                                              textvariable=self.watermark_layout_var,
+                                              values=["Corner", "Tiled", "Diagonal"],
+                                              state="readonly")
+        watermark_layout_combo.pack(fill='x', padx=5, pady=2)
+
+        self.vector_watermark_var = tk.BooleanVar()
+        vector_watermark_check = tk.Checkbutton(settings_frame,
+                                                text="Vector Watermark (no pixel changes)",
+                                                variable=self.vector_watermark_var,
+                                                font=('Segoe UI', 9),
+                                                bg=self.colors['bg_secondary'])
+        vector_watermark_check.pack(anchor='w', padx=5)
+
+        # Header / footer stamped as PDF text
+        tk.Label(settings_frame, text="Header ({name}, {date}, {page}, {pages}):",
+                 font=('Segoe UI', 9),
+                 bg=self.colors['bg_secondary']).pack(anchor='w', padx=5, pady=(10, 0))
+
+        self.header_text_var = tk.StringVar(value="")
+        tk.Entry(settings_frame,
+                 textvariable=self.header_text_var).pack(fill='x', padx=5, pady=2)
+
+        tk.Label(settings_frame, text="Footer:",
+                 font=('Segoe UI', 9),
+                 bg=self.colors['bg_secondary']).pack(anchor='w', padx=5)
+
+        self.footer_text_var = tk.StringVar(value="")
+        tk.Entry(settings_frame,
+                 textvariable=self.footer_text_var).pack(fill='x', padx=5, pady=2)
+
+        self.page_numbers_var = tk.BooleanVar()
+        page_numbers_check = tk.Checkbutton(settings_frame,
+                                            text="Page Numbers (Page N of M)",
+                                            variable=self.page_numbers_var,
+                                            font=('Segoe UI', 9),
+                                            bg=self.colors['bg_secondary'])
+        page_numbers_check.pack(anchor='w', padx=5)
+
+        # Frames of multi-page TIFF / animated GIF files
+        tk.Label(settings_frame, text="Frames (e.g. 1-3,5; blank = all):",
+                 font=('Segoe UI', 9),
+                 bg=self.colors['bg_secondary']).pack(anchor='w', padx=5, pady=(10, 0))
+
+        self.frame_range_var = tk.StringVar(value="")
+        frame_entry = tk.Entry(settings_frame,
+                               textvariable=self.frame_range_var)
+        frame_entry.pack(fill='x', padx=5, pady=2)
+
+        # Split output into volumes
+        tk.Label(settings_frame, text="Split Output:",
+                 font=('Segoe UI', 9),
+                 bg=self.colors['bg_secondary']).pack(anchor='w', padx=5, pady=(10, 0))
+
+        self.split_mode_var = tk.StringVar(value="Single PDF")
+        split_combo = ttk.Combobox(settings_frame,
+                                   textvariable=self.split_mode_var,
+                                   values=["Single PDF", "Pages per Volume",
+                                           "MB per Volume"],
+                                   state="readonly")
+        split_combo.pack(fill='x', padx=5, pady=2)
+
+        self.split_limit_var = tk.IntVar(value=100)
+        split_spin = tk.Spinbox(settings_frame,
+                                from_=1, to=100000,
+                                textvariable=self.split_limit_var)
+        split_spin.pack(fill='x', padx=5, pady=2)
+
+        # Fast web view
+        self.linearize_var = tk.BooleanVar()
+        linearize_check = tk.Checkbutton(settings_frame,
+                                         text="Fast Web View (linearized)",
+                                         variable=self.linearize_var,
+                                         font=('Segoe UI', 9),
+                                         bg=self.colors['bg_secondary'])
+        linearize_check.pack(anchor='w', padx=5, pady=(10, 0))
+
+        # Page thumbnails
+        self.thumbnails_var = tk.BooleanVar()
+        thumbnails_check = tk.Checkbutton(settings_frame,
+                                          text="Embed Page Thumbnails",
+                                          variable=self.thumbnails_var,
+                                          font=('Segoe UI', 9),
+                                          bg=self.colors['bg_secondary'])
+        thumbnails_check.pack(anchor='w', padx=5)
+
         # Export button
         export_btn = tk.Button(right_frame,
                                text="💾 Export to PDF",
@@ -430,6 +631,7 @@ class SimpleImageToPDF:
             # Load and create thumbnail
             img = Image.open(image_path)
             img.thumbnail((120, 120))  # Thumbnail size
+            self.thumbnail_cache[image_path] = img
             photo = ImageTk.PhotoImage(img)
             self.image_thumbnails.append(photo)
 
@@ -744,6 +946,7 @@ class SimpleImageToPDF:
                 # Clear all data
                 self.selected_images.clear()
                 self.image_thumbnails.clear()
+                self.thumbnail_cache.clear()
                 self.image_checkboxes.clear()
 
                 # Destroy all thumbnail widgets
@@ -790,66 +993,43 @@ class SimpleImageToPDF:
             self.info_label.config(
                 text=f"Images: {checked_count}/{total_count} selected")
 
-    def get_page_dimensions(self, page_size):
-        """Get page dimensions in pixels (at 72 DPI)"""
-        # Common page sizes in inches, converted to pixels at 72 DPI
-        page_sizes = {
-            "A4": (595, 842),      # 8.27 × 11.69 inches
-            "Letter": (612, 792),  # 8.5 × 11 inches
-            "Legal": (612, 1008),  # 8.5 × 14 inches
-            "A3": (842, 1191)      # 11.69 × 16.54 inches
-        }
-        return page_sizes.get(page_size, (595, 842))  # Default to A4
-
-    def resize_image_for_page(self, img, page_size, fit_mode="Fit to Page", margin=50):
-        """Resize image to fit within page dimensions based on fit mode"""
-        if fit_mode == "Original Size":
-            return img
-
-        page_width, page_height = self.get_page_dimensions(page_size)
-
-        # Calculate available space (page size minus margins)
-        available_width = page_width - (2 * margin)
-        available_height = page_height - (2 * margin)
-
-        # Get current image dimensions
-        img_width, img_height = img.size
-
-        if fit_mode == "Fit to Page":
-            # Scale to fit completely within page (maintains aspect ratio)
-            width_scale = available_width / img_width
-            height_scale = available_height / img_height
-            scale_factor = min(width_scale, height_scale, 1.0)  # Don't upscale
-
-        elif fit_mode == "Fill Page":
-            # Scale to fill the page (may crop, maintains aspect ratio)
-            width_scale = available_width / img_width
-            height_scale = available_height / img_height
-            scale_factor = max(width_scale, height_scale)  # Fill entire page
-
-        else:  # Original Size
-            return img
-
-        # Calculate new dimensions
-        new_width = int(img_width * scale_factor)
-        new_height = int(img_height * scale_factor)
-
-        # Resize image
-        if scale_factor != 1.0:
-            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-        # For "Fill Page" mode, crop if necessary to fit exact page dimensions
-        if fit_mode == "Fill Page":
-            if new_width > available_width or new_height > available_height:
-                # Calculate crop box to center the image
-                left = max(0, (new_width - available_width) // 2)
-                top = max(0, (new_height - available_height) // 2)
-                right = left + min(available_width, new_width)
-                bottom = top + min(available_height, new_height)
-
-                img = img.crop((left, top, right, bottom))
-
-        return img
+    def get_export_options(self):
+        """Collect the PDF settings from the UI"""
+        split_mode = self.split_mode_var.get()
+        split_limit = max(1, self.split_limit_var.get())
+        watermark_text = ""
+        if self.watermark_var.get():
+            watermark_text = self.watermark_text_var.get().strip()
+        footer_text = self.footer_text_var.get().strip()
+        if self.page_numbers_var.get():
+            footer_text = " - ".join(filter(None, [footer_text, PAGE_NUMBER_TEXT]))
+
+        return ExportOptions(
+            page_size=self.page_size_var.get(),
+            fit_mode=self.fit_mode_var.get(),
+            quality=self.quality_var.get(),
+            color_mode=self.color_mode_var.get(),
+            grayscale_threshold=self.gray_threshold_var.get(),
+            color_management=self.color_management_var.get(),
+            transparency=self.transparency_var.get(),
+            encoder=self.encoder_var.get(),
+            report=self.report_var.get(),
+            jpeg_passthrough=self.passthrough_var.get(),
+            clean_scans=self.clean_scans_var.get(),
+            auto_crop=self.auto_crop_var.get(),
+            skip_blank_pages=self.skip_blank_var.get(),
+            frame_range=self.frame_range_var.get(),
+            isolate_decoding=self.isolate_var.get(),
+            watermark_text=watermark_text,
+            watermark_layout=self.watermark_layout_var.get(),
+            watermark_mode="Vector" if self.vector_watermark_var.get() else "Raster",
+            header_text=self.header_text_var.get().strip(),
+            footer_text=footer_text,
+            max_pages_per_volume=split_limit if split_mode == "Pages per Volume" else 0,
+            max_volume_bytes=split_limit * 1024 * 1024 if split_mode == "MB per Volume" else 0,
+            linearize=self.linearize_var.get(),
+            embed_thumbnails=self.thumbnails_var.get(),
+        )
 
     def export_pdf(self):
         """Export images to PDF"""
@@ -889,98 +1069,57 @@ class SimpleImageToPDF:
             self.status_var.set("Converting images to PDF...")
             self.root.update()
 
-            # Get selected page size and fit mode
-            selected_page_size = self.page_size_var.get()
-            selected_fit_mode = self.fit_mode_var.get()
+            exporter = PDFExporter(self.get_export_options(),
+                                   self.thumbnail_cache)
 
-            # Process only checked images
-            pdf_images = []
-            for i, image_path in enumerate(checked_images):
-                # Update progress
-                progress = f"Processing image {i+1}/{len(checked_images)} - Loading..."
-                self.status_var.set(progress)
+            def on_progress(done, total, filename):
+                self.status_var.set(
+                    f"Processing image {done}/{total} - {filename}")
                 self.root.update()
 
-                # Load and convert image
-                img = Image.open(image_path)
-                img = img.convert('RGB')
-
-                # Update progress
-                progress = f"Processing image {i+1}/{len(checked_images)} - Resizing for {selected_page_size}..."
-                self.status_var.set(progress)
-                self.root.update()
-
-                # Resize image to fit page size
-                img = self.resize_image_for_page(
-                    img, selected_page_size, selected_fit_mode)
-
-                # Add watermark if enabled
-                if self.watermark_var.get():
-                    progress = f"Processing image {i+1}/{len(checked_images)} - Adding watermark..."
-                    self.status_var.set(progress)
-                    self.root.update()
-                    img = self.add_watermark(img)
-
-                pdf_images.append(img)
-
-            # Save PDF
-            self.status_var.set("Saving PDF...")
-            self.root.update()
-
-            if pdf_images:
-                pdf_images[0].save(pdf_path, save_all=True,
-                                   append_images=pdf_images[1:])
+            result = exporter.export(checked_images, pdf_path, on_progress)
+            outputs = result.outputs
 
             # Success
-            self.status_var.set(
-                f"PDF saved successfully: {os.path.basename(pdf_path)}")
+            if len(outputs) > 1:
+                self.status_var.set(
+                    f"PDF saved as {len(outputs)} volumes: {os.path.basename(outputs[0])} ...")
+                location = f"{len(outputs)} volumes starting at {outputs[0]}"
+            else:
+                self.status_var.set(
+                    f"PDF saved successfully: {os.path.basename(pdf_path)}")
+                location = pdf_path
+
+            if result.skipped:
+                location += f"\n\nSkipped {len(result.skipped)} blank page(s)"
+            if result.failed:
+                location += f"\n\n{len(result.failed)} page(s) could not be decoded"
+            if self.report_var.get() or result.skipped or result.failed:
+                self.show_encoding_report(result)
 
             result = messagebox.askyesno("Success",
                                          f"PDF created successfully!\\n\\n"
-                                         f"Location: {pdf_path}\\n\\n"
+                                         f"Location: {location}\\n\\n"
                                          f"Open the file?")
             if result:
-                os.startfile(pdf_path)
+                os.startfile(outputs[0])
 
         except Exception as e:
             error_msg = f"Error creating PDF: {str(e)}"
             self.status_var.set("Export failed")
             messagebox.showerror("Export Error", error_msg)
 
-    def add_watermark(self, image):
-        """Add watermark to image"""
-        if not self.watermark_text_var.get().strip():
-            return image
+    def show_encoding_report(self, result):
+        """Show the encoder chosen for each page and the bytes it saved"""
+        report_window = tk.Toplevel(self.root)
+        report_window.title("Encoding Report")
+        report_window.geometry("640x400")
 
-        try:
-            watermark_img = image.copy()
-            draw = ImageDraw.Draw(watermark_img)
-            text = self.watermark_text_var.get().strip()
-
-            # Try to load font
-            try:
-                font = ImageFont.truetype("arial.ttf", 24)
-            except:
-                font = ImageFont.load_default()
-
-            # Get text dimensions
-            try:
-                bbox = font.getbbox(text)
-                text_width = bbox[2] - bbox[0]
-                text_height = bbox[3] - bbox[1]
-            except:
-                text_width, text_height = draw.textsize(text, font=font)
-
-            # Position watermark
-            x = watermark_img.width - text_width - 20
-            y = watermark_img.height - text_height - 20
-
-            # Draw watermark with shadow
-            draw.text((x+2, y+2), text, font=font, fill=(0, 0, 0, 128))
-            draw.text((x, y), text, font=font, fill=(255, 255, 255, 200))
-
-            return watermark_img
+        text = tk.Text(report_window, font=('Consolas', 9), wrap='none')
+        scrollbar = tk.Scrollbar(report_window, command=text.yview)
+        text.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side='right', fill='y')
+        text.pack(side='left', fill='both', expand=True)
 
-        except Exception as e:
-            print(f"Watermark error: {e}")
-            return image
+        text.insert('end', "\n".join(result.report_lines()))
+        text.configure(state='disabled')
@@ -0,0 +1,357 @@
+"""
+Streaming Decode for Image to PDF Converter
+Read very large TIFF and PNG files band by band with bounded memory
+"""
+
+import io
+import struct
+import zlib
+from typing import Iterator, Optional, Tuple
+
+from Module.PDFEncoders import PNG_SIGNATURE
+
+try:
+    from PIL import Image, PngImagePlugin, TiffImagePlugin
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    Image = PngImagePlugin = TiffImagePlugin = None
+
+
+STREAMING_PIXELS = 64 * 1024 * 1024  # Larger images are read band by band
+BAND_BYTES = 32 * 1024 * 1024        # Decoded bytes held per band
+
+# Tags copied from the source IFD into each single-band TIFF
+TIFF_BAND_TAGS = (258, 259, 262, 277, 284, 317, 338, 339, 347, 530, 320)
+TILE_WIDTH, TILE_LENGTH, TILE_OFFSETS, TILE_BYTE_COUNTS = 322, 323, 324, 325
+STRIP_OFFSETS, ROWS_PER_STRIP, STRIP_BYTE_COUNTS = 273, 278, 279
+
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+def open_image(path: str):
+    """Image.open that lets oversized TIFF and PNG files through.
+
+    Pillow refuses to even open images past its decompression-bomb
+    limit. Those two formats can be streamed, so their headers are read
+    with the plugin directly; the caller decides how to decode them.
+    """
+    try:
+        return Image.open(path)
+    except Image.DecompressionBombError:
+        with open(path, "rb") as stream:
+            signature = stream.read(8)
+        if signature.startswith(PNG_SIGNATURE):
+            return PngImagePlugin.PngImageFile(path)
+        if signature[:4] in (b"II*\x00", b"MM\x00*"):
+            return TiffImagePlugin.TiffImageFile(path)
+        raise
+
+
+def needs_streaming(img) -> bool:
+    return img.width * img.height > STREAMING_PIXELS
+
+
+def can_stream(img) -> bool:
+    """True for stripped/tiled chunky TIFFs and 8-bit, non-interlaced PNGs"""
+    if img.format == "TIFF":
+        tags = img.tag_v2
+        return tags.get(284, 1) == 1 and \
+            (STRIP_OFFSETS in tags or TILE_OFFSETS in tags)
+    if img.format == "PNG":
+        return png_header(img.filename) is not None
+    return False
+
+
+def png_header(path: str) -> Optional[Tuple[int, int, int, int]]:
+    """(width, height, bit depth, color type) for streamable PNGs"""
+    with open(path, "rb") as stream:
+        if stream.read(8) != PNG_SIGNATURE:
+            return None
+        length, chunk_type = struct.unpack(">I4s", stream.read(8))
+        if chunk_type != b"IHDR":
+            return None
+        width, height, depth, color_type, _, _, interlace = struct.unpack(
+            ">IIBBBBB", stream.read(13))
+    if depth != 8 or interlace or color_type not in PNG_CHANNELS:
+        return None
+    return width, height, depth, color_type
+
+
+# TIFF field types written into band files: type -> struct code
+TIFF_TYPES = {1: "B", 2: "B", 3: "H", 4: "I", 7: "B"}
+
+
+def tiff_entry(tag: int, field_type: int, value):
+    """(tag, type, count, packed value) for one IFD entry"""
+    if isinstance(value, str):
+        value = value.encode("ascii") + b"\0"
+    if isinstance(value, bytes):
+        values = tuple(value)
+    else:
+        values = tuple(value) if isinstance(value, (tuple, list)) else (value,)
+    code = TIFF_TYPES[field_type]
+    return tag, field_type, len(values), \
+        struct.pack("<%d%s" % (len(values), code), *values)
+
+
+def band_tiff(tags, width: int, height: int, offsets_tag: int,
+              counts_tag: int, chunks, extra_tags: dict) -> bytes:
+    """A standalone TIFF holding one band of the source's strips or tiles.
+
+    Pillow cannot serialize multi-strip directories, so the IFD is
+    packed here; only the integer and byte fields decoding needs.
+    """
+    fields = {}
+    for tag in TIFF_BAND_TAGS:
+        if tag in tags and tags.tagtype[tag] in TIFF_TYPES:
+            fields[tag] = (tags.tagtype[tag], tags[tag])
+    fields[256] = (4, width)
+    fields[257] = (4, height)
+    for tag, value in extra_tags.items():
+        fields[tag] = (4, value)
+    fields[counts_tag] = (4, tuple(len(chunk) for chunk in chunks))
+    fields[offsets_tag] = (4, tuple(0 for _ in chunks))
+
+    # Entry sizes do not depend on the offsets, so lay out once, then fill
+    entries = [tiff_entry(tag, *fields[tag]) for tag in sorted(fields)]
+    data_start = 8 + 2 + 12 * len(entries) + 4
+    overflow = sum(len(packed) for *_, packed in entries if len(packed) > 4)
+    position = data_start + overflow
+    positions = []
+    for chunk in chunks:
+        positions.append(position)
+        position += len(chunk)
+    entries = [tiff_entry(tag, *fields[tag]) if tag != offsets_tag
+               else tiff_entry(tag, 4, tuple(positions))
+               for tag in sorted(fields)]
+
+    ifd, values = [struct.pack("<H", len(entries))], []
+    value_offset = data_start
+    for tag, field_type, count, packed in entries:
+        if len(packed) <= 4:
+            ifd.append(struct.pack("<HHI", tag, field_type, count) +
+                       packed.ljust(4, b"\0"))
+        else:
+            ifd.append(struct.pack("<HHII", tag, field_type, count,
+                                   value_offset))
+            values.append(packed)
+            value_offset += len(packed)
+    ifd.append(struct.pack("<I", 0))
+    return b"II*\x00" + struct.pack("<I", 8) + b"".join(ifd) + \
+        b"".join(values) + b"".join(chunks)
+
+
+def tiff_bands(img) -> Iterator:
+    """Decode a stripped or tiled TIFF frame as a sequence of row bands"""
+    tags = img.tag_v2
+    width, height = img.size
+    row_bytes = max(1, width * len(img.getbands()))
+    with open(img.filename, "rb") as stream:
+        def read(offset, count):
+            stream.seek(offset)
+            return stream.read(count)
+
+        if TILE_OFFSETS in tags:
+            tile_width, tile_length = tags[TILE_WIDTH], tags[TILE_LENGTH]
+            across = -(-width // tile_width)
+            offsets, counts = tags[TILE_OFFSETS], tags[TILE_BYTE_COUNTS]
+            for top in range(0, height, tile_length):
+                first = (top // tile_length) * across
+                chunks = [read(offsets[i], counts[i])
+                          for i in range(first, first + across)]
+                rows = min(tile_length, height - top)
+                data = band_tiff(tags, width, rows, TILE_OFFSETS,
+                                 TILE_BYTE_COUNTS, chunks,
+                                 {TILE_WIDTH: tile_width,
+                                  TILE_LENGTH: tile_length})
+                yield decode_band(data)
+            return
+
+        rows_per_strip = min(tags.get(ROWS_PER_STRIP, height), height)
+        offsets, counts = tags[STRIP_OFFSETS], tags[STRIP_BYTE_COUNTS]
+        strips_per_band = max(1, BAND_BYTES // (row_bytes * rows_per_strip))
+        for first in range(0, len(offsets), strips_per_band):
+            last = min(first + strips_per_band, len(offsets))
+            top = first * rows_per_strip
+            rows = min(height, last * rows_per_strip) - top
+            if rows <= 0:
+                break
+            chunks = [read(offsets[i], counts[i]) for i in range(first, last)]
+            data = band_tiff(tags, width, rows, STRIP_OFFSETS,
+                             STRIP_BYTE_COUNTS, chunks,
+                             {ROWS_PER_STRIP: rows_per_strip})
+            yield decode_band(data)
+
+
+def decode_band(data: bytes):
+    with Image.open(io.BytesIO(data)) as band:
+        band.load()
+        return band.copy()
+
+
+def png_bands(img) -> Iterator:
+    """Decode a non-interlaced 8-bit PNG as a sequence of row bands.
+
+    The IDAT stream is inflated incrementally. Each band becomes a small
+    PNG whose first row is the previous band's last row, unfiltered, so
+    Pillow can undo Up/Average/Paeth filters across the band boundary.
+    """
+    width, height, depth, color_type = png_header(img.filename)
+    line = width * PNG_CHANNELS[color_type] + 1  # Filter byte plus samples
+    band_bytes = max(1, BAND_BYTES // line) * line
+
+    header = {"IHDR": (width, depth, color_type)}
+    previous = None
+    done = 0
+    pending = bytearray()
+    inflater = zlib.decompressobj()
+    for piece in png_idat_pieces(img.filename, header):
+        while piece:
+            # Bounded output per call, even for extremely compressible data
+            pending += inflater.decompress(piece, band_bytes)
+            piece = inflater.unconsumed_tail
+            while len(pending) >= band_bytes:
+                with memoryview(pending) as view:
+                    band, previous = band_png(header, view[:band_bytes],
+                                              previous)
+                del pending[:band_bytes]
+                done += band.height
+                yield band
+    pending += inflater.flush()
+    rows = min(len(pending) // line, height - done)
+    if rows > 0:
+        band, _ = band_png(header, bytes(pending[:rows * line]), previous)
+        yield band
+
+
+def png_idat_pieces(path: str, header: dict, piece_size: int = 1024 * 1024):
+    """Yield IDAT payload in pieces; PLTE and tRNS are stored in header"""
+    with open(path, "rb") as stream:
+        stream.seek(len(PNG_SIGNATURE))
+        while True:
+            chunk_header = stream.read(8)
+            if len(chunk_header) < 8:
+                return
+            length, chunk_type = struct.unpack(">I4s", chunk_header)
+            if chunk_type == b"IDAT":
+                remaining = length
+                while remaining:
+                    piece = stream.read(min(piece_size, remaining))
+                    if not piece:
+                        return
+                    remaining -= len(piece)
+                    yield piece
+            elif chunk_type in (b"PLTE", b"tRNS"):
+                header[chunk_type] = stream.read(length)
+            elif chunk_type == b"IEND":
+                return
+            else:
+                stream.seek(length, io.SEEK_CUR)
+            stream.seek(4, io.SEEK_CUR)  # CRC
+
+
+def png_chunk(kind: bytes, payload: bytes) -> bytes:
+    return b"".join((struct.pack(">I", len(payload)), kind, payload,
+                     struct.pack(">I", zlib.crc32(payload, zlib.crc32(kind)))))
+
+
+def band_png(header: dict, filtered, previous: Optional[bytes]):
+    """Decode filtered rows; returns (band image, last row unfiltered)"""
+    width, depth, color_type = header["IHDR"]
+    line = width * PNG_CHANNELS[color_type] + 1
+    rows = len(filtered) // line
+    total_rows = rows + (previous is not None)
+
+    parts = [PNG_SIGNATURE,
+             png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, total_rows,
+                                            depth, color_type, 0, 0, 0))]
+    for kind in (b"PLTE", b"tRNS"):
+        if kind in header:
+            parts.append(png_chunk(kind, header[kind]))
+    # Level 0: the data is only stored so Pillow can unfilter it in C
+    stored = zlib.compressobj(0)
+    idat = stored.compress(b"\x00" + previous) if previous is not None else b""
+    idat += stored.compress(filtered) + stored.flush()
+    parts.append(png_chunk(b"IDAT", idat))
+    del idat
+    parts.append(png_chunk(b"IEND", b""))
+
+    stream = io.BytesIO()
+    for part in parts:
+        stream.write(part)
+    del parts
+    stream.seek(0)
+    with Image.open(stream) as band:
+        band.load()
+        if previous is not None:
+            band = band.crop((0, 1, width, total_rows))
+        else:
+            band = band.copy()
+    last_row = band.crop((0, rows - 1, width, rows)).tobytes()
+    return band, last_row
+
+
+def iter_bands(img) -> Iterator:
+    return tiff_bands(img) if img.format == "TIFF" else png_bands(img)
+
+
+def normalize_band(band):
+    """Modes the reduce/convert steps downstream can work with"""
+    if band.mode == "1":
+        return band.convert("L")
+    if band.mode == "P":
+        return band.convert("RGBA" if "transparency" in band.info else "RGB")
+    if band.mode not in ("L", "LA", "RGB", "RGBA", "CMYK"):
+        return band.convert("RGB")
+    return band
+
+
+def read_reduced(img, size: Tuple[int, int]):
+    """Decode a huge image at an integer reduction no smaller than size.
+
+    Bands are box-reduced as they arrive and pasted into the output, so
+    only one band at full resolution is ever in memory.
+    """
+    factor = max(1, min(img.width // max(1, size[0]),
+                        img.height // max(1, size[1])))
+    output = None
+    carry = None  # rows left over because a band is not a factor multiple
+    top = 0
+    for band in iter_bands(img):
+        band = normalize_band(band)
+        if carry is not None:
+            joined = Image.new(band.mode, (band.width, carry.height + band.height))
+            joined.paste(carry, (0, 0))
+            joined.paste(band, (0, carry.height))
+            band = joined
+        usable = band.height - band.height % factor
+        carry = band.crop((0, usable, band.width, band.height)) \
+            if usable < band.height else None
+        if usable == 0:
+            continue
+        reduced = band.crop((0, 0, band.width, usable)).reduce(factor)
+        if output is None:
+            output = Image.new(reduced.mode, (img.width // factor,
+                                              img.height // factor))
+        output.paste(reduced, (0, top))
+        top += reduced.height
+    if carry is not None and output is not None and top < output.height:
+        output.paste(carry.reduce(factor), (0, top))
+    output.info = dict(img.info)
+    return output
+
+
+def stream_flate(img, mode: str, background=(255, 255, 255)) -> Iterator[bytes]:
+    """Flate-compressed full-resolution pixels in the given mode, band by band"""
+    compressor = zlib.compressobj(6)
+    for band in iter_bands(img):
+        band = normalize_band(band)
+        if band.mode in ("RGBA", "LA"):
+            base = Image.new("RGB", band.size, background)
+            base.paste(band, mask=band.getchannel("A"))
+            band = base
+        if band.mode != mode:
+            band = band.convert(mode)
+        yield compressor.compress(band.tobytes())
+    yield compressor.flush()
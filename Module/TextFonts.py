@@ -0,0 +1,207 @@
+"""
+Text Fonts for Image to PDF Converter
+Standard Helvetica for Western text, embedded glyphs for everything else
+"""
+
+import functools
+from typing import Dict, List, Optional, Tuple
+
+from Module.PDFWriter import PDFName, serialize, text_width, winansi_literal
+from Module.Watermark import WATERMARK_FONTS, load_font
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    Image = ImageDraw = ImageFont = None
+
+
+GLYPH_EM = 128      # Pixels per em glyphs are rendered at; ~1000 DPI at 9pt
+GLYPH_CODES = 255   # Single-byte codes per embedded font (0 is unused)
+CMAP_CHUNK = 100    # Entries per bfchar block allowed by the CMap syntax
+# Tried in order for each character; the first with a real glyph draws it
+GLYPH_FONTS = WATERMARK_FONTS + ("msyh.ttc", "NotoSansCJK-Regular.ttc",
+                                 "Arial Unicode.ttf")
+MISSING = "\uffff"  # Never in a font: renders as the .notdef box
+
+
+@functools.lru_cache(maxsize=1)
+def installed_fonts() -> list:
+    fonts = []
+    for name in GLYPH_FONTS:
+        try:
+            fonts.append(ImageFont.truetype(name, GLYPH_EM))
+        except OSError:
+            continue
+    return fonts or [load_font(GLYPH_EM)]
+
+
+def rendering(font, char: str) -> bytes:
+    left, top, right, bottom = font.getbbox(char, anchor="ls")
+    mask = Image.new("L", (max(1, right - left), max(1, bottom - top)), 0)
+    ImageDraw.Draw(mask).text((-left, -top), char, font=font, fill=255,
+                              anchor="ls")
+    return mask.tobytes()
+
+
+@functools.lru_cache(maxsize=4096)
+def glyph_font(char: str):
+    """First installed font that has a glyph for the character"""
+    fonts = installed_fonts()
+    for font in fonts:
+        if rendering(font, char) != rendering(font, MISSING):
+            return font
+    return fonts[0]
+
+
+def utf16_hex(char: str) -> bytes:
+    return char.encode("utf-16-be").hex().upper().encode("ascii")
+
+
+def to_unicode_cmap(codes: Dict[str, int]) -> bytes:
+    """ToUnicode CMap so viewers can copy and search embedded glyph text"""
+    lines = [b"/CIDInit /ProcSet findresource begin", b"12 dict begin",
+             b"begincmap",
+             b"/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) "
+             b"/Supplement 0 >> def",
+             b"/CMapName /Adobe-Identity-UCS def", b"/CMapType 2 def",
+             b"1 begincodespacerange", b"<00> <FF>", b"endcodespacerange"]
+    entries = sorted(codes.items(), key=lambda item: item[1])
+    for start in range(0, len(entries), CMAP_CHUNK):
+        chunk = entries[start:start + CMAP_CHUNK]
+        lines.append(b"%d beginbfchar" % len(chunk))
+        lines.extend(b"<%02X> <%s>" % (code, utf16_hex(char))
+                     for char, code in chunk)
+        lines.append(b"endbfchar")
+    lines += [b"endcmap", b"CMapName currentdict /CMap defineresource pop",
+              b"end", b"end"]
+    return b"\n".join(lines)
+
+
+class GlyphFont:
+    """A Type 3 font holding only the characters a file actually uses.
+
+    Each glyph is an installed font's rendering of that character as a
+    1-bit image mask, so any script a system font covers can be shown
+    without a font subsetting library. Written once, after the last page.
+    """
+
+    def __init__(self, ref):
+        self.ref = ref
+        self.codes: Dict[str, int] = {}
+
+    def code(self, char: str, add: bool = True) -> Optional[int]:
+        """The character's code; added if there is room, else None"""
+        code = self.codes.get(char)
+        if code is None and add and len(self.codes) < GLYPH_CODES:
+            code = self.codes[char] = len(self.codes) + 1
+        return code
+
+    def write(self, writer):
+        procs, widths, names = {}, [], []
+        left = bottom = right = top = 0
+        for char, code in sorted(self.codes.items(), key=lambda item: item[1]):
+            font = glyph_font(char)
+            advance = font.getlength(char)
+            box = font.getbbox(char, anchor="ls")
+            glyph = glyph_procedure(font, char, advance, box)
+            name = f"g{code}"
+            procs[name] = writer.add_stream({}, glyph)
+            widths.append(round(advance, 2))
+            names.append(PDFName(name))
+            left, bottom = min(left, box[0]), min(bottom, -box[3])
+            right, top = max(right, box[2]), max(top, -box[1])
+        writer.write_object(self.ref, {
+            "Type": PDFName("Font"),
+            "Subtype": PDFName("Type3"),
+            "FontBBox": [left, bottom, right, top],
+            "FontMatrix": [1.0 / GLYPH_EM, 0, 0, 1.0 / GLYPH_EM, 0, 0],
+            "CharProcs": procs,
+            "Encoding": {"Type": PDFName("Encoding"),
+                         "Differences": [1] + names},
+            "FirstChar": 1,
+            "LastChar": len(names),
+            "Widths": widths,
+            "Resources": {},
+            "ToUnicode": writer.add_stream({}, to_unicode_cmap(self.codes)),
+        })
+
+
+def glyph_procedure(font, char: str, advance: float, box) -> bytes:
+    """Type 3 glyph: advance, bounding box and the glyph as an image mask"""
+    left, top, right, bottom = box
+    width, height = right - left, bottom - top
+    if width <= 0 or height <= 0:
+        return b"%s 0 0 0 0 0 d1" % serialize(round(advance, 2))
+    mask = Image.new("1", (width, height), 0)
+    ImageDraw.Draw(mask).text((-left, -top), char, font=font, fill=1,
+                              anchor="ls")
+    return b"%s 0 %d %d %d %d d1\nq %d 0 0 %d %d %d cm\n" \
+        b"BI /IM true /W %d /H %d /BPC 1 /D [1 0] /F /AHx ID\n%s>\nEI Q" % (
+            serialize(round(advance, 2)), left, -bottom, right, -top,
+            width, height, left, -bottom, width, height,
+            mask.tobytes().hex().encode("ascii"))
+
+
+class TextFonts:
+    """The fonts text in one PDF file is drawn with.
+
+    Text the standard Helvetica can show uses that shared font, which
+    viewers supply; other text uses embedded glyph fonts, which cost a
+    few hundred bytes per distinct character. `resources` grows as fonts
+    are added and can be handed to every page that draws text.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.resources = {"F0": writer.add_standard_font()}
+        self.glyph_fonts: List[GlyphFont] = []
+
+    def runs(self, text: str) -> List[Tuple[str, bytes]]:
+        """(font resource name, string operand) pieces showing the text"""
+        literal = winansi_literal(text)
+        if literal is not None:
+            return [("F0", literal)]
+        runs: List[Tuple[str, bytearray]] = []
+        for char in text:
+            name, code = self.glyph(char)
+            if runs and runs[-1][0] == name:
+                runs[-1][1].append(code)
+            else:
+                runs.append((name, bytearray([code])))
+        return [(name, b"<" + codes.hex().encode("ascii") + b">")
+                for name, codes in runs]
+
+    def glyph(self, char: str) -> Tuple[str, int]:
+        """Resource name and code of an embedded character"""
+        for number, font in enumerate(self.glyph_fonts, start=1):
+            code = font.code(char, add=number == len(self.glyph_fonts))
+            if code is not None:
+                return f"G{number}", code
+        font = GlyphFont(self.writer.reserve())
+        self.glyph_fonts.append(font)
+        name = f"G{len(self.glyph_fonts)}"
+        self.resources[name] = font.ref
+        return name, font.code(char)
+
+    def width(self, text: str, size: float) -> float:
+        """Width of the text in points at this font size"""
+        if winansi_literal(text) is not None:
+            return text_width(text, size)
+        return sum(glyph_font(char).getlength(char)
+                   for char in text) * size / GLYPH_EM
+
+    def show(self, text: str, size: float, x: float, y: float) -> bytes:
+        """Black text with its baseline starting at (x, y)"""
+        size = serialize(float(size))
+        shown = b" ".join(b"/%s %s Tf %s Tj" % (name.encode("ascii"), size,
+                                                 string)
+                          for name, string in self.runs(text))
+        return b"BT 0 g %s %s Td %s ET" % (serialize(float(x)),
+                                           serialize(float(y)), shown)
+
+    def finish(self):
+        """Write the embedded glyph fonts; call after the last page"""
+        for font in self.glyph_fonts:
+            font.write(self.writer)
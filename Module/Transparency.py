@@ -0,0 +1,45 @@
+"""
+Transparency Handling for Image to PDF Converter
+Flatten alpha onto a background or keep it as a PDF soft mask
+"""
+
+try:
+    from PIL import Image, ImageColor
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    Image = ImageColor = None
+
+
+ALPHA_MODES = {"RGBA", "LA", "PA", "RGBa", "La"}
+
+
+def has_alpha(img) -> bool:
+    """True for alpha modes and palette or RGB images with a transparent color"""
+    return img.mode in ALPHA_MODES or "transparency" in img.info
+
+
+def is_opaque(rgba) -> bool:
+    """True when every alpha value is 255; only the alpha band is scanned"""
+    return rgba.getchannel("A").getextrema()[0] == 255
+
+
+def flatten(rgba, background: str = "#FFFFFF"):
+    """Composite an RGBA image onto a solid background color"""
+    base = Image.new("RGBA", rgba.size, ImageColor.getrgb(background))
+    return Image.alpha_composite(base, rgba)
+
+
+def decode_with_alpha(img, target: str, transparency: str,
+                      background: str = "#FFFFFF"):
+    """Decode a page that may carry alpha into the working mode.
+
+    Returns an image in the target mode, or an RGBA image when the alpha
+    is to be preserved and is not fully opaque.
+    """
+    rgba = img.convert("RGBA") if img.mode != "RGBA" else img
+    if is_opaque(rgba):
+        return rgba.convert(target)
+    if transparency == "Preserve":
+        return rgba if rgba is not img else img.copy()
+    return flatten(rgba, background).convert(target)
@@ -50,7 +50,8 @@ class PDFUtils:
         'Letter': (612, 792),
         'Legal': (612, 1008),
         'A3': (842, 1191),
-        'A5': (420, 595)
+        'A5': (420, 595),
+        'Preview': (250, 250)  # The main window's preview-sized pages
     }
 
     @staticmethod
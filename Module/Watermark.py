@@ -0,0 +1,281 @@
+"""
+Watermark Overlays for Image to PDF Converter
+Render text and logo watermarks once and blend them onto each page
+"""
+
+import functools
+import math
+from typing import NamedTuple, Optional, Tuple
+
+from Module.PDFWriter import (PDFName, serialize, text_width, winansi_literal,
+                              HELVETICA_ASCENT, HELVETICA_DESCENT)
+from Module.PDFEncoders import encode_flate
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    Image = ImageDraw = ImageFont = None
+
+
+WATERMARK_LAYOUTS = ("Corner", "Tiled", "Diagonal")
+WATERMARK_FONTS = ("arial.ttf", "DejaVuSans.ttf")
+WATERMARK_FONT_SIZE = 24  # Points; sizes below scale with the page DPI
+WATERMARK_MARGIN = 20     # Points between a corner mark and the page edge
+SHADOW_OFFSET = 2         # Points the drop shadow is shifted by
+TEXT_FILL = (255, 255, 255, 200)
+SHADOW_FILL = (0, 0, 0, 128)
+TILE_ANGLE = 30           # Degrees tiled marks are turned by
+TILE_SPACING = 2.0        # Tile pitch in mark sizes
+DIAGONAL_SPAN = 0.6       # Share of the page diagonal a diagonal mark covers
+
+
+class WatermarkSpec(NamedTuple):
+    """Everything an overlay depends on; the cache key for rendered marks"""
+    text: str
+    image: str      # logo file, drawn above the text
+    layout: str     # one of WATERMARK_LAYOUTS
+    opacity: float  # multiplies the mark's own transparency
+    scale: float    # page pixels per point
+    vector: bool    # drawn as a shared PDF form instead of into the pixels
+
+
+def watermark_spec(options) -> Optional[WatermarkSpec]:
+    """The watermark an export draws, or None"""
+    if not options.has_watermark:
+        return None
+    return WatermarkSpec(options.watermark_text, options.watermark_image,
+                         options.watermark_layout, options.watermark_opacity,
+                         options.dpi / 72.0, not options.raster_watermark)
+
+
+@functools.lru_cache(maxsize=8)
+def load_font(size: int):
+    """First installed watermark font at the given pixel size"""
+    for name in WATERMARK_FONTS:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:  # Pillow < 10.1: bitmap font of one size
+        return ImageFont.load_default()
+
+
+def glyph_layer(size: Tuple[int, int], position, text: str, font, fill):
+    """Text in one RGBA color; coverage goes to alpha so edges do not darken"""
+    mask = Image.new("L", size, 0)
+    ImageDraw.Draw(mask).text(position, text, font=font, fill=fill[3])
+    layer = Image.new("RGBA", size, fill[:3] + (0,))
+    layer.putalpha(mask)
+    return layer
+
+
+def text_mark(text: str, scale: float):
+    """Shadowed text, cropped to its ink"""
+    font = load_font(max(1, round(WATERMARK_FONT_SIZE * scale)))
+    offset = max(1, round(SHADOW_OFFSET * scale))
+    left, top, right, bottom = font.getbbox(text)
+    size = (right - left + offset, bottom - top + offset)
+    shadow = glyph_layer(size, (offset - left, offset - top), text, font,
+                         SHADOW_FILL)
+    return Image.alpha_composite(
+        shadow, glyph_layer(size, (-left, -top), text, font, TEXT_FILL))
+
+
+@functools.lru_cache(maxsize=16)
+def render_mark(text: str, image: str, scale: float, opacity: float):
+    """The logo and text stacked and right-aligned, as one RGBA image"""
+    parts = []
+    if image:
+        with Image.open(image) as logo:
+            logo = logo.convert("RGBA")
+        if scale != 1.0:
+            logo = logo.resize((max(1, round(logo.width * scale)),
+                                max(1, round(logo.height * scale))),
+                               Image.Resampling.LANCZOS)
+        parts.append(logo)
+    if text:
+        parts.append(text_mark(text, scale))
+
+    gap = round(WATERMARK_MARGIN * scale / 2)
+    width = max(part.width for part in parts)
+    height = sum(part.height for part in parts) + gap * (len(parts) - 1)
+    mark = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    top = 0
+    for part in parts:
+        mark.alpha_composite(part, (width - part.width, top))
+        top += part.height + gap
+    if opacity < 1.0:
+        mark.putalpha(mark.getchannel("A").point(
+            lambda value: round(value * max(0.0, opacity))))
+    return mark
+
+
+def diagonal_fit(mark_size, page_size) -> Tuple[float, float]:
+    """Angle of the page's rising diagonal and the scale that stretches a
+    mark along it while its rotated box stays on the page"""
+    mark_width, mark_height = mark_size
+    width, height = page_size
+    angle = math.atan2(height, width)
+    cos, sin = math.cos(angle), math.sin(angle)
+    factor = min(DIAGONAL_SPAN * math.hypot(width, height) / mark_width,
+                 width / (mark_width * cos + mark_height * sin),
+                 height / (mark_width * sin + mark_height * cos))
+    return angle, factor
+
+
+def tile_positions(box_size, page_size):
+    """Corners of a brick pattern of boxes covering the page"""
+    box_width, box_height = box_size
+    width, height = page_size
+    step_x = max(1.0, box_width * TILE_SPACING)
+    step_y = max(1.0, box_height * TILE_SPACING)
+    row, top = 0, -box_height / 2
+    while top < height:
+        left = -box_width / 2 - (step_x / 2 if row % 2 else 0)
+        while left < width:
+            yield left, top
+            left += step_x
+        row, top = row + 1, top + step_y
+
+
+@functools.lru_cache(maxsize=32)
+def page_overlay(spec: WatermarkSpec, page_size: Tuple[int, int], mode: str):
+    """(colors, alpha, positions) to blend onto a page of this size and mode.
+
+    Colors are already in the page's mode, so each placement costs one
+    masked paste over the mark's box; Pillow clips what overhangs.
+    """
+    width, height = page_size
+    mark = render_mark(spec.text, spec.image, spec.scale, spec.opacity)
+    if spec.layout == "Diagonal":
+        # Rendered at its final size so text stays sharp, then turned
+        # along the page's rising diagonal; a tall mark is kept on the page
+        angle, factor = diagonal_fit(mark.size, page_size)
+        mark = render_mark(spec.text, spec.image, spec.scale * factor,
+                           spec.opacity)
+        mark = mark.rotate(math.degrees(angle), Image.Resampling.BICUBIC,
+                           expand=True)
+        positions = [((width - mark.width) // 2, (height - mark.height) // 2)]
+    elif spec.layout == "Tiled":
+        mark = mark.rotate(TILE_ANGLE, Image.Resampling.BICUBIC, expand=True)
+        positions = [(round(left), round(top)) for left, top in
+                     tile_positions(mark.size, page_size)]
+    else:
+        margin = round(WATERMARK_MARGIN * spec.scale)
+        positions = [(width - mark.width - margin, height - mark.height - margin)]
+    return mark.convert(mode), mark.getchannel("A"), positions
+
+
+def apply_watermark(image, spec: Optional[WatermarkSpec]):
+    """Blend the watermark onto the page in place; only its boxes are touched"""
+    if spec is None or spec.vector:
+        return image
+    colors, alpha, positions = page_overlay(spec, image.size, image.mode)
+    for position in positions:
+        image.paste(colors, position, alpha)
+    return image
+
+
+def place(a, b, c, d, e, f) -> bytes:
+    return b"q %s cm /Wm Do Q" % b" ".join(
+        serialize(float(value)) for value in (a, b, c, d, e, f))
+
+
+class VectorWatermark:
+    """The watermark as one Form XObject per PDF file.
+
+    Text is drawn in the file's shared Helvetica, made translucent with
+    an ExtGState; a logo becomes a Flate image with a soft mask. Both are
+    written once and each page only adds a few placement operators, so
+    no page is decoded or re-encoded for it. Sizes are in points,
+    matching the raster mark at 72 DPI.
+    """
+
+    def __init__(self, spec: WatermarkSpec):
+        self.spec = spec
+        self.resources: dict = {}
+        self.size = (0.0, 0.0)
+
+    def write(self, writer) -> "VectorWatermark":
+        """Write the form and its resources to this file"""
+        spec = self.spec
+        opacity = max(0.0, min(1.0, spec.opacity))
+        font_size = WATERMARK_FONT_SIZE
+        offset = SHADOW_OFFSET
+        content, resources = [], {}
+        width = height = 0.0
+
+        if spec.text:
+            descent = HELVETICA_DESCENT * font_size / 1000.0
+            width = text_width(spec.text, font_size) + offset
+            height = (HELVETICA_ASCENT + HELVETICA_DESCENT) * font_size / 1000.0 \
+                + offset
+            resources["Font"] = {"F0": writer.add_standard_font()}
+            resources["ExtGState"] = {
+                "Shadow": writer.add_object({
+                    "Type": PDFName("ExtGState"),
+                    "ca": SHADOW_FILL[3] / 255.0 * opacity}),
+                "Text": writer.add_object({
+                    "Type": PDFName("ExtGState"),
+                    "ca": TEXT_FILL[3] / 255.0 * opacity}),
+            }
+            text = winansi_literal(spec.text)  # Checked by raster_watermark
+            for state, fill, x, y in (("Shadow", SHADOW_FILL, offset, descent),
+                                      ("Text", TEXT_FILL, 0, descent + offset)):
+                color = b" ".join(serialize(channel / 255.0) for channel in fill[:3])
+                content.append(b"q /%s gs %s rg BT /F0 %s Tf %s %s Td %s Tj ET Q" % (
+                    state.encode("ascii"), color, serialize(float(font_size)),
+                    serialize(float(x)), serialize(float(y)), text))
+
+        if spec.image:
+            with Image.open(spec.image) as logo:
+                logo = logo.convert("RGBA")
+            image = encode_flate(logo.convert("RGB"))
+            image.extra["SMask"] = encode_flate(logo.getchannel("A"))
+            resources.setdefault("XObject", {})["Logo"] = writer.add_image(image)
+            resources.setdefault("ExtGState", {})["Logo"] = writer.add_object({
+                "Type": PDFName("ExtGState"), "ca": opacity})
+            # Stacked above the text, right-aligned, as in the raster mark
+            bottom = height + WATERMARK_MARGIN / 2 if spec.text else 0.0
+            logo_width, logo_height = float(logo.width), float(logo.height)
+            content.append(b"q /Logo gs %s 0 0 %s %s %s cm /Logo Do Q" % (
+                serialize(logo_width), serialize(logo_height),
+                serialize(max(0.0, width - logo_width)), serialize(bottom)))
+            width = max(width, logo_width)
+            height = bottom + logo_height
+
+        self.size = (width, height)
+        form = writer.add_form((0, 0, width, height), b"\n".join(content),
+                               resources)
+        self.resources = {"XObject": {"Wm": form}}
+        return self
+
+    def overlay(self, page_width: float, page_height: float):
+        """(content, resources) placing the form on a page of this size"""
+        width, height = self.size
+        layout = self.spec.layout
+        if layout == "Diagonal":
+            angle, factor = diagonal_fit(self.size, (page_width, page_height))
+            cos, sin = math.cos(angle) * factor, math.sin(angle) * factor
+            # Form centre onto the page centre
+            e = page_width / 2 - (cos * width - sin * height) / 2
+            f = page_height / 2 - (sin * width + cos * height) / 2
+            content = place(cos, sin, -sin, cos, e, f)
+        elif layout == "Tiled":
+            angle = math.radians(TILE_ANGLE)
+            cos, sin = math.cos(angle), math.sin(angle)
+            box = (width * cos + height * sin, width * sin + height * cos)
+            placements = []
+            for left, bottom in tile_positions(box, (page_width, page_height)):
+                # Form origin so its rotated box has this lower-left corner
+                placements.append(place(cos, sin, -sin, cos,
+                                        left + height * sin, bottom))
+            content = b"\n".join(placements)
+        else:
+            margin = WATERMARK_MARGIN
+            content = place(1, 0, 0, 1, page_width - width - margin, margin)
+        return content, self.resources
@@ -0,0 +1,48 @@
+"""
+Shared fixtures for the Image to PDF Converter tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def save(tmp_path):
+    """Save an image under tmp_path and return its path"""
+    def save(img, name, **params):
+        path = str(tmp_path / name)
+        img.save(path, **params)
+        return path
+    return save
+
+
+@pytest.fixture
+def export():
+    """Run an export in-process unless the test asks for isolation"""
+    from Module.PDFExport import ExportOptions, PDFExporter
+
+    def export(paths, pdf_path, **options):
+        options.setdefault("isolate_decoding", False)
+        return PDFExporter(ExportOptions(**options)).export(paths, pdf_path)
+    return export
+
+
+@pytest.fixture
+def photos(save):
+    """Five small, different JPEG photos"""
+    from images import photo
+    return [save(photo((400, 300), seed), f"photo{seed}.jpg", quality=90)
+            for seed in range(5)]
+
+
+@pytest.fixture
+def garbage(tmp_path):
+    """A file with a PNG signature and nothing decodable after it"""
+    path = str(tmp_path / "garbage.png")
+    with open(path, "wb") as stream:
+        stream.write(b"\x89PNG\r\n\x1a\nnot really")
+    return path
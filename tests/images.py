@@ -0,0 +1,81 @@
+"""
+Test images for the Image to PDF Converter tests
+Small generated pages, so the suite needs no sample files
+"""
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+def photo(size=(640, 480), seed=0):
+    """Colourful image with smooth gradients and sensor-like noise"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    x = np.linspace(0, 1, width)[None, :]
+    y = np.linspace(0, 1, height)[:, None]
+    channels = [255 * x * np.ones_like(y), 255 * y * np.ones_like(x),
+                255 * (1 - x * y)]
+    pixels = np.stack(channels, axis=-1) + rng.normal(0, 12, (height, width, 3))
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), "RGB")
+
+
+def gray_photo(size=(640, 480), seed=0):
+    return photo(size, seed).convert("L")
+
+
+def text_page(size=(850, 1100), mode="L", anti_alias=False):
+    """White page with black word-like strokes, like a clean fax scan"""
+    page = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(page)
+    for top in range(60, size[1] - 60, 28):
+        for left in range(60, size[0] - 80, 46):
+            draw.rectangle((left, top, left + 30, top + 12), fill=0)
+            draw.rectangle((left + 4, top + 4, left + 26, top + 8), fill=255)
+    if anti_alias:
+        page = page.resize((size[0] // 2, size[1] // 2),
+                           Image.Resampling.LANCZOS).resize(size)
+    return page.convert(mode)
+
+
+def screenshot(size=(800, 600)):
+    """Flat-colour UI: title bar, panels, buttons and text-like strokes"""
+    page = Image.new("RGB", size, (240, 240, 240))
+    draw = ImageDraw.Draw(page)
+    draw.rectangle((0, 0, size[0], 40), fill=(40, 90, 160))
+    draw.rectangle((20, 60, 260, size[1] - 20), fill=(255, 255, 255),
+                   outline=(180, 180, 180))
+    for top in range(80, size[1] - 60, 30):
+        draw.rectangle((40, top, 200, top + 10), fill=(60, 60, 60))
+    for left in range(300, size[0] - 120, 130):
+        draw.rounded_rectangle((left, 80, left + 110, 120), 8,
+                               fill=(220, 80, 60))
+    return page
+
+
+def magazine_page(size=(900, 1200)):
+    """Colour scan: tinted paper, a photo and dark blue and red text"""
+    page = Image.new("RGB", size, (246, 240, 225))
+    page.paste(photo((size[0] - 160, size[1] // 3)), (80, 80))
+    draw = ImageDraw.Draw(page)
+    for number, top in enumerate(range(size[1] // 3 + 140, size[1] - 80, 26)):
+        ink = (150, 20, 20) if number % 5 == 0 else (20, 30, 90)
+        for left in range(80, size[0] - 120, 52):
+            draw.rectangle((left, top, left + 36, top + 12), fill=ink)
+            draw.rectangle((left + 4, top + 4, left + 32, top + 8),
+                           fill=(246, 240, 225))
+    return page
+
+
+def noisy_scan(size=(850, 1100), paper=(232, 226, 205), seed=0):
+    """Text page on off-white paper with scanner noise"""
+    rng = np.random.default_rng(seed)
+    page = np.asarray(text_page(size), dtype=np.float32)[..., None] / 255.0
+    tinted = page * np.array(paper, dtype=np.float32)
+    pixels = tinted + rng.normal(0, 3, tinted.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), "RGB")
+
+
+def numbered_frames(count, size=(120, 90)):
+    """Frames whose grey level encodes their number"""
+    return [Image.new("L", size, 20 + number * 200 // max(1, count - 1))
+            for number in range(count)]
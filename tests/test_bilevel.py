@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageChops
+
+from Module.ImageAnalysis import adaptive_threshold, classify_page
+from Module.PDFEncoders import encode_ccitt_g4
+
+from images import text_page
+
+pikepdf = pytest.importorskip("pikepdf")
+
+
+def shaded(page):
+    """The page under lighting that fades to grey towards the right"""
+    light = np.linspace(1.0, 0.4, page.width)[None, :]
+    pixels = np.asarray(page.convert("L"), dtype=np.float32) * light
+    return Image.fromarray(pixels.astype(np.uint8), "L")
+
+
+def test_g4_stream_parameters():
+    page = text_page((300, 200), mode="1")
+    image = encode_ccitt_g4(page)
+    assert image.filter_name == "CCITTFaxDecode" and image.bits == 1
+    assert image.decode_parms["K"] == -1
+    assert (image.decode_parms["Columns"], image.decode_parms["Rows"]) == \
+        (300, 200)
+    assert len(image.data) < 300 * 200 // 8 // 4
+
+
+def test_g4_page_decodes_to_the_same_pixels(save, export, tmp_path):
+    page = text_page((640, 480), mode="1")
+    path = str(tmp_path / "fax.pdf")
+    export([save(page, "fax.png")], path, encoder="G4",
+           fit_mode="Original Size")
+    with pikepdf.open(path) as pdf:
+        stream = pdf.pages[0].Resources.XObject.Im0
+        assert stream.Filter == "/CCITTFaxDecode"
+        decoded = pikepdf.PdfImage(stream).as_pil_image().convert("1")
+    assert not ImageChops.logical_xor(decoded, page).getbbox()
+
+
+def test_adaptive_threshold_ignores_uneven_lighting():
+    page = text_page((640, 480))
+    original = np.asarray(page.convert("1"))
+    dim = shaded(page)
+    # A global threshold turns the dim side black; the local one does not
+    fixed = np.asarray(dim.point(lambda value: 255 if value >= 128 else 0, "1"))
+    assert np.count_nonzero(fixed != original) > 0.1 * original.size
+    local = np.asarray(adaptive_threshold(dim))
+    assert np.count_nonzero(local != original) < 0.01 * original.size
+
+
+def test_auto_picks_g4_for_text_scans():
+    assert classify_page(text_page()) == "g4"
+    assert classify_page(text_page(mode="1")) == "g4"
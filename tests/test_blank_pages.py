@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from Module.PageCleanup import is_blank_page
+
+from images import noisy_scan, photo
+
+pikepdf = pytest.importorskip("pikepdf")
+
+
+def empty_sheet(size=(1700, 2200), paper=(236, 232, 220), seed=0):
+    """Scanned blank sheet: tinted paper with noise and faint show-through"""
+    rng = np.random.default_rng(seed)
+    pixels = np.empty((size[1], size[0], 3), dtype=np.float32)
+    pixels[:] = paper
+    pixels[600:640, 200:1500] -= 12  # Text on the back, seen through
+    pixels += rng.normal(0, 4, pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), "RGB")
+
+
+def one_line(size=(1700, 2200)):
+    """A nearly empty page that still carries a short line of print"""
+    page = empty_sheet(size)
+    ImageDraw.Draw(page).rectangle((200, 300, 500, 318), fill=(30, 30, 30))
+    return page
+
+
+def test_blank_sheets_are_detected(save):
+    assert is_blank_page(save(empty_sheet(), "blank.jpg", quality=85))
+    assert is_blank_page(save(empty_sheet(paper=(200, 220, 250)), "blue.png"))
+    assert is_blank_page(save(Image.new("L", (300, 300), 255), "white.png"))
+
+
+def test_pages_with_content_are_kept(save):
+    assert not is_blank_page(save(one_line(), "line.jpg", quality=85))
+    assert not is_blank_page(save(noisy_scan(), "scan.png"))
+    assert not is_blank_page(save(photo(), "photo.jpg"))
+
+
+def test_blank_frame_of_a_multi_frame_file(save):
+    frames = [one_line((400, 500)).convert("L"),
+              empty_sheet((400, 500)).convert("L")]
+    path = save(frames[0], "batch.tif", save_all=True,
+                append_images=frames[1:])
+    assert not is_blank_page(path, 0)
+    assert is_blank_page(path, 1)
+
+
+def test_export_skips_blank_pages(save, export, tmp_path):
+    pages = [save(noisy_scan(), "scan.png"),
+             save(empty_sheet(), "blank.jpg", quality=85),
+             save(one_line(), "line.jpg", quality=85)]
+    path = str(tmp_path / "batch.pdf")
+    result = export(pages, path, skip_blank_pages=True)
+    assert [source.path for source in result.skipped] == [pages[1]]
+    with pikepdf.open(path) as pdf:
+        assert len(pdf.pages) == 2
+    everything = export(pages, str(tmp_path / "all.pdf"))
+    assert not everything.skipped and everything.page_count == 3
+
+
+def test_only_blank_pages_is_an_error(save, export, tmp_path):
+    blank = save(empty_sheet(), "blank.jpg", quality=85)
+    with pytest.raises(ValueError, match="blank"):
+        export([blank], str(tmp_path / "none.pdf"), skip_blank_pages=True)
@@ -0,0 +1,73 @@
+import pytest
+from PIL import Image, ImageCms
+
+from Module.ColorManagement import (attach_profile, source_profile,
+                                    srgb_transform, to_srgb)
+from Module.PDFEncoders import encode_jpeg
+
+from images import photo
+
+pikepdf = pytest.importorskip("pikepdf")
+
+SRGB = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+
+
+def tagged(img, profile=SRGB):
+    img.info["icc_profile"] = profile
+    return img
+
+
+def test_profile_must_match_the_pixels():
+    profile = source_profile(tagged(photo((32, 32))))
+    assert profile.components == 3 and profile.data == SRGB
+    assert source_profile(tagged(photo((32, 32)).convert("L"))) is None
+    assert source_profile(tagged(photo((32, 32)), SRGB[:10])) is None
+    assert source_profile(photo((32, 32))) is None
+
+
+def test_transforms_are_cached_and_srgb_is_a_copy():
+    profile = source_profile(tagged(photo((32, 32))))
+    assert srgb_transform(profile, "RGB") is None  # Nothing to convert
+    page = photo((64, 48))
+    assert to_srgb(page, profile).tobytes() == page.tobytes()
+
+
+def test_broken_profile_falls_back_to_plain_conversion():
+    broken = SRGB[:16] + b"RGB " + b"\x00" * 200
+    page = tagged(photo((64, 48)), broken)
+    profile = source_profile(page)
+    assert srgb_transform(profile, "RGB") is None
+    assert srgb_transform(profile, "RGB") is None  # Remembered, not retried
+    assert to_srgb(page, profile).tobytes() == page.tobytes()
+
+
+def test_attach_profile_tags_matching_layers():
+    profile = source_profile(tagged(photo((32, 32))))
+    rgb = encode_jpeg(photo((32, 32)), 80)
+    gray = encode_jpeg(photo((32, 32)).convert("L"), 80)
+    attach_profile([rgb, gray], profile)
+    assert rgb.color_space is profile and gray.color_space == "DeviceGray"
+
+
+def test_embedded_profile_is_written_once(save, export, tmp_path):
+    pages = [save(photo((200, 150), seed), f"p{seed}.jpg", icc_profile=SRGB)
+             for seed in range(3)]
+    path = str(tmp_path / "icc.pdf")
+    export(pages, path, color_management="Embed ICC", encoder="JPEG")
+    with pikepdf.open(path) as pdf:
+        spaces = [page.Resources.XObject.Im0.ColorSpace for page in pdf.pages]
+        assert all(space[0] == "/ICCBased" for space in spaces)
+        assert len({space[1].objgen for space in spaces}) == 1
+        assert spaces[0][1].N == 3 and spaces[0][1].read_bytes() == SRGB
+
+
+def test_cmyk_is_converted_to_rgb(save, export, tmp_path):
+    cmyk = Image.new("CMYK", (200, 150), (0, 255, 255, 0))  # Process red
+    path = str(tmp_path / "cmyk.pdf")
+    export([save(cmyk, "red.jpg", quality=95)], path, encoder="JPEG")
+    with pikepdf.open(path) as pdf:
+        stream = pdf.pages[0].Resources.XObject.Im0
+        assert stream.ColorSpace == "/DeviceRGB"
+        shown = pikepdf.PdfImage(stream).as_pil_image().convert("RGB")
+    red, green, blue = shown.getpixel((100, 75))
+    assert red > 200 and green < 60 and blue < 60
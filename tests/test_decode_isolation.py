@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from Module.DecodeIsolation import DecodeError, DecodePool
+from Module.PDFExport import ExportOptions, PDFExporter, SourcePage, decode_source
+
+from images import numbered_frames, photo
+
+DECODE_ARGS = ("RGB", False, None, None, "Flatten", "#FFFFFF")
+
+
+def test_pool_decodes_and_survives_bad_files(save, garbage):
+    good = save(photo((120, 90)), "good.png")
+    with DecodePool(1, timeout=30) as pool:
+        img = pool.run(decode_source, SourcePage(good), *DECODE_ARGS)
+        assert img.size == (120, 90) and img.mode == "RGB"
+        with pytest.raises(DecodeError):
+            pool.run(decode_source, SourcePage(garbage), *DECODE_ARGS)
+        # The failed worker was replaced; the next job still runs
+        again = pool.run(decode_source, SourcePage(good), *DECODE_ARGS)
+        assert again.tobytes() == img.tobytes()
+
+
+def test_closed_pool_refuses_work(save):
+    pool = DecodePool(1)
+    pool.close()
+    with pytest.raises(DecodeError):
+        pool.run(decode_source, SourcePage(save(photo((8, 8)), "x.png")),
+                 *DECODE_ARGS)
+
+
+def test_bad_page_fails_alone(save, garbage, tmp_path):
+    good = save(photo((120, 90)), "good.jpg")
+    path = str(tmp_path / "mixed.pdf")
+    result = PDFExporter(ExportOptions(max_workers=1)).export(
+        [good, garbage, good], path)
+    assert result.page_count == 2
+    assert [failure.index for failure in result.failed] == [1]
+    assert result.outputs == [path]
+
+
+def test_no_decodable_page_leaves_no_output(garbage, tmp_path):
+    path = str(tmp_path / "bad.pdf")
+    with pytest.raises(ValueError, match="could be decoded"):
+        PDFExporter(ExportOptions(max_workers=1)).export([garbage], path)
+    assert sorted(os.listdir(tmp_path)) == ["garbage.png"]
+
+
+def test_frames_of_a_file_stay_with_one_worker(save):
+    frames = numbered_frames(6)
+    path = save(frames[0], "anim.tif", save_all=True, append_images=frames[1:])
+    other = save(photo((40, 30)), "other.png")
+    with DecodePool(2, timeout=30) as pool:
+        pool.run(decode_source, SourcePage(other), *DECODE_ARGS,
+                 affinity=other)
+        levels = []
+        for frame in range(6):
+            img = pool.run(decode_source, SourcePage(path, frame, 6),
+                           *DECODE_ARGS, affinity=path)
+            levels.append(img.getpixel((5, 5))[0])
+            owner = [worker for worker in pool.idle
+                     if worker.affinity == path]
+            assert len(owner) == 1
+            if frame == 0:
+                first = owner[0]
+            assert owner[0] is first
+    assert levels == [frame.getpixel((5, 5)) for frame in frames]
+
+
+def test_isolated_multi_frame_export_matches(save, export, tmp_path):
+    pikepdf = pytest.importorskip("pikepdf")
+    frames = numbered_frames(5)
+    path = save(frames[0], "anim.gif", save_all=True, append_images=frames[1:])
+    pages = []
+    for isolate in (False, True):
+        pdf_path = str(tmp_path / f"isolated-{isolate}.pdf")
+        export([path], pdf_path, isolate_decoding=isolate, max_workers=2)
+        with pikepdf.open(pdf_path) as pdf:
+            pages.append([pikepdf.PdfImage(page.Resources.XObject.Im0)
+                          .as_pil_image().convert("L").tobytes()
+                          for page in pdf.pages])
+    assert len(pages[1]) == 5 and pages[0] == pages[1]
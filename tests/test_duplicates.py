@@ -0,0 +1,37 @@
+import os
+import shutil
+
+import pytest
+
+from Module.PDFExport import SourcePage, mark_duplicates
+
+TESTDATA = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "Testdata")
+
+
+@pytest.fixture
+def first_and_copy(tmp_path):
+    first = os.path.join(TESTDATA, "img3.jpg")
+    copy = str(tmp_path / "copy.jpg")
+    shutil.copyfile(first, copy)
+    return first, copy
+
+
+def test_duplicate_files_share_content_key(first_and_copy):
+    first, copy = first_and_copy
+    sources = [SourcePage(first), SourcePage(os.path.join(TESTDATA, "img1.jpg")),
+               SourcePage(copy), SourcePage(first)]
+    assert mark_duplicates(sources) == 2
+    keys = [source.content_key for source in sources]
+    assert keys[0] and keys[0] == keys[2] == keys[3]
+    assert not keys[1]
+
+
+def test_duplicates_share_one_image_object(first_and_copy, export, tmp_path):
+    pikepdf = pytest.importorskip("pikepdf")
+    path = str(tmp_path / "dupes.pdf")
+    export(list(first_and_copy) * 2, path)
+    with pikepdf.open(path) as pdf:
+        assert len(pdf.pages) == 4
+        images = {page.Resources.XObject.Im0.objgen for page in pdf.pages}
+    assert len(images) == 1
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from Module.FanOutExport import FanOutExporter, OutputProfile
+from Module.PDFExport import ExportOptions
+
+pikepdf = pytest.importorskip("pikepdf")
+
+
+def profiles(tmp_path, **shared):
+    shared.setdefault("isolate_decoding", False)
+    return [OutputProfile(str(tmp_path / "print.pdf"),
+                          ExportOptions(dpi=150, page_size="A4", **shared)),
+            OutputProfile(str(tmp_path / "email.pdf"),
+                          ExportOptions(dpi=72, page_size="A5", quality=60,
+                                        **shared))]
+
+
+def test_every_profile_gets_its_own_result(photos, tmp_path):
+    results = FanOutExporter(profiles(tmp_path)).export(photos)
+    assert [result.outputs for result in results] == \
+        [[str(tmp_path / "print.pdf")], [str(tmp_path / "email.pdf")]]
+    widths = []
+    for result in results:
+        assert result.page_count == 5 and not result.failed
+        with pikepdf.open(result.outputs[0]) as pdf:
+            assert len(pdf.pages) == 5
+            image = pdf.pages[0].Resources.XObject.Im0
+            widths.append(int(image.Width))
+    # The email copy is fitted into A5 less its margins
+    assert widths == [400, 420 - 2 * 50]
+
+
+def test_failures_are_reported_per_profile(photos, garbage, tmp_path):
+    results = FanOutExporter(profiles(tmp_path, isolate_decoding=True,
+                                      max_workers=1)).export(
+        [photos[0], garbage, photos[1]])
+    for result in results:
+        assert result.page_count == 2
+        assert [failure.index for failure in result.failed] == [1]
+
+
+def test_no_decodable_page_leaves_no_output(garbage, tmp_path):
+    with pytest.raises(ValueError, match="could be decoded"):
+        FanOutExporter(profiles(tmp_path, isolate_decoding=True,
+                                max_workers=1)).export([garbage])
+    assert sorted(os.listdir(tmp_path)) == ["garbage.png"]
+
+
+def test_profiles_must_share_decoding_options(tmp_path):
+    mixed = [OutputProfile(str(tmp_path / "a.pdf"), ExportOptions()),
+             OutputProfile(str(tmp_path / "b.pdf"),
+                           ExportOptions(color_mode="Grayscale"))]
+    with pytest.raises(ValueError, match="color_mode"):
+        FanOutExporter(mixed)
@@ -0,0 +1,64 @@
+import pytest
+from Module.PDFExport import (FrameReader, SourcePage, expand_frames,
+                              parse_frame_range)
+
+from images import numbered_frames, text_page
+
+pikepdf = pytest.importorskip("pikepdf")
+
+
+def page_levels(path):
+    with pikepdf.open(path) as pdf:
+        return [pikepdf.PdfImage(page.Resources.XObject.Im0).as_pil_image()
+                .convert("L").getpixel((5, 5)) for page in pdf.pages]
+
+
+def test_parse_frame_range():
+    assert parse_frame_range("", 4) == [0, 1, 2, 3]
+    assert parse_frame_range("1-2, 4", 5) == [0, 1, 3]
+    assert parse_frame_range("3-", 5) == [2, 3, 4]
+    assert parse_frame_range("-2,9", 5) == [0, 1]
+    with pytest.raises(ValueError):
+        parse_frame_range("a-b", 5)
+
+
+def test_multi_frame_files_expand_to_pages(save):
+    frames = [text_page((200, 260), mode="1") for _ in range(3)]
+    tiff = save(frames[0], "fax.tif", save_all=True, append_images=frames[1:],
+                compression="group4")
+    single = save(frames[0], "one.png")
+    pages = expand_frames([single, tiff])
+    assert [(page.path, page.frame) for page in pages] == \
+        [(single, 0), (tiff, 0), (tiff, 1), (tiff, 2)]
+    assert pages[2].label == "fax.tif [2/3]"
+    assert [page.frame for page in expand_frames([tiff], "2-")] == [1, 2]
+
+
+def test_frame_reader_only_moves_forward(save):
+    frames = numbered_frames(4)
+    path = save(frames[0], "anim.gif", save_all=True, append_images=frames[1:])
+    with FrameReader() as reader:
+        first = reader.read(SourcePage(path, 0, 4))
+        assert reader.read(SourcePage(path, 2, 4)) is first  # Seeks forward
+        again = reader.read(SourcePage(path, 1, 4))
+        assert again is not first and again.tell() == 1  # Reopened to go back
+
+
+@pytest.mark.parametrize("name, params", [
+    ("anim.gif", {}),
+    ("stack.tif", {"compression": "tiff_lzw"}),
+])
+def test_every_frame_becomes_a_page_in_order(name, params, save, export,
+                                              tmp_path):
+    frames = numbered_frames(6)
+    source = save(frames[0], name, save_all=True, append_images=frames[1:],
+                  **params)
+    path = str(tmp_path / "frames.pdf")
+    export([source], path, fit_mode="Original Size")
+    levels = page_levels(path)
+    assert len(levels) == 6
+    for got, frame in zip(levels, frames):
+        assert abs(got - frame.getpixel((0, 0))) <= 2
+    path = str(tmp_path / "some.pdf")
+    export([source], path, fit_mode="Original Size", frame_range="2,5-6")
+    assert len(page_levels(path)) == 3
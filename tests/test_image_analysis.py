@@ -0,0 +1,97 @@
+import pytest
+from PIL import Image
+
+from Module.ImageAnalysis import (classify_page, colorfulness, is_grayscale,
+                                  two_level_fraction)
+
+from images import gray_photo, photo, screenshot, text_page
+
+pikepdf = pytest.importorskip("pikepdf")
+
+
+def tinted(img, shift=2):
+    """Gray pixels with a faint colour cast, like a scanned B&W print"""
+    red, green, blue = img.convert("RGB").split()
+    return Image.merge("RGB", (red.point(lambda v: min(255, v + shift)),
+                               green, blue))
+
+
+def color_spaces(path):
+    with pikepdf.open(path) as pdf:
+        return [str(page.Resources.XObject.Im0.ColorSpace)
+                for page in pdf.pages]
+
+
+def test_colorfulness():
+    assert colorfulness(gray_photo()) == 0.0
+    assert colorfulness(tinted(gray_photo())) < 5.0
+    assert colorfulness(photo()) > 20.0
+
+
+def test_is_grayscale_follows_threshold():
+    page = tinted(gray_photo())
+    assert is_grayscale(page, 5.0)
+    assert not is_grayscale(page, 0.0)
+    assert not is_grayscale(photo(), 5.0)
+    assert is_grayscale(gray_photo(), 0.0)  # Gray modes need no statistics
+
+
+def test_near_gray_pages_are_written_as_device_gray(save, export, tmp_path):
+    pages = [save(tinted(gray_photo()), "gray.jpg", quality=95),
+             save(photo(), "color.jpg", quality=95)]
+    path = str(tmp_path / "auto.pdf")
+    export(pages, path)
+    assert color_spaces(path) == ["/DeviceGray", "/DeviceRGB"]
+
+
+def test_color_modes_and_threshold(save, export, tmp_path):
+    page = save(tinted(gray_photo()), "gray.jpg", quality=95)
+    for name, options, expected in [
+            ("color.pdf", {"color_mode": "Color"}, "/DeviceRGB"),
+            ("strict.pdf", {"grayscale_threshold": 0.0}, "/DeviceRGB"),
+            ("forced.pdf", {"color_mode": "Grayscale"}, "/DeviceGray")]:
+        path = str(tmp_path / name)
+        export([page], path, encoder="JPEG", **options)
+        assert color_spaces(path) == [expected], name
+
+
+@pytest.mark.parametrize("page, encoder", [
+    (photo(), "jpeg"),
+    (gray_photo(), "gray"),
+    (gray_photo().convert("RGB"), "gray"),
+    (screenshot(), "indexed"),
+    (text_page(), "g4"),
+    (text_page(mode="RGB"), "g4"),
+])
+def test_classify_page(page, encoder):
+    assert classify_page(page) == encoder
+
+
+def test_color_mode_overrides_gray_detection():
+    # Colour output never drops to one bit; grayscale output never to indexed
+    assert classify_page(text_page(mode="RGB"), color_mode="Color") != "g4"
+    assert classify_page(photo(), color_mode="Grayscale") == "gray"
+
+
+def test_anti_aliased_text_is_not_g4():
+    # Thresholding would lose the grey edge pixels
+    page = text_page(anti_alias=True)
+    assert two_level_fraction(page) < 0.995
+    assert classify_page(page) != "g4"
+    assert classify_page(page.convert("LA")) != "g4"
+
+
+def test_two_level_fraction():
+    assert two_level_fraction(text_page()) == 1.0
+    assert two_level_fraction(Image.new("L", (64, 64), 128)) < 0.5
+
+
+def test_auto_mixes_encoders_per_page(save, export, tmp_path):
+    pages = [save(photo(), "photo.jpg", quality=95),
+             save(screenshot(), "ui.png"),
+             save(text_page(), "scan.png")]
+    path = str(tmp_path / "mixed.pdf")
+    # Kept at full size: a resampled scan gains grey edges and is not G4
+    result = export(pages, path, fit_mode="Original Size")
+    assert [report.encoder for report in result.pages] == \
+        ["jpeg", "indexed", "g4"]
@@ -0,0 +1,39 @@
+import pytest
+from PIL import Image, ImageChops
+
+from Module.ImageAnalysis import classify_page
+from Module.PDFEncoders import encode_indexed, encode_jpeg
+
+from images import photo, screenshot
+
+pikepdf = pytest.importorskip("pikepdf")
+
+
+def test_bit_depth_follows_palette_size():
+    two = Image.new("RGB", (64, 64), "white")
+    two.paste((0, 0, 0), (0, 0, 32, 64))
+    assert encode_indexed(two).bits == 1
+    assert encode_indexed(screenshot()).bits <= 4
+    assert encode_indexed(photo()).bits == 8
+
+
+def test_screenshot_is_smaller_than_jpeg():
+    page = screenshot()
+    assert len(encode_indexed(page).data) < len(encode_jpeg(page, 95).data) / 4
+
+
+def test_auto_writes_screenshots_losslessly(save, export, tmp_path):
+    page = screenshot()
+    assert classify_page(page) == "indexed"
+    path = str(tmp_path / "ui.pdf")
+    export([save(page, "ui.png")], path, fit_mode="Original Size")
+    with pikepdf.open(path) as pdf:
+        stream = pdf.pages[0].Resources.XObject.Im0
+        assert stream.Filter == "/FlateDecode"
+        assert stream.ColorSpace[0] == "/Indexed"
+        decoded = pikepdf.PdfImage(stream).as_pil_image().convert("RGB")
+    assert not ImageChops.difference(decoded, page).getbbox()
+
+
+def test_photos_are_not_indexed():
+    assert classify_page(photo()) == "jpeg"
@@ -0,0 +1,40 @@
+import pytest
+
+from Module.PDFLinearizer import linearize_pdf
+from Module.PDFWriter import PDFWriter
+
+pikepdf = pytest.importorskip("pikepdf")
+
+
+def test_linearized_export_passes_check(photos, export, tmp_path):
+    path = str(tmp_path / "web.pdf")
+    export(photos, path, linearize=True)
+    with pikepdf.open(path) as pdf:
+        assert pdf.is_linearized
+        assert pdf.check_linearization()
+        assert len(pdf.pages) == len(photos)
+
+
+def test_linearized_copy_keeps_pages(photos, export, tmp_path):
+    plain = str(tmp_path / "plain.pdf")
+    export(photos, plain)
+    web = str(tmp_path / "web.pdf")
+    linearize_pdf(plain, web)
+    with pikepdf.open(plain) as original, pikepdf.open(web) as copy:
+        assert not original.is_linearized and copy.check_linearization()
+        assert [page.mediabox for page in copy.pages] == \
+            [page.mediabox for page in original.pages]
+        assert [page.Resources.XObject.Im0.read_raw_bytes()
+                for page in copy.pages] == \
+            [page.Resources.XObject.Im0.read_raw_bytes()
+             for page in original.pages]
+
+
+def test_single_page_file(tmp_path):
+    plain = str(tmp_path / "blank.pdf")
+    with PDFWriter(plain) as writer:
+        writer.add_page(200, 100, b"", {})
+    web = str(tmp_path / "web.pdf")
+    linearize_pdf(plain, web)
+    with pikepdf.open(web) as pdf:
+        assert pdf.check_linearization() and len(pdf.pages) == 1
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from Module.ImageAnalysis import split_mrc_layers
+from Module.PDFEncoders import (MRC_BACKGROUND_QUALITY, MRC_FOREGROUND_QUALITY,
+                                encode_jpeg, encode_mrc)
+
+from images import magazine_page
+
+pikepdf = pytest.importorskip("pikepdf")
+
+
+def test_layers_separate_text_from_background():
+    page = magazine_page()
+    mask, background, foreground = split_mrc_layers(page)
+    assert mask.mode == "1" and mask.size == page.size
+    assert background.width < page.width and foreground.width < background.width
+    black = np.asarray(mask) == 0
+    # Strokes are in the mask, the paper and the photo are not
+    assert black[page.height // 3 + 145, 82]
+    assert not black[page.height // 3 + 150, 120]
+    # (a dark photo edge against light paper may be; its inside is not)
+    assert black[110:50 + page.height // 3, 110:page.width - 110].mean() < 0.01
+    # The background has the text painted out with paper colour
+    paper = np.asarray(background)[-20:, :].reshape(-1, 3).mean(axis=0)
+    assert np.abs(paper - (246, 240, 225)).max() < 12
+
+
+def test_ink_layer_is_masked_by_g4_stencil():
+    base, ink = encode_mrc(*split_mrc_layers(magazine_page()), quality=95)
+    assert base.filter_name == ink.filter_name == "DCTDecode"
+    stencil = ink.extra["Mask"]
+    assert stencil.filter_name == "CCITTFaxDecode"
+    assert stencil.extra["ImageMask"] is True and stencil.color_space is None
+    assert MRC_BACKGROUND_QUALITY <= 95 and MRC_FOREGROUND_QUALITY <= 95
+
+
+def test_mrc_page_is_smaller_and_looks_the_same(save, export, tmp_path):
+    fitz = pytest.importorskip("pymupdf")
+    page = magazine_page()
+    path = str(tmp_path / "mrc.pdf")
+    export([save(page, "scan.png")], path, encoder="MRC",
+           fit_mode="Original Size")
+    with pikepdf.open(path) as pdf:
+        xobjects = pdf.pages[0].Resources.XObject
+        assert len(xobjects) == 2 and "/Mask" in xobjects.Im1
+    size = sum(len(layer.data) for layer in encode_mrc(
+        *split_mrc_layers(page), quality=95))
+    assert size < len(encode_jpeg(page, 95).data) / 2
+
+    with fitz.open(path) as pdf:
+        pixmap = pdf[0].get_pixmap()
+    shown = np.asarray(Image.frombytes("RGB", (pixmap.width, pixmap.height),
+                                       pixmap.samples), dtype=np.int16)
+    assert np.abs(shown - np.asarray(page, dtype=np.int16)).mean() < 8
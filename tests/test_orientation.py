@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageOps
+
+from Module.PDFWriter import placement_matrix
+
+pikepdf = pytest.importorskip("pikepdf")
+fitz = pytest.importorskip("pymupdf")
+
+QUADRANTS = [(220, 30, 30), (30, 160, 30), (30, 30, 220), (240, 240, 240)]
+
+
+def quadrant_image(size=(320, 160)):
+    """Distinct colour in each quadrant, so every orientation looks different"""
+    img = Image.new("RGB", size)
+    width, height = size[0] // 2, size[1] // 2
+    for number, colour in enumerate(QUADRANTS):
+        left, top = (number % 2) * width, (number // 2) * height
+        img.paste(colour, (left, top, left + width, top + height))
+    return img
+
+
+def rendered(path):
+    with fitz.open(path) as pdf:
+        pixmap = pdf[0].get_pixmap()
+    return Image.frombytes("RGB", (pixmap.width, pixmap.height),
+                           pixmap.samples)
+
+
+def quadrant_colours(img):
+    pixels = np.asarray(img, dtype=np.int16)
+    height, width = pixels.shape[:2]
+    return [pixels[height // 4 + (n // 2) * height // 2,
+                   width // 4 + (n % 2) * width // 2] for n in range(4)]
+
+
+def test_placement_matrix():
+    assert placement_matrix(100, 200) == (100, 0, 0, 200, 0, 0)
+    # Turned 90 degrees clockwise: stored columns become displayed rows
+    assert placement_matrix(100, 200, 6) == (0, -200, 100, 0, 0, 200)
+    assert placement_matrix(100, 200, 99) == placement_matrix(100, 200)
+
+
+@pytest.mark.parametrize("passthrough", [True, False])
+@pytest.mark.parametrize("orientation", range(1, 9))
+def test_pages_show_the_upright_image(orientation, passthrough, save, export,
+                                      tmp_path):
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    source = save(quadrant_image(), "turned.jpg", exif=exif, quality=95)
+    path = str(tmp_path / "turned.pdf")
+    export([source], path, fit_mode="Original Size",
+           jpeg_passthrough=passthrough, encoder="JPEG")
+    with Image.open(source) as img:
+        upright = ImageOps.exif_transpose(img)
+    with pikepdf.open(path) as pdf:
+        page = pdf.pages[0]
+        assert "/Rotate" not in page.obj
+        stored = page.Resources.XObject.Im0
+        if passthrough:  # Pixels untouched, the matrix does the turning
+            assert (int(stored.Width), int(stored.Height)) == (320, 160)
+    shown = rendered(path)
+    assert shown.size == upright.size
+    for got, expected in zip(quadrant_colours(shown), quadrant_colours(upright)):
+        assert np.abs(got - expected).max() < 40
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from Module.PageCleanup import (crop_uniform_borders, estimate_paper,
+                                find_crop_box, whiten_background)
+
+from images import noisy_scan, photo, text_page
+
+pikepdf = pytest.importorskip("pikepdf")
+
+
+def test_paper_colour_is_estimated():
+    color, spread = estimate_paper(noisy_scan())
+    assert np.abs(color - (232, 226, 205)).max() <= 2
+    assert 0 < spread < 10
+    assert estimate_paper(Image.new("L", (64, 64), 30)) is None
+
+
+def test_paper_becomes_white_and_text_stays():
+    scan = noisy_scan()
+    cleaned = np.asarray(whiten_background(scan))
+    strokes = np.asarray(text_page()) == 0
+    assert (cleaned[~strokes] == 255).mean() > 0.99
+    assert cleaned[strokes].mean() < 40
+
+
+def test_dust_is_removed():
+    scan = noisy_scan()
+    specks = [(20, 20), (30, 400), (700, 1080)]  # In the margins
+    for x, y in specks:
+        scan.putpixel((x, y), (40, 40, 40))
+    cleaned = whiten_background(scan)
+    assert all(cleaned.getpixel(point) == (255, 255, 255) for point in specks)
+    kept = whiten_background(scan, despeckle=False)
+    assert all(max(kept.getpixel(point)) < 128 for point in specks)
+
+
+def test_dark_pages_are_left_alone():
+    night = Image.new("L", (200, 200), 40)
+    assert whiten_background(night) is night
+    indexed = night.convert("P")
+    assert whiten_background(indexed) is indexed
+
+
+def test_cleaned_scans_compress_better(save, export, tmp_path):
+    source = save(noisy_scan(), "scan.png")
+    sizes = {}
+    for clean in (False, True):
+        path = str(tmp_path / f"clean-{clean}.pdf")
+        export([source], path, clean_scans=clean, encoder="JPEG")
+        sizes[clean] = len(open(path, "rb").read())
+    assert sizes[True] < sizes[False] * 0.9
+
+
+def framed(border, size=(1200, 900), box=(150, 100, 950, 700)):
+    page = Image.new("RGB", size, border)
+    page.paste(photo((box[2] - box[0], box[3] - box[1])), box[:2])
+    return page
+
+
+@pytest.mark.parametrize("border", [(255, 255, 255), (0, 0, 0), (40, 90, 160)])
+def test_crop_box_hugs_the_content(border):
+    left, top, right, bottom = find_crop_box(framed(border))
+    # Within one pixel of the reduced copy the search runs on
+    slack = 1200 / 512 * 2 + 1
+    assert 150 - slack <= left <= 150 and 100 - slack <= top <= 100
+    assert 950 <= right <= 950 + slack and 700 <= bottom <= 700 + slack
+
+
+def test_crop_ignores_scanner_noise_in_the_border():
+    page = np.asarray(framed((250, 250, 250)), dtype=np.int16)
+    noise = np.random.default_rng(0).normal(0, 4, page.shape)
+    noisy = Image.fromarray(np.clip(page + noise, 0, 255).astype(np.uint8))
+    left, top, right, bottom = find_crop_box(noisy)
+    assert left > 140 and top > 90 and right < 960 and bottom < 710
+
+
+def test_nothing_to_crop():
+    assert find_crop_box(photo((400, 300))) is None
+    assert find_crop_box(Image.new("RGB", (400, 300), "white")) is None
+    page = photo((400, 300))
+    assert crop_uniform_borders(page) is page
+
+
+def test_auto_crop_export(save, export, tmp_path):
+    source = save(framed((255, 255, 255)), "framed.png")
+    path = str(tmp_path / "cropped.pdf")
+    export([source], path, auto_crop=True, fit_mode="Original Size")
+    with pikepdf.open(path) as pdf:
+        image = pdf.pages[0].Resources.XObject.Im0
+        width, height = int(image.Width), int(image.Height)
+    assert 800 <= width <= 810 and 600 <= height <= 610
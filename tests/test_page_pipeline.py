@@ -0,0 +1,58 @@
+import pytest
+
+from Module.PDFExport import ExportOptions, PDFExporter, SourcePage
+
+from images import photo
+
+
+def plan(path, **options):
+    options.setdefault("isolate_decoding", False)
+    return PDFExporter(ExportOptions(**options)).plan_for(SourcePage(path))
+
+
+def names(page_plan):
+    return [step.stage.name for step in page_plan.steps]
+
+
+def test_conversion_moves_after_downscale(save):
+    path = save(photo((2000, 1500)), "big.png")
+    page_plan = plan(path, color_mode="Grayscale")
+    assert names(page_plan) == ["decode", "resize", "convert", "encode"]
+    assert "moved after downscale: convert" in page_plan.notes
+    assert {"orient", "crop", "alpha"} <= set(page_plan.skipped)
+
+
+def test_jpeg_conversion_fuses_into_decode(save):
+    path = save(photo((2000, 1500)), "big.jpg")
+    page_plan = plan(path, color_mode="Grayscale")
+    assert names(page_plan) == ["decode", "resize", "encode"]
+    decode = page_plan.step("decode")
+    assert decode.params["mode"] == "L" and decode.params["draft_size"]
+    assert "fused convert into decode" in page_plan.notes
+
+
+def test_small_page_skips_resize(save):
+    page_plan = plan(save(photo((300, 200)), "small.png"))
+    assert "resize" in page_plan.skipped
+    assert names(page_plan) == ["decode", "encode"]
+
+
+def test_plan_matches_what_runs(save):
+    path = save(photo((2000, 1500)), "big.png")
+    exporter = PDFExporter(ExportOptions(color_mode="Grayscale",
+                                         isolate_decoding=False))
+    page = exporter.prepare_page(SourcePage(path))
+    assert str(page.plan) == str(exporter.plan_for(SourcePage(path)))
+    assert page.layers[0].color_space == "DeviceGray"
+
+
+def test_preview_pages_keep_the_image_shape(save, export, tmp_path):
+    pikepdf = pytest.importorskip("pikepdf")
+    paths = [save(photo((1000, 600)), "wide.png"),
+             save(photo((120, 200)), "small.png")]
+    path = str(tmp_path / "preview.pdf")
+    export(paths, path, page_size="Preview", margin=0)
+    with pikepdf.open(path) as pdf:
+        boxes = [[float(value) for value in page.MediaBox] for page in pdf.pages]
+        assert all("/Thumb" not in page.obj for page in pdf.pages)
+    assert boxes == [[0, 0, 250, 150], [0, 0, 120, 200]]
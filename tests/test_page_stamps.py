@@ -0,0 +1,44 @@
+import pytest
+
+from Module.PageStamps import split_text
+
+fitz = pytest.importorskip("pymupdf")
+
+
+def page_texts(path):
+    with fitz.open(path) as pdf:
+        return [page.get_text(clip=fitz.INFINITE_RECT()) for page in pdf]
+
+
+def test_split_text():
+    values = {"page": "3", "name": "scan", "date": "2024-01-02"}
+    assert split_text("Page {page} of {pages}", values) == \
+        ["Page 3 of ", None]
+    assert split_text("{name} {date}", values) == ["scan 2024-01-02"]
+    assert split_text("{pages}", values) == [None]
+
+
+def test_stamps_are_searchable_text(photos, export, tmp_path):
+    path = str(tmp_path / "stamped.pdf")
+    export(photos[:3], path, header_text="Черновик {name}",
+           footer_text="Page {page} of {pages}")
+    texts = page_texts(path)
+    assert "Page 2 of 3" in texts[1]
+    assert "Черновик photo1" in texts[1]
+
+
+def test_numbering_restarts_in_each_volume(photos, export, tmp_path):
+    result = export(photos, str(tmp_path / "split.pdf"),
+                    footer_text="Page {page} of {pages}",
+                    max_pages_per_volume=2)
+    texts = [page_texts(output) for output in result.outputs]
+    assert ["Page 2 of 2" in text for text in texts[0]] == [False, True]
+    assert "Page 1 of 1" in texts[2][0]
+
+
+def test_page_count_leaves_out_failed_pages(photos, garbage, export, tmp_path):
+    path = str(tmp_path / "partial.pdf")
+    export([photos[0], garbage, photos[1]], path, isolate_decoding=True,
+           max_workers=1, footer_text="Page {page} of {pages}")
+    texts = page_texts(path)
+    assert "Page 1 of 2" in texts[0] and "Page 2 of 2" in texts[1]
@@ -0,0 +1,49 @@
+import pytest
+from PIL import Image
+
+from Module import ParallelResample
+from Module.ParallelResample import parallel_resize, piece_bounds
+
+from images import photo
+
+RESAMPLERS = [Image.Resampling.BILINEAR, Image.Resampling.BICUBIC,
+              Image.Resampling.LANCZOS]
+
+
+@pytest.fixture(autouse=True)
+def always_parallel(monkeypatch):
+    monkeypatch.setattr(ParallelResample, "PARALLEL_RESAMPLE_PIXELS", 0)
+
+
+@pytest.mark.parametrize("resample", RESAMPLERS)
+@pytest.mark.parametrize("mode", ["RGB", "L", "CMYK", "RGBA", "LA"])
+def test_matches_single_pass(mode, resample):
+    img = photo((733, 517)).convert(mode)
+    expected = img.resize((301, 211), resample)
+    result = parallel_resize(img, (301, 211), resample, workers=4)
+    assert result.mode == expected.mode
+    assert result.tobytes() == expected.tobytes()
+
+
+@pytest.mark.parametrize("size", [(1200, 900), (733, 200), (150, 517)])
+def test_matches_single_pass_when_enlarging_or_one_axis(size):
+    img = photo((733, 517))
+    expected = img.resize(size, Image.Resampling.LANCZOS)
+    result = parallel_resize(img, size, Image.Resampling.LANCZOS, workers=3)
+    assert result.tobytes() == expected.tobytes()
+
+
+def test_matches_single_pass_with_box():
+    img = photo((733, 517))
+    box = (40.5, 17.25, 690, 500.75)
+    expected = img.resize((320, 240), Image.Resampling.BICUBIC, box=box)
+    result = parallel_resize(img, (320, 240), Image.Resampling.BICUBIC,
+                             workers=4, box=box)
+    assert result.tobytes() == expected.tobytes()
+
+
+def test_piece_bounds_cover_length():
+    bounds = piece_bounds(1000, 4)
+    assert bounds[0][0] == 0 and bounds[-1][1] == 1000
+    assert all(end == start for (_, end), (start, _) in zip(bounds, bounds[1:]))
+    assert piece_bounds(100, 8) == [(0, 100)]
@@ -0,0 +1,46 @@
+import pytest
+
+from Module.PDFEncoders import encode_jpeg
+from Module.PDFWriter import EncodedImage, PDFName, PDFWriter
+
+from images import photo
+
+pikepdf = pytest.importorskip("pikepdf")
+
+
+def test_xref_offsets_point_at_objects(tmp_path):
+    path = str(tmp_path / "out.pdf")
+    with PDFWriter(path) as writer:
+        image = writer.add_image(encode_jpeg(photo((64, 48)), 80))
+        writer.add_image_page(image, 64, 48)
+    data = open(path, "rb").read()
+    start = int(data.rsplit(b"startxref", 1)[1].split()[0])
+    assert data[start:start + 4] == b"xref"
+    table = data[start:data.index(b"trailer", start)].split(b"\n")
+    size = int(table[1].split()[1])
+    for number, entry in enumerate(table[3:3 + size - 1], start=1):
+        if entry.endswith(b" n "):
+            offset = int(entry[:10])
+            assert data[offset:].startswith(b"%d 0 obj" % number)
+    with pikepdf.open(path) as pdf:
+        assert len(pdf.pages) == 1
+        assert not pdf.check_pdf_syntax()
+
+
+def test_identical_images_are_written_once(tmp_path):
+    path = str(tmp_path / "out.pdf")
+    with PDFWriter(path) as writer:
+        first = writer.add_image(encode_jpeg(photo((64, 48)), 80))
+        second = writer.add_image(encode_jpeg(photo((64, 48)), 80))
+        other = writer.add_image(encode_jpeg(photo((64, 48), seed=1), 80))
+        # A streamed payload is not known up front and is always written
+        streamed = [writer.add_image(EncodedImage(
+            iter([bytes(64 * 48)]), 64, 48, PDFName("DeviceGray")))
+            for _ in range(2)]
+        for ref in (first, second, other):
+            writer.add_image_page(ref, 64, 48)
+    assert first == second and first != other
+    assert streamed[0] != streamed[1]
+    with pikepdf.open(path) as pdf:
+        images = [page.Resources.XObject.Im0.objgen for page in pdf.pages]
+    assert images[0] == images[1] != images[2]
@@ -0,0 +1,135 @@
+import tempfile
+import zlib
+
+import pytest
+from PIL import Image
+
+from Module import StreamingDecode
+from Module.StreamingDecode import (can_stream, iter_bands, open_image,
+                                    read_reduced, stream_flate)
+
+from images import photo
+
+SIZE = (523, 389)
+
+
+@pytest.fixture(autouse=True)
+def small_bands(monkeypatch):
+    # A few rows per band, so every image is read in many pieces
+    monkeypatch.setattr(StreamingDecode, "BAND_BYTES", 16 * 1024)
+
+
+@pytest.fixture(params=["png", "tif-packbits", "tif-lzw"])
+def source(request, save):
+    img = photo(SIZE)
+    if request.param == "png":
+        return save(img, "big.png")
+    compression = "tiff_lzw" if request.param == "tif-lzw" else "packbits"
+    return save(img, "big.tif", compression=compression, rowsperstrip=7)
+
+
+def test_bands_cover_the_image(source):
+    with open_image(source) as img:
+        assert can_stream(img)
+        heights = [band.height for band in iter_bands(img)]
+    assert len(heights) > 1 and sum(heights) == SIZE[1]
+
+
+def test_stream_flate_matches_full_decode(source):
+    with open_image(source) as img:
+        data = b"".join(stream_flate(img, "L"))
+    with Image.open(source) as img:
+        expected = img.convert("L").tobytes()
+    assert zlib.decompress(data) == expected
+
+
+@pytest.mark.parametrize("factor", [2, 3, 5])
+def test_read_reduced_matches_reduce(source, factor):
+    with open_image(source) as img:
+        reduced = read_reduced(img, (SIZE[0] // factor, SIZE[1] // factor))
+    with Image.open(source) as img:
+        # Partial blocks at the right and bottom edges are dropped
+        width, height = SIZE[0] // factor * factor, SIZE[1] // factor * factor
+        expected = img.convert("RGB").crop((0, 0, width, height)).reduce(factor)
+    assert reduced.size == expected.size
+    assert reduced.tobytes() == expected.tobytes()
+
+
+def test_stream_flate_flattens_alpha(save):
+    clear = Image.new("RGBA", (64, 300), (255, 0, 0, 0))
+    with open_image(save(clear, "clear.png")) as img:
+        data = zlib.decompress(b"".join(stream_flate(img, "RGB", (0, 0, 255))))
+    assert data == bytes((0, 0, 255)) * 64 * 300
+
+
+def test_open_image_lets_huge_png_headers_through(save, monkeypatch):
+    path = save(photo((300, 200)), "huge.png")
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    with pytest.raises(Image.DecompressionBombError):
+        Image.open(path)
+    with open_image(path) as img:
+        assert img.size == (300, 200) and can_stream(img)
+
+
+@pytest.mark.parametrize("fit_mode", ["Original Size", "Fit to Page"])
+def test_streamed_export_matches_the_image(fit_mode, save, export, tmp_path,
+                                           monkeypatch):
+    pikepdf = pytest.importorskip("pikepdf")
+    monkeypatch.setattr(StreamingDecode, "STREAMING_PIXELS", 100 * 100)
+    path = str(tmp_path / "streamed.pdf")
+    source = save(photo((900, 1200)), "big.png")
+    result = export([source], path, fit_mode=fit_mode, encoder="JPEG",
+                    page_size="A5")
+    with pikepdf.open(path) as pdf:
+        shown = pikepdf.PdfImage(pdf.pages[0].Resources.XObject.Im0) \
+            .as_pil_image().convert("RGB")
+    with Image.open(source) as img:
+        expected = img.convert("RGB").resize(shown.size, Image.Resampling.BOX)
+    difference = [abs(a - b) for a, b in zip(shown.tobytes(),
+                                             expected.tobytes())]
+    assert sum(difference) / len(difference) < 12
+    if fit_mode == "Original Size":
+        assert shown.size == (900, 1200) and result.pages[0].encoder == "streamed"
+    else:
+        assert max(shown.size) < 600
+
+
+def test_full_resolution_stream_keeps_the_bomb_limit(save, export, tmp_path,
+                                                    monkeypatch):
+    monkeypatch.setattr(StreamingDecode, "STREAMING_PIXELS", 100 * 100)
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 900 * 1200 // 4)
+    path = str(tmp_path / "bomb.pdf")
+    paths = [save(photo((900, 1200)), "big.png"),
+             save(photo((90, 120)), "small.png")]
+    with pytest.raises(Image.DecompressionBombError):
+        export(paths, path, fit_mode="Original Size")
+    result = export(paths, path, fit_mode="Original Size",
+                    isolate_decoding=True)
+    assert len(result.pages) == 1 and len(result.failed) == 1
+    assert "DecompressionBombError" in result.failed[0].reason
+    # A page that fits reads the image reduced, which the limit allows
+    result = export(paths, path, fit_mode="Fit to Page", page_size="A5")
+    assert len(result.pages) == 2 and not result.failed
+
+
+def test_isolated_stream_runs_in_the_worker(save, export, tmp_path,
+                                            monkeypatch):
+    from Module import PDFExport
+    pikepdf = pytest.importorskip("pikepdf")
+
+    def in_parent(*args):
+        raise AssertionError("streamed in the exporting process")
+    monkeypatch.setattr(StreamingDecode, "STREAMING_PIXELS", 100 * 100)
+    monkeypatch.setattr(PDFExport, "stream_flate", in_parent)
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    path = str(tmp_path / "isolated.pdf")
+    source = save(photo((300, 400)), "big.png")
+    result = export([source], path, fit_mode="Original Size",
+                    isolate_decoding=True)
+    assert result.pages[0].encoder == "streamed"
+    with pikepdf.open(path) as pdf:
+        shown = pikepdf.PdfImage(pdf.pages[0].Resources.XObject.Im0) \
+            .as_pil_image().convert("RGB")
+    with Image.open(source) as img:
+        assert shown.tobytes() == img.convert("RGB").tobytes()
+    assert not list(tmp_path.glob("*.part"))
@@ -0,0 +1,61 @@
+import io
+
+import pytest
+from PIL import Image
+
+from Module.PDFExport import ExportOptions, PDFExporter, make_page_thumbnail
+
+pikepdf = pytest.importorskip("pikepdf")
+
+
+def thumbnails(path):
+    with pikepdf.open(path) as pdf:
+        return [pikepdf.PdfImage(page.obj.Thumb).as_pil_image().convert("RGB")
+                for page in pdf.pages]
+
+
+def centre(img):
+    return img.getpixel((img.width // 2, img.height // 2))
+
+
+def test_thumbnails_are_small_images(photos, export, tmp_path):
+    path = str(tmp_path / "thumbs.pdf")
+    export(photos, path, embed_thumbnails=True)
+    previews = thumbnails(path)
+    assert len(previews) == len(photos)
+    assert all(max(preview.size) <= 106 for preview in previews)
+    assert previews[0].size == (106, 80)  # Same aspect as the 400x300 page
+
+
+def test_no_thumbnails_by_default(photos, export, tmp_path):
+    path = str(tmp_path / "plain.pdf")
+    export(photos[:1], path)
+    with pikepdf.open(path) as pdf:
+        assert "/Thumb" not in pdf.pages[0].obj
+
+
+def test_cached_preview_is_used(save, tmp_path):
+    source = save(Image.new("RGB", (400, 300), "white"), "white.png")
+    cache = {source: Image.new("RGB", (200, 150), (0, 160, 0))}
+    path = str(tmp_path / "cached.pdf")
+    options = ExportOptions(embed_thumbnails=True, isolate_decoding=False)
+    PDFExporter(options, cache).export([source], path)
+    red, green, blue = centre(thumbnails(path)[0])
+    assert green > 120 and red < 40 and blue < 40
+
+
+def test_transparent_page_is_flattened_onto_background(save, export, tmp_path):
+    clear = Image.new("RGBA", (300, 200), (255, 0, 0, 0))
+    path = str(tmp_path / "clear.pdf")
+    export([save(clear, "clear.png")], path, embed_thumbnails=True,
+           background_color="#0000FF")
+    red, green, blue = centre(thumbnails(path)[0])
+    assert blue > 200 and red < 50 and green < 50
+
+
+def test_gray_transparent_preview_is_flattened():
+    preview = Image.new("LA", (300, 200), (0, 0))
+    thumbnail = make_page_thumbnail(preview, (300, 200), "#FFFFFF")
+    assert (thumbnail.width, thumbnail.height) == (106, 71)
+    decoded = Image.open(io.BytesIO(thumbnail.data))
+    assert min(decoded.convert("L").getextrema()) > 240
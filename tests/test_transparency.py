@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from Module.Transparency import decode_with_alpha, flatten, has_alpha
+
+from images import photo
+
+pikepdf = pytest.importorskip("pikepdf")
+
+
+def logo(size=(300, 200)):
+    """Photo with a soft alpha ramp and a fully transparent right quarter"""
+    img = photo(size).convert("RGBA")
+    alpha = np.tile(np.linspace(255, 0, size[0]).astype(np.uint8), (size[1], 1))
+    alpha[:, size[0] * 3 // 4:] = 0
+    img.putalpha(Image.fromarray(alpha, "L"))
+    return img
+
+
+def page_image(path):
+    with pikepdf.open(path) as pdf:
+        stream = pdf.pages[0].Resources.XObject.Im0
+        smask = stream.get("/SMask")
+        mask = pikepdf.PdfImage(smask).as_pil_image() if smask is not None \
+            else None
+        return pikepdf.PdfImage(stream).as_pil_image().convert("RGB"), mask
+
+
+def test_has_alpha():
+    assert has_alpha(Image.new("RGBA", (4, 4)))
+    assert has_alpha(Image.new("LA", (4, 4)))
+    keyed = Image.new("P", (4, 4))
+    keyed.info["transparency"] = 0
+    assert has_alpha(keyed)
+    assert not has_alpha(Image.new("RGB", (4, 4)))
+
+
+def test_flatten_blends_onto_the_background():
+    half = Image.new("RGBA", (4, 4), (255, 0, 0, 128))
+    red, green, blue, alpha = flatten(half, "#0000FF").getpixel((0, 0))
+    assert alpha == 255 and abs(red - 128) <= 1 and green == 0 and \
+        abs(blue - 127) <= 1
+
+
+def test_decode_with_alpha():
+    opaque = photo((40, 30)).convert("RGBA")
+    assert decode_with_alpha(opaque, "RGB", "Preserve").mode == "RGB"
+    kept = decode_with_alpha(logo(), "RGB", "Preserve")
+    assert kept.mode == "RGBA"
+    flat = decode_with_alpha(logo(), "L", "Flatten", "#FFFFFF")
+    assert flat.mode == "L" and flat.getpixel((299, 0)) == 255
+
+
+def test_flatten_uses_the_background_not_black(save, export, tmp_path):
+    path = str(tmp_path / "flat.pdf")
+    export([save(logo(), "logo.png")], path, fit_mode="Original Size",
+           background_color="#FFFF00", encoder="JPEG")
+    shown, mask = page_image(path)
+    assert mask is None
+    red, green, blue = shown.getpixel((290, 100))
+    assert red > 240 and green > 240 and blue < 20
+
+
+def test_preserve_writes_an_smask(save, export, tmp_path):
+    source = logo()
+    path = str(tmp_path / "alpha.pdf")
+    export([save(source, "logo.png")], path, fit_mode="Original Size",
+           transparency="Preserve", encoder="JPEG")
+    _, mask = page_image(path)
+    alpha = np.asarray(source.getchannel("A"), dtype=np.int16)
+    assert mask.size == source.size
+    assert np.abs(np.asarray(mask.convert("L"), dtype=np.int16) - alpha).max() <= 1
+
+
+def test_keyed_palette_transparency_is_preserved(save, export, tmp_path):
+    keyed = Image.new("P", (60, 40), 1)
+    keyed.putpalette([255, 255, 255, 200, 0, 0] + [0, 0, 0] * 254)
+    keyed.paste(0, (0, 0, 30, 40))
+    path = str(tmp_path / "keyed.pdf")
+    export([save(keyed, "keyed.png", transparency=0)], path,
+           fit_mode="Original Size", transparency="Preserve")
+    _, mask = page_image(path)
+    mask = mask.convert("L")
+    assert mask.getpixel((10, 20)) == 0 and mask.getpixel((50, 20)) == 255
@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from Module.PDFExport import (ExportOptions, SourcePage, VolumePlanner,
+                              volume_paths)
+
+pikepdf = pytest.importorskip("pikepdf")
+
+
+def page_counts(paths):
+    counts = []
+    for path in paths:
+        with pikepdf.open(path) as pdf:
+            counts.append(len(pdf.pages))
+    return counts
+
+
+def test_split_by_page_count(photos, export, tmp_path):
+    path = str(tmp_path / "book.pdf")
+    result = export(photos, path, max_pages_per_volume=2)
+    assert result.outputs == volume_paths(path, 3)
+    assert page_counts(result.outputs) == [2, 2, 1]
+    assert not os.path.exists(path)
+
+
+def test_split_by_size(photos):
+    options = ExportOptions(max_volume_bytes=1)
+    planner = VolumePlanner(options)
+    page_bytes = planner.estimate_page_bytes(SourcePage(photos[0]))
+    sources = [SourcePage(path) for path in photos]
+    # Every page alone exceeds the cap, so each gets its own volume
+    assert [len(v) for v in planner.plan(sources)] == [1] * 5
+    options.max_volume_bytes = int(page_bytes * 2.5)
+    assert [len(v) for v in planner.plan(sources)] == [2, 2, 1]
+    options.max_volume_bytes = 0
+    assert [len(v) for v in planner.plan(sources)] == [5]
+
+
+def test_volume_paths():
+    assert volume_paths("out.pdf", 1) == ["out.pdf"]
+    assert volume_paths("dir/out.pdf", 2) == ["dir/out_001.pdf",
+                                              "dir/out_002.pdf"]
+
+
+def test_unreadable_volume_is_dropped(photos, garbage, export, tmp_path):
+    path = str(tmp_path / "out.pdf")
+    result = export([photos[0], garbage, photos[1]], path,
+                    max_pages_per_volume=1, isolate_decoding=True,
+                    max_workers=1)
+    assert [failure.index for failure in result.failed] == [1]
+    assert result.outputs == volume_paths(path, 2)
+    assert page_counts(result.outputs) == [1, 1]
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        ["garbage.png", "out_001.pdf", "out_002.pdf"] +
+        [os.path.basename(photo) for photo in photos])
+
+
+def test_single_readable_volume_keeps_plain_name(photos, garbage, export,
+                                                 tmp_path):
+    path = str(tmp_path / "out.pdf")
+    result = export([garbage, photos[0]], path, max_pages_per_volume=1,
+                    isolate_decoding=True, max_workers=1, linearize=True)
+    assert result.outputs == [path]
+    assert page_counts([path]) == [1]
+    assert not any(name.startswith("out_") for name in os.listdir(tmp_path))
+
+
+def test_empty_selection_is_rejected(export, tmp_path):
+    path = str(tmp_path / "none.pdf")
+    with pytest.raises(ValueError, match="No pages selected"):
+        export([], path)
+    assert not os.path.exists(path)
+
+
+def test_no_decodable_page_leaves_no_output(garbage, export, tmp_path):
+    path = str(tmp_path / "bad.pdf")
+    with pytest.raises(ValueError, match="could be decoded"):
+        export([garbage], path, isolate_decoding=True, max_workers=1)
+    assert os.listdir(tmp_path) == ["garbage.png"]
@@ -0,0 +1,102 @@
+import math
+
+import pytest
+from PIL import Image, ImageChops
+
+from Module.PDFExport import ExportOptions
+from Module.PDFWriter import winansi_literal
+from Module.Watermark import (WatermarkSpec, apply_watermark, diagonal_fit,
+                              page_overlay)
+
+PAGE = (600, 400)
+
+
+def spec(layout, vector=False, scale=1.0):
+    return WatermarkSpec("DRAFT", "", layout, 0.8, scale, vector)
+
+
+def marked(layout):
+    page = Image.new("RGB", PAGE, (40, 90, 160))
+    return ImageChops.difference(page, apply_watermark(page.copy(),
+                                                       spec(layout)))
+
+
+def touched(difference, box):
+    return difference.crop(box).getbbox() is not None
+
+
+def test_overlay_is_rendered_once_per_page_size():
+    assert page_overlay(spec("Tiled"), PAGE, "RGB") is \
+        page_overlay(spec("Tiled"), PAGE, "RGB")
+    colors, alpha, _ = page_overlay(spec("Corner"), PAGE, "L")
+    assert colors.mode == "L" and alpha.size == colors.size
+
+
+def test_corner_mark_stays_in_its_corner():
+    difference = marked("Corner")
+    assert touched(difference, (PAGE[0] // 2, PAGE[1] // 2) + PAGE)
+    assert not touched(difference, (0, 0, PAGE[0] // 2, PAGE[1] // 2))
+    left, top, right, bottom = difference.getbbox()
+    assert PAGE[0] - right >= 20 - 1 and PAGE[1] - bottom >= 20 - 1
+
+
+def test_tiled_marks_cover_the_page():
+    difference = marked("Tiled")
+    width, height = PAGE
+    for box in [(0, 0, width // 2, height // 2),
+                (width // 2, 0, width, height // 2),
+                (0, height // 2, width // 2, height),
+                (width // 2, height // 2, width, height)]:
+        assert touched(difference, box)
+
+
+def test_diagonal_mark_fits_the_page():
+    difference = marked("Diagonal")
+    width, height = PAGE
+    assert touched(difference, (width // 2 - 40, height // 2 - 20,
+                                width // 2 + 40, height // 2 + 20))
+    colors, _, [(left, top)] = page_overlay(spec("Diagonal"), PAGE, "RGB")
+    assert left >= 0 and top >= 0
+    assert left + colors.width <= width and top + colors.height <= height
+
+
+@pytest.mark.parametrize("page", [(600, 400), (300, 900), (2000, 80)])
+def test_diagonal_fit_keeps_the_turned_box_on_the_page(page):
+    angle, factor = diagonal_fit((200, 40), page)
+    assert factor > 0
+    turned = Image.new("L", (round(200 * factor), round(40 * factor)), 255) \
+        .rotate(math.degrees(angle), expand=True)
+    assert turned.width <= page[0] + 2 and turned.height <= page[1] + 2
+
+
+def test_vector_watermark_leaves_pixels_alone():
+    page = Image.new("RGB", PAGE, (40, 90, 160))
+    assert apply_watermark(page.copy(), spec("Tiled", vector=True)).tobytes() \
+        == page.tobytes()
+
+
+def test_winansi_literal():
+    assert winansi_literal("Draft (v2) \\ €") == b"(Draft \\(v2\\) \\\\ \x80)"
+    assert winansi_literal("Черновик") is None
+
+
+def test_text_helvetica_cannot_show_falls_back_to_raster():
+    vector = dict(watermark_mode="Vector", isolate_decoding=False)
+    assert not ExportOptions(watermark_text="Draft", **vector).raster_watermark
+    assert ExportOptions(watermark_text="Черновик", **vector).raster_watermark
+    assert ExportOptions(watermark_text="Draft").raster_watermark
+
+
+def test_vector_watermark_is_one_shared_form(photos, export, tmp_path):
+    pikepdf = pytest.importorskip("pikepdf")
+    plain, marked = str(tmp_path / "plain.pdf"), str(tmp_path / "marked.pdf")
+    export(photos, plain)
+    export(photos, marked, watermark_text="Draft", watermark_mode="Vector",
+           watermark_layout="Tiled")
+    with pikepdf.open(plain) as before, pikepdf.open(marked) as after:
+        forms = {page.Resources.XObject.Wm.objgen for page in after.pages}
+        assert len(forms) == 1
+        # The page images are written exactly as without a watermark
+        for old, new in zip(before.pages, after.pages):
+            assert old.Resources.XObject.Im0.read_raw_bytes() == \
+                new.Resources.XObject.Im0.read_raw_bytes()